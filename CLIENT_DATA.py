@@ -0,0 +1,263 @@
+import argparse
+import os
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+import pyarrow as pa
+
+# Columnar client data; point CLIENT_DATA_DIR at the mandate extracts
+CLIENT_DATA_DIR = os.environ.get("CLIENT_DATA_DIR", "client_data")
+CLIENTS_FILE = "clients.parquet"
+HOLDINGS_FILE = "holdings.parquet"
+
+CLIENT_SCHEMA = pa.schema([
+    ('client_name', pa.string()),
+    ('aum', pa.float64()),
+    ('satisfaction', pa.float64()),
+    ('churn_risk', pa.int32()),
+    ('status', pa.string()),
+    ('type', pa.string()),
+    ('last_contact', pa.string()),
+    ('liability_duration', pa.float64()),
+    ('funded_ratio', pa.float64()),
+    ('headquarters', pa.string()),
+    ('primary_contact', pa.string()),
+    ('relationship_manager', pa.string()),
+    ('inception_date', pa.string()),
+    ('fee_rate', pa.float64()),
+    ('members', pa.int64()),
+    ('governance_score', pa.float64()),
+])
+
+HOLDINGS_SCHEMA = pa.schema([
+    ('client_name', pa.string()),
+    ('asset_class', pa.string()),
+    ('current', pa.float64()),
+    ('target', pa.float64()),
+    ('value', pa.float64()),
+])
+
+# Column labels used by the dashboard charts and stress tests
+HOLDINGS_LABELS = {'asset_class': 'Asset Class', 'current': 'Current', 'target': 'Target', 'value': 'Value'}
+
+# Built-in demo mandates, used when no data files exist
+SEED_CLIENTS = [
+    {
+        'client_name': 'CalPERS - California Public Employees',
+        'aum': 450.0,
+        'satisfaction': 8.4,
+        'churn_risk': 8,
+        'status': 'excellent',
+        'type': 'public_pension',
+        'last_contact': '2024-01-25',
+        'liability_duration': 14.2,
+        'funded_ratio': 0.83,
+        'headquarters': 'Sacramento, CA',
+        'primary_contact': 'Alex King, CIO',
+        'relationship_manager': 'Brad Pitt',
+        'inception_date': '2018-03-15',
+        'fee_rate': 0.35,
+        'members': 2_000_000,
+        'governance_score': 9.2,
+    },
+    {
+        'client_name': 'Harvard Management Company',
+        'aum': 53.2,
+        'satisfaction': 7.8,
+        'churn_risk': 15,
+        'status': 'good',
+        'type': 'endowment',
+        'last_contact': '2024-01-20',
+        'liability_duration': 25.0,
+        'funded_ratio': 0.95,
+        'headquarters': 'Cambridge, MA',
+        'primary_contact': 'Rachel Green, CEO',
+        'relationship_manager': 'Barbara Jean',
+        'inception_date': '2020-09-01',
+        'fee_rate': 0.65,
+        'governance_score': 8.7,
+    },
+    {
+        'client_name': 'Allianz Global Investors',
+        'aum': 125.8,
+        'satisfaction': 8.9,
+        'churn_risk': 5,
+        'status': 'excellent',
+        'type': 'insurance',
+        'last_contact': '2024-01-28',
+        'liability_duration': 9.5,
+        'funded_ratio': 1.08,
+        'headquarters': 'Munich, Germany',
+        'primary_contact': 'Chandler Bing, Head of Investments',
+        'relationship_manager': 'Monica Geller',
+        'inception_date': '2019-06-12',
+        'fee_rate': 0.28,
+        'governance_score': 9.5,
+    },
+]
+
+SEED_HOLDINGS = [
+    ('CalPERS - California Public Employees', 'Global Equity', 52, 50, 234.0),
+    ('CalPERS - California Public Employees', 'Fixed Income', 28, 30, 126.0),
+    ('CalPERS - California Public Employees', 'Private Equity', 13, 13, 58.5),
+    ('CalPERS - California Public Employees', 'Real Estate', 12, 12, 54.0),
+    ('Harvard Management Company', 'Global Equity', 35, 37, 18.6),
+    ('Harvard Management Company', 'Hedge Funds', 25, 23, 13.3),
+    ('Harvard Management Company', 'Private Equity', 18, 17, 9.6),
+    ('Harvard Management Company', 'Fixed Income', 12, 15, 6.4),
+    ('Allianz Global Investors', 'Government Bonds', 45, 43, 56.6),
+    ('Allianz Global Investors', 'Corporate Bonds', 28, 30, 35.2),
+    ('Allianz Global Investors', 'Global Equity', 20, 22, 25.2),
+    ('Allianz Global Investors', 'Real Estate', 8, 8, 10.1),
+]
+
+def seed_tables() -> Tuple[pa.Table, pa.Table]:
+    clients = pa.Table.from_pylist(SEED_CLIENTS, schema=CLIENT_SCHEMA)
+    holdings = pa.Table.from_pylist(
+        [dict(zip(HOLDINGS_SCHEMA.names, row)) for row in SEED_HOLDINGS],
+        schema=HOLDINGS_SCHEMA
+    )
+    return clients, holdings
+
+def write_seed_files(directory: str = CLIENT_DATA_DIR):
+    """Materialise the demo mandates as Parquet files"""
+    import pyarrow.parquet as pq
+    
+    os.makedirs(directory, exist_ok=True)
+    clients, holdings = seed_tables()
+    pq.write_table(clients, os.path.join(directory, CLIENTS_FILE))
+    pq.write_table(holdings, os.path.join(directory, HOLDINGS_FILE))
+
+class ClientDataStore:
+    """Typed, client-indexed in-memory tables loaded from Parquet with change detection
+    
+    Only the requested client columns are read, and client_filter (a pyarrow
+    expression such as pyarrow.compute.field('type') == 'endowment') is pushed
+    down to the Parquet scan. Holdings are sorted by client once, so each client's holdings
+    are a zero-copy slice of one table. Without data files the built-in demo
+    mandates are used.
+    """
+    
+    def __init__(self, directory: str = CLIENT_DATA_DIR, client_columns: Optional[Sequence[str]] = None,
+                 client_filter=None):
+        self.directory = directory
+        self.client_columns = list(client_columns) if client_columns else None
+        self.client_filter = client_filter
+        self.lock = threading.Lock()
+        self.signature = None
+        self.clients = None
+        self.holdings_table = None
+        self.client_rows = {}
+        self.holdings_slices = {}
+        self.refresh()
+    
+    @property
+    def paths(self) -> List[str]:
+        return [os.path.join(self.directory, CLIENTS_FILE), os.path.join(self.directory, HOLDINGS_FILE)]
+    
+    def source_signature(self) -> tuple:
+        """(mtime, size) of each source file; cheap enough to check on every rerun"""
+        signature = []
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+    
+    @property
+    def version(self) -> str:
+        """Changes whenever the loaded data changes; use it as a cache key for derived results"""
+        return repr(self.signature)
+    
+    def refresh(self) -> bool:
+        """Reload if the source files changed since the last load; returns True after a reload"""
+        signature = self.source_signature()
+        with self.lock:
+            if signature == self.signature:
+                return False
+            self.load(all(part is not None for part in signature))
+            self.signature = signature
+            return True
+    
+    def load(self, from_files: bool):
+        # pyarrow.dataset pulls in pandas, so the scan machinery loads with the first data load, not at import
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+        
+        columns = None
+        if self.client_columns is not None:
+            columns = ['client_name'] + [name for name in self.client_columns if name != 'client_name']
+        
+        if from_files:
+            clients = ds.dataset(self.paths[0], format='parquet').to_table(columns=columns, filter=self.client_filter)
+        else:
+            clients, _ = seed_tables()
+            if self.client_filter is not None:
+                clients = clients.filter(self.client_filter)
+            if columns is not None:
+                clients = clients.select(columns)
+        
+        # Holdings are only read for the clients that survived the filter
+        client_names = clients.column('client_name')
+        holdings_filter = pc.field('client_name').isin(client_names)
+        if from_files:
+            holdings = ds.dataset(self.paths[1], format='parquet').to_table(filter=holdings_filter)
+        else:
+            _, holdings = seed_tables()
+            holdings = holdings.filter(holdings_filter)
+        
+        # Stable sort keeps each client's holdings in file order within a contiguous run
+        holdings = holdings.take(pc.sort_indices(holdings, sort_keys=[('client_name', 'ascending')]))
+        holdings_slices = {}
+        names = holdings.column('client_name').to_pylist()
+        start = 0
+        for end in range(1, len(names) + 1):
+            if end == len(names) or names[end] != names[start]:
+                holdings_slices[names[start]] = (start, end - start)
+                start = end
+        
+        self.clients = clients
+        self.holdings_table = holdings
+        self.client_rows = {name: row for row, name in enumerate(client_names.to_pylist())}
+        self.holdings_slices = holdings_slices
+    
+    @property
+    def client_names(self) -> List[str]:
+        return list(self.client_rows)
+    
+    def __contains__(self, client_name: str) -> bool:
+        return client_name in self.client_rows
+    
+    def client(self, client_name: str) -> dict:
+        """One client's attributes as a plain dict"""
+        return self.clients.slice(self.client_rows[client_name], 1).to_pylist()[0]
+    
+    def holdings(self, client_name: str) -> pa.Table:
+        """A client's holdings as a zero-copy slice of the holdings table"""
+        start, length = self.holdings_slices.get(client_name, (0, 0))
+        return self.holdings_table.slice(start, length)
+    
+    def holdings_records(self, client_name: str) -> List[dict]:
+        """Holdings as [{'Asset Class', 'Current', 'Target', 'Value'}] rows"""
+        table = self.holdings(client_name).select(list(HOLDINGS_LABELS))
+        return [
+            {HOLDINGS_LABELS[key]: value for key, value in row.items()}
+            for row in table.to_pylist()
+        ]
+    
+    def holdings_frame(self, client_name: str):
+        """Holdings as a pandas DataFrame with display column names"""
+        return self.holdings(client_name).select(list(HOLDINGS_LABELS)).rename_columns(list(HOLDINGS_LABELS.values())).to_pandas()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Write the demo client mandates as Parquet files")
+    parser.add_argument('directory', nargs='?', default=CLIENT_DATA_DIR)
+    args = parser.parse_args(argv)
+    write_seed_files(args.directory)
+    print(f"Wrote {CLIENTS_FILE} and {HOLDINGS_FILE} to {args.directory}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
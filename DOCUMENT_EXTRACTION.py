@@ -0,0 +1,152 @@
+import importlib
+import io
+import os
+import re
+from typing import BinaryIO, Iterator, Optional, Union
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.txt', '.xlsx', '.png', '.jpg', '.jpeg')
+
+# Text and spreadsheet sources are emitted in blocks of roughly this size
+TEXT_BLOCK_CHARS = 64 * 1024
+SHEET_BLOCK_ROWS = 200
+DOCX_BLOCK_PARAGRAPHS = 50
+
+CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+HYPHENATED_BREAK = re.compile(r"(\w)-\n(\w)")
+INLINE_WHITESPACE = re.compile(r"[ \u00a0]+")
+BLANK_LINES = re.compile(r"\n\s*\n+")
+
+Source = Union[str, bytes, BinaryIO]
+
+class ExtractionError(Exception):
+    """Raised when a document's text cannot be extracted"""
+
+def clean_text(text: str) -> str:
+    """Normalise extracted text: strip control characters, rejoin hyphenated words, collapse spaces"""
+    text = CONTROL_CHARS.sub("", text.replace("\r\n", "\n").replace("\r", "\n"))
+    text = HYPHENATED_BREAK.sub(r"\1\2", text)
+    lines = [INLINE_WHITESPACE.sub(" ", line).strip() for line in text.split("\n")]
+    return BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+def open_source(source: Source) -> BinaryIO:
+    """Accept a path, raw bytes or a binary file-like object (e.g. a Streamlit upload)"""
+    if isinstance(source, str):
+        return open(source, 'rb')
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    source.seek(0)
+    return source
+
+def require(module_name: str, package: str, extension: str):
+    """Import an optional parser on first use; each file type only needs its own package installed"""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        raise ExtractionError(f"Install '{package}' to extract text from {extension} files")
+
+def iter_pdf_pages(stream: BinaryIO) -> Iterator[str]:
+    pypdf = require('pypdf', 'pypdf', '.pdf')
+    reader = pypdf.PdfReader(stream)
+    for page in reader.pages:
+        yield page.extract_text() or ""
+
+def iter_docx_blocks(stream: BinaryIO) -> Iterator[str]:
+    docx = require('docx', 'python-docx', '.docx')
+    document = docx.Document(stream)
+    
+    paragraphs = []
+    for paragraph in document.paragraphs:
+        paragraphs.append(paragraph.text)
+        if len(paragraphs) >= DOCX_BLOCK_PARAGRAPHS:
+            yield "\n".join(paragraphs)
+            paragraphs = []
+    if paragraphs:
+        yield "\n".join(paragraphs)
+    
+    for table in document.tables:
+        yield "\n".join("\t".join(cell.text for cell in row.cells) for row in table.rows)
+
+def iter_xlsx_blocks(stream: BinaryIO) -> Iterator[str]:
+    openpyxl = require('openpyxl', 'openpyxl', '.xlsx')
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            rows = [f"Sheet: {sheet.title}"]
+            for row in sheet.iter_rows(values_only=True):
+                values = [str(value) for value in row if value is not None]
+                if values:
+                    rows.append("\t".join(values))
+                if len(rows) >= SHEET_BLOCK_ROWS:
+                    yield "\n".join(rows)
+                    rows = []
+            if rows:
+                yield "\n".join(rows)
+    finally:
+        workbook.close()
+
+def iter_txt_blocks(stream: BinaryIO) -> Iterator[str]:
+    reader = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace')
+    try:
+        block = []
+        size = 0
+        for line in reader:
+            block.append(line)
+            size += len(line)
+            if size >= TEXT_BLOCK_CHARS:
+                yield "".join(block)
+                block, size = [], 0
+        if block:
+            yield "".join(block)
+    finally:
+        # Leave the caller's stream open
+        reader.detach()
+
+def iter_no_text(stream: BinaryIO) -> Iterator[str]:
+    # Images have no text layer; they stay searchable by file name
+    return iter(())
+
+PAGE_READERS = {
+    '.pdf': iter_pdf_pages,
+    '.docx': iter_docx_blocks,
+    '.xlsx': iter_xlsx_blocks,
+    '.txt': iter_txt_blocks,
+    '.png': iter_no_text,
+    '.jpg': iter_no_text,
+    '.jpeg': iter_no_text,
+}
+
+def iter_pages(source: Source, file_name: str) -> Iterator[str]:
+    """Yield cleaned text one page (or block) at a time without reading the whole file up front"""
+    extension = os.path.splitext(file_name)[1].lower()
+    page_reader = PAGE_READERS.get(extension)
+    if page_reader is None:
+        raise ExtractionError(f"Text extraction is not supported for '{extension or file_name}' files")
+    
+    stream = None
+    try:
+        # Opening is inside the try, so an unreadable file is reported like any other bad file
+        stream = open_source(source)
+        for page in page_reader(stream):
+            page = clean_text(page)
+            if page:
+                yield page
+    except ExtractionError:
+        raise
+    except Exception as e:
+        raise ExtractionError(f"Could not read {file_name}: {str(e)}") from e
+    finally:
+        if stream is not None and isinstance(source, str):
+            stream.close()
+
+def extract_text(source: Source, file_name: str, max_chars: Optional[int] = None) -> str:
+    """Extract clean text from a pdf, docx, txt or xlsx document"""
+    pages = []
+    total = 0
+    for page in iter_pages(source, file_name):
+        pages.append(page)
+        total += len(page)
+        if max_chars is not None and total >= max_chars:
+            break
+    
+    text = "\n\n".join(pages)
+    return text[:max_chars] if max_chars is not None else text
@@ -1,21 +1,34 @@
 ﻿import streamlit as st
-import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import yfinance as yf
+from datetime import datetime
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
+import logging
 import time
-import random
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
 import hashlib
 import os
-import base64
-import io
-from PIL import Image
+import uuid
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from KNOWLEDGE_BASE import CONTEXT_TOKEN_BUDGET, KNOWLEDGE_BASE_DIR, DocumentStore, SimpleRAGSystem, create_embedder
+from DOCUMENT_EXTRACTION import ExtractionError, extract_text
+from CLIENT_DATA import CLIENT_DATA_DIR, ClientDataStore
+from KNOWLEDGE_INGEST import IMPORT_ROOTS, SAMPLES_DIR, ingest_directory, within_roots
+from PDF_GENERATOR import insights_report_name, insights_report_spec, render_report_bytes, report_key
+from PORTFOLIO_ANALYTICS import (
+    HISTORY_PERIODS, SIMULATED_HISTORIES, SIMULATED_LABEL, VAR_CONFIDENCE, compute_risk_metrics, format_risk_summary,
+    levels_from_returns, simulate_client_histories
+)
+from STRESS_TESTING import UNDERFUNDED_THRESHOLD, balance_sheet_from_client, format_stress_summary, run_stress_tests
+
+logger = logging.getLogger(__name__)
 
 # Configure Streamlit page
 st.set_page_config(
@@ -261,11 +274,316 @@ ROLES = {
     )
 }
 
+# Ollama connection settings
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+# Connections the shared session keeps to the model server; background workers and the
+# interactive concurrency limit are both carved out of this one budget
+OLLAMA_MAX_CONNECTIONS = max(2, int(os.environ.get("OLLAMA_MAX_CONNECTIONS", "8")))
+
+@dataclass
+class OllamaSessionConfig:
+    """Connection pool, keep-alive and backoff settings for the Ollama HTTP session"""
+    pool_connections: int = 4        # Number of distinct hosts to keep pools for
+    pool_maxsize: int = OLLAMA_MAX_CONNECTIONS  # Max keep-alive connections per host
+    pool_block: bool = True          # Wait for a free connection instead of opening extras
+    connect_timeout: float = 3.0
+    transport_retries: int = 3       # Connection-level retries handled by urllib3
+    backoff_factor: float = 0.5
+    backoff_max: float = 10.0
+    status_forcelist: Tuple[int, ...] = (502, 503, 504)
+    
+    def backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff delay before the next application-level retry"""
+        return min(self.backoff_max, self.backoff_factor * (2 ** attempt))
+
+def create_ollama_session(config: OllamaSessionConfig) -> requests.Session:
+    """Create a pooled keep-alive session for talking to the Ollama server"""
+    retry = Retry(
+        total=config.transport_retries,
+        connect=config.transport_retries,
+        read=0,  # Generation timeouts are retried by call_ai_with_retry, not the transport
+        status=config.transport_retries,
+        backoff_factor=config.backoff_factor,
+        status_forcelist=config.status_forcelist,
+        allowed_methods=frozenset({"GET", "POST"}),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config.pool_connections,
+        pool_maxsize=config.pool_maxsize,
+        pool_block=config.pool_block,
+        max_retries=retry
+    )
+    
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+OLLAMA_SESSION_CONFIG = OllamaSessionConfig()
+
+# Shared across reruns and browser sessions so connections stay warm
+@st.cache_resource
+def get_ollama_session():
+    return create_ollama_session(OLLAMA_SESSION_CONFIG)
+
+class OllamaStatusMonitor:
+    """Cached Ollama health and model list with background refresh and a circuit breaker
+    
+    Reruns read the last snapshot instead of probing the server. A stale snapshot is
+    refreshed on a background thread. Once the server is found offline the circuit
+    opens and probing pauses for a cooldown that doubles on each failed retry.
+    """
+    
+    def __init__(self, base_url: str = OLLAMA_BASE_URL, ttl_seconds: float = 15.0, probe_timeout: float = 2.0,
+                 cooldown_seconds: float = 5.0, max_cooldown_seconds: float = 60.0):
+        self.base_url = base_url
+        self.ttl_seconds = ttl_seconds
+        self.probe_timeout = probe_timeout
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        # Probes fail fast: no transport retries and a single connection
+        self.session = create_ollama_session(OllamaSessionConfig(pool_maxsize=1, transport_retries=0))
+        self.lock = threading.Lock()
+        self.running = False
+        self.models = []
+        self.checked_at = None
+        self.failures = 0
+        self.retry_at = 0.0
+        self.refreshing = False
+    
+    @property
+    def circuit_open(self) -> bool:
+        return self.failures > 0 and time.monotonic() < self.retry_at
+    
+    def probe(self) -> Tuple[bool, List[str]]:
+        try:
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=self.probe_timeout)
+            if response.status_code == 200:
+                return True, [model["name"] for model in response.json().get("models", [])]
+        except (requests.RequestException, ValueError):
+            pass
+        return False, []
+    
+    def refresh(self):
+        """Probe the server now and record the outcome"""
+        try:
+            try:
+                running, models = self.probe()
+            except Exception:
+                # Anything probe() doesn't expect counts as offline rather than killing the refresh
+                logger.exception("Ollama status probe failed")
+                running, models = False, []
+            with self.lock:
+                self.running = running
+                self.checked_at = time.monotonic()
+                if running:
+                    self.models = models
+                    self.failures = 0
+                else:
+                    self.models = []
+                    self.failures += 1
+                    cooldown = min(self.max_cooldown_seconds, self.cooldown_seconds * 2 ** (self.failures - 1))
+                    self.retry_at = self.checked_at + cooldown
+        finally:
+            # Always clear the flag, or no later rerun would ever start another refresh
+            with self.lock:
+                self.refreshing = False
+    
+    def status(self) -> Tuple[bool, List[str]]:
+        """Return the cached (running, models) snapshot, refreshing it in the background when stale"""
+        with self.lock:
+            first_check = self.checked_at is None
+            stale = not first_check and time.monotonic() - self.checked_at >= self.ttl_seconds
+            start_refresh = stale and not self.refreshing and not self.circuit_open
+            if start_refresh:
+                self.refreshing = True
+        
+        # The very first check is synchronous so the initial page shows the real state
+        if first_check:
+            self.refresh()
+        elif start_refresh:
+            threading.Thread(target=self.refresh, name="ollama-status", daemon=True).start()
+        
+        with self.lock:
+            return self.running, list(self.models)
+
+@st.cache_resource
+def get_ollama_status_monitor():
+    return OllamaStatusMonitor(OLLAMA_BASE_URL)
+
+# AI response cache settings
+RESPONSE_CACHE_DIR = os.environ.get("AI_RESPONSE_CACHE_DIR", os.path.join(".ai_cache", "responses"))
+
+class ResponseCache:
+    """Content-addressed cache of AI responses with an in-memory LRU tier and an on-disk tier"""
+    
+    def __init__(self, cache_dir: Optional[str] = RESPONSE_CACHE_DIR, ttl_seconds: int = 6 * 3600,
+                 max_memory_entries: int = 256, max_disk_bytes: int = 64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = OrderedDict()  # key -> {'client', 'created', 'response'}
+        self.lock = threading.Lock()
+        self.disk_bytes = 0
+        
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.disk_bytes = sum(size for _, _, size in self.scan_disk())
+    
+    @staticmethod
+    def make_key(model: str, options: dict, system_prompt: str, prompt: str) -> str:
+        """Hash everything that determines the model output"""
+        payload = json.dumps(
+            {'model': model, 'options': options, 'system': system_prompt, 'prompt': prompt},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def client_bucket(client_name: str) -> str:
+        return hashlib.md5(client_name.encode('utf-8')).hexdigest()[:12]
+    
+    def entry_path(self, key: str, client_name: str) -> str:
+        # One directory per client so invalidation is a single directory removal
+        return os.path.join(self.cache_dir, self.client_bucket(client_name), f"{key}.json")
+    
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry['created'] < self.ttl_seconds
+    
+    def get(self, key: str, client_name: str) -> Optional[str]:
+        """Return a cached response, promoting disk hits into memory"""
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if self.is_fresh(entry):
+                    self.memory.move_to_end(key)
+                    return entry['response']
+                del self.memory[key]
+            
+            if not self.cache_dir:
+                return None
+            
+            path = self.entry_path(key, client_name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                return None
+            
+            # Entries cut short or written by another version are misses, like stale ones
+            if (not isinstance(entry, dict) or not isinstance(entry.get('created'), (int, float))
+                    or not isinstance(entry.get('response'), str) or not self.is_fresh(entry)):
+                self.remove_file(path)
+                return None
+            
+            try:
+                os.utime(path)  # Mark as recently used for disk eviction
+            except OSError:
+                pass  # Evicted or invalidated by another process meanwhile; the entry read is still good
+            self.remember(key, entry)
+            return entry['response']
+    
+    def put(self, key: str, client_name: str, response: str):
+        """Store a response in both tiers"""
+        entry = {'client': client_name, 'created': time.time(), 'response': response}
+        
+        with self.lock:
+            self.remember(key, entry)
+            
+            if not self.cache_dir:
+                return
+            
+            path = self.entry_path(key, client_name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            try:
+                self.remove_file(path)
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(entry, f)
+                os.replace(tmp_path, path)
+                self.disk_bytes += os.path.getsize(path)
+            except OSError:
+                return
+            
+            if self.disk_bytes > self.max_disk_bytes:
+                self.evict_disk()
+    
+    def remember(self, key: str, entry: dict):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+    
+    def scan_disk(self):
+        """Yield (path, mtime, size) for every entry on disk"""
+        for bucket in os.scandir(self.cache_dir):
+            if not bucket.is_dir():
+                continue
+            for item in os.scandir(bucket.path):
+                if item.name.endswith('.json'):
+                    stat = item.stat()
+                    yield item.path, stat.st_mtime, stat.st_size
+    
+    def remove_file(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            self.disk_bytes -= size
+        except OSError:
+            pass
+    
+    def evict_disk(self):
+        """Drop least recently used files until the disk tier is back under budget"""
+        target = self.max_disk_bytes * 0.8
+        for path, _, _ in sorted(self.scan_disk(), key=lambda item: item[1]):
+            if self.disk_bytes <= target:
+                break
+            self.remove_file(path)
+    
+    def invalidate_client(self, client_name: str):
+        """Forget every response generated for a client, e.g. after new documents arrive"""
+        with self.lock:
+            for key in [k for k, entry in self.memory.items() if entry['client'] == client_name]:
+                del self.memory[key]
+            
+            if self.cache_dir:
+                bucket = os.path.join(self.cache_dir, self.client_bucket(client_name))
+                if os.path.isdir(bucket):
+                    for item in os.scandir(bucket):
+                        self.remove_file(item.path)
+    
+    def clear(self):
+        """Empty both tiers"""
+        with self.lock:
+            self.memory.clear()
+            if self.cache_dir:
+                for path, _, _ in list(self.scan_disk()):
+                    self.remove_file(path)
+
+# Shared across sessions so analysts benefit from each other's runs
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache()
+
+# Shorter responses are treated as failed generations
+MIN_RESPONSE_CHARS = 100
+
+def is_usable_response(ai_response: Optional[str]) -> bool:
+    return bool(ai_response) and len(ai_response) > MIN_RESPONSE_CHARS
+
 # Enhanced AI prompt engineering
 class EnhancedAISystem:
     """Enhanced AI system with better prompt engineering for various models"""
     
-    def __init__(self):
+    def __init__(self, session: Optional[requests.Session] = None,
+                 session_config: Optional[OllamaSessionConfig] = None,
+                 response_cache: Optional[ResponseCache] = None):
+        self.session_config = session_config or OLLAMA_SESSION_CONFIG
+        self.session = session or create_ollama_session(self.session_config)
+        self.response_cache = response_cache
         self.model_configs = {
             'gemma': {
                 'temperature': 0.8,
@@ -343,298 +661,969 @@ Provide a comprehensive response that addresses ALL aspects of the request. Be s
         
         return enhanced_prompt
     
+    def post_generate(self, payload: dict, timeout: int) -> requests.Response:
+        """POST to the Ollama generate endpoint over the pooled session"""
+        return self.session.post(
+            f"{OLLAMA_BASE_URL}/api/generate",
+            json=payload,
+            timeout=(self.session_config.connect_timeout, timeout),
+            stream=payload.get("stream", False)
+        )
+    
+    def read_stream(self, response: requests.Response, on_token: Callable[[str], None]) -> str:
+        """Consume Ollama's NDJSON chunks, forwarding each token as it arrives"""
+        tokens = []
+        
+        # Read to the end of the body so the connection goes back to the pool
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise RuntimeError(chunk["error"])
+            token = chunk.get("response", "")
+            if token:
+                tokens.append(token)
+                on_token(token)
+        
+        return "".join(tokens)
+    
+    def generate(self, model: str, prompt: str, model_config: dict, timeout: int,
+                 on_token: Optional[Callable[[str], None]] = None) -> Tuple[int, str]:
+        """Run one generate request, streaming tokens to on_token when given"""
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": on_token is not None,
+            "options": model_config
+        }
+        
+        with self.post_generate(payload, timeout) as response:
+            if response.status_code != 200:
+                return response.status_code, ""
+            if on_token is None:
+                return response.status_code, response.json().get("response", "").strip()
+            return response.status_code, self.read_stream(response, on_token).strip()
+    
     def call_ai_with_retry(self, prompt: str, model: str, role: str, client_info: dict, 
-                          max_retries: int = 2, timeout: int = 90) -> Optional[str]:
-        """Call AI with retry logic and better error handling"""
+                          max_retries: int = 2, timeout: int = 90,
+                          on_token: Optional[Callable[[str], None]] = None,
+                          use_cache: bool = True,
+                          on_warning: Optional[Callable[[str], None]] = None) -> Optional[str]:
+        """Call AI with retry logic and better error handling
+        
+        Retry warnings go to on_warning when given (e.g. from background threads), else to the page.
+        """
+        warn = on_warning or st.warning
+        report_error = on_warning or st.error
         
         model_config = self.get_model_config(model)
         system_prompt = self.create_system_prompt(role, client_info)
         
+        # Serve repeated analyses from the response cache
+        cache = self.response_cache if use_cache else None
+        client_name = client_info.get('client_name', '')
+        cache_key = ResponseCache.make_key(model, model_config, system_prompt, prompt) if cache else None
+        if cache:
+            cached_response = cache.get(cache_key, client_name)
+            if cached_response is not None:
+                if on_token:
+                    on_token(cached_response)
+                return cached_response
+        
+        # Track what has already been shown live when streaming
+        streamed = []
+        
+        def forward_token(token):
+            streamed.append(token)
+            on_token(token)
+        
+        token_sink = forward_token if on_token else None
+        
         for attempt in range(max_retries):
             try:
-                response = requests.post(
-                    "http://localhost:11434/api/generate",
-                    json={
-                        "model": model,
-                        "prompt": f"{system_prompt}\n\n{prompt}",
-                        "stream": False,
-                        "options": model_config
-                    },
-                    timeout=timeout
+                status_code, ai_response = self.generate(
+                    model,
+                    f"{system_prompt}\n\n{prompt}",
+                    model_config,
+                    timeout,
+                    token_sink
                 )
                 
-                if response.status_code == 200:
-                    ai_response = response.json().get("response", "").strip()
-                    
+                if status_code == 200:
                     # Validate response completeness
+                    complete = True
                     if len(ai_response) > 100 and not ai_response.endswith(('.', '!', '?', '"')):
                         # Response seems incomplete, try to continue
                         continuation_prompt = f"{system_prompt}\n\n{prompt}\n\nPrevious response:\n{ai_response}\n\nPlease continue and complete the analysis:"
                         
-                        continuation = requests.post(
-                            "http://localhost:11434/api/generate",
-                            json={
-                                "model": model,
-                                "prompt": continuation_prompt,
-                                "stream": False,
-                                "options": model_config
-                            },
-                            timeout=timeout
+                        if token_sink:
+                            token_sink("\n\n")
+                        continuation_status, continuation = self.generate(
+                            model,
+                            continuation_prompt,
+                            model_config,
+                            timeout,
+                            token_sink
                         )
                         
-                        if continuation.status_code == 200:
-                            ai_response += "\n\n" + continuation.json().get("response", "").strip()
+                        complete = continuation_status == 200
+                        if complete:
+                            ai_response += "\n\n" + continuation
                     
+                    # A truncated or unusable answer is returned once but never served again from the cache
+                    if cache and complete and is_usable_response(ai_response):
+                        cache.put(cache_key, client_name, ai_response)
                     return ai_response
                 else:
-                    st.warning(f"AI returned status code: {response.status_code}")
+                    warn(f"AI returned status code: {status_code}")
                     
             except requests.exceptions.Timeout:
-                st.warning(f"AI request timed out (attempt {attempt + 1}/{max_retries})")
+                warn(f"AI request timed out (attempt {attempt + 1}/{max_retries})")
             except Exception as e:
-                st.error(f"AI Error: {str(e)}")
+                report_error(f"AI Error: {str(e)}")
+            
+            # Tokens already rendered live can't be retracted, so keep the partial answer
+            if streamed:
+                return "".join(streamed).strip()
             
             if attempt < max_retries - 1:
-                time.sleep(2)  # Brief pause before retry
+                time.sleep(self.session_config.backoff_delay(attempt))  # Back off before retry
         
         return None
 
-# Simple in-memory storage for documents
-if 'document_store' not in st.session_state:
-    st.session_state.document_store = []
+if 'ai_system' not in st.session_state:
+    st.session_state.ai_system = EnhancedAISystem(
+        session=get_ollama_session(),
+        response_cache=get_response_cache()
+    )
 
-if 'knowledge_base' not in st.session_state:
-    st.session_state.knowledge_base = {
-        'documents': [],
-        'embeddings': []
-    }
+# Initialize RAG system
+# Documents live in the on-disk store; one instance is shared by every session
+@st.cache_resource
+def get_rag_system():
+    return SimpleRAGSystem(
+        store=DocumentStore(KNOWLEDGE_BASE_DIR),
+        embedder=create_embedder(get_ollama_session(), OLLAMA_BASE_URL)
+    )
 
-if 'ai_system' not in st.session_state:
-    st.session_state.ai_system = EnhancedAISystem()
+# Load client data
+# Columnar tables shared by every session; refresh() reloads only when the source files change
+@st.cache_resource
+def get_client_store():
+    return ClientDataStore(CLIENT_DATA_DIR)
+
+def load_client_store():
+    """Shared client store, reloaded first if the data files changed"""
+    client_store = get_client_store()
+    client_store.refresh()
+    return client_store
 
-class SimpleRAGSystem:
-    """Simplified RAG system for demonstration"""
+@st.cache_data
+def get_risk_analytics(client_names: tuple):
+    """Client and benchmark return histories with risk metrics for every history window
     
-    def __init__(self):
-        self.documents = st.session_state.knowledge_base['documents']
+    Series are the clients in order followed by the benchmark; metrics are (windows, series).
+    """
+    client_returns, benchmark_returns = simulate_client_histories(client_names)
+    returns = np.column_stack([client_returns, benchmark_returns])
+    metrics = compute_risk_metrics(returns, benchmark_returns, list(HISTORY_PERIODS.values()))
+    return returns, metrics
+
+@st.cache_data
+def get_stress_results(data_version):
+    """Deterministic scenarios and Monte Carlo funded-ratio results for every client
     
-    def add_document(self, file_content, file_name, document_type, client_name, roles_allowed, uploaded_by):
-        """Add a document to the knowledge base"""
-        doc_id = hashlib.md5(f"{file_name}{datetime.now()}".encode()).hexdigest()[:8]
-        
-        doc_metadata = {
-            'id': doc_id,
-            'file_name': file_name,
-            'document_type': document_type,
-            'client_name': client_name,
-            'roles_allowed': roles_allowed,
-            'uploaded_by': uploaded_by,
-            'upload_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'content': file_content[:1000]  # Store first 1000 chars for demo
-        }
-        
-        self.documents.append(doc_metadata)
-        st.session_state.knowledge_base['documents'] = self.documents
-        
-        return doc_id
+    data_version is the client store version, so results are recomputed only when the data changes.
+    """
+    client_store = load_client_store()
+    sheets = []
+    for client_name in client_store.client_names:
+        if not client_store.holdings(client_name).num_rows:
+            continue
+        # One client's bad record must not take down stress testing for the whole book
+        try:
+            sheets.append(balance_sheet_from_client(
+                client_name, client_store.client(client_name), client_store.holdings_records(client_name)
+            ))
+        except ValueError as e:
+            logger.warning("Skipping stress tests: %s", e)
+    return run_stress_tests(sheets)
+
+def client_analytics_context(client_name, user_role):
+    """Computed risk metrics and stress test results for a client, formatted for the AI prompt
     
-    def search_documents(self, query, user_role, client_filter=None):
-        """Search documents based on query and permissions"""
-        results = []
-        
-        for doc in self.documents:
-            # Check permissions
-            if user_role not in doc['roles_allowed']:
-                continue
-            
-            # Apply client filter
-            if client_filter and doc['client_name'] != client_filter:
-                continue
-            
-            # Simple keyword search
-            if query.lower() in doc['file_name'].lower() or query.lower() in doc['content'].lower():
-                results.append(doc)
-        
-        return results
+    Only includes what the role may see on the Dashboard.
+    """
+    client_store = load_client_store()
+    client_names = tuple(client_store.client_names)
+    if client_name not in client_names:
+        return ""
+    sections = []
+    # Metrics of a simulated history would read as the client's real figures and contradict its documents
+    if not SIMULATED_HISTORIES:
+        _, metrics = get_risk_analytics(client_names)
+        sections.append(format_risk_summary(metrics, client_names.index(client_name), list(HISTORY_PERIODS.keys())))
     
-    def get_context_for_prompt(self, query, client_name, user_role):
-        """Get relevant context for AI prompt"""
-        relevant_docs = self.search_documents(query, user_role, client_name)
-        
-        context = "RELEVANT KNOWLEDGE BASE DOCUMENTS:\n\n"
-        for doc in relevant_docs[:3]:  # Top 3 documents
-            context += f"📄 Document: {doc['file_name']}\n"
-            context += f"Type: {doc['document_type']}\n"
-            context += f"Date: {doc['upload_date']}\n"
-            context += f"Content Preview: {doc['content'][:200]}...\n"
-            context += "-" * 50 + "\n\n"
-        
-        return context
+    if "risk_analysis" in ROLES[user_role].permissions:
+        stress_result = get_stress_results(client_store.version).get(client_name)
+        if stress_result:
+            sections.append(format_stress_summary(stress_result))
+    return "\n\n".join(sections)
 
-# Initialize RAG system
-@st.cache_resource
-def get_rag_system():
-    return SimpleRAGSystem()
+def check_ollama_status():
+    """Check if Ollama is running, from the shared cached snapshot"""
+    return get_ollama_status_monitor().status()
 
-# Load client data
-@st.cache_data(ttl=300)
-def load_enhanced_client_data():
-    """Load comprehensive institutional client data"""
-    
-    clients_data = {
-        'CalPERS - California Public Employees': {
-            'aum': 450.0,
-            'satisfaction': 8.4,
-            'churn_risk': 8,
-            'status': 'excellent',
-            'type': 'public_pension',
-            'last_contact': '2024-01-25',
-            'liability_duration': 14.2,
-            'funded_ratio': 0.83,
-            'headquarters': 'Sacramento, CA',
-            'primary_contact': 'Alex King, CIO',
-            'relationship_manager': 'Brad Pitt',
-            'inception_date': '2018-03-15',
-            'fee_rate': 0.35,
-            'members': 2_000_000,
-            'governance_score': 9.2,
-        },
-        'Harvard Management Company': {
-            'aum': 53.2,
-            'satisfaction': 7.8,
-            'churn_risk': 15,
-            'status': 'good',
-            'type': 'endowment',
-            'last_contact': '2024-01-20',
-            'liability_duration': 25.0,
-            'funded_ratio': 0.95,
-            'headquarters': 'Cambridge, MA',
-            'primary_contact': 'Rachel Green, CEO',
-            'relationship_manager': 'Barbara Jean',
-            'inception_date': '2020-09-01',
-            'fee_rate': 0.65,
-            'governance_score': 8.7,
-        },
-        'Allianz Global Investors': {
-            'aum': 125.8,
-            'satisfaction': 8.9,
-            'churn_risk': 5,
-            'status': 'excellent',
-            'type': 'insurance',
-            'last_contact': '2024-01-28',
-            'liability_duration': 9.5,
-            'funded_ratio': 1.08,
-            'headquarters': 'Munich, Germany',
-            'primary_contact': 'Chandler Bing, Head of Investments',
-            'relationship_manager': 'Monica Geller',
-            'inception_date': '2019-06-12',
-            'fee_rate': 0.28,
-            'governance_score': 9.5,
-        }
+def build_client_info(client_name, client_data):
+    """Prepare the client summary passed to the AI system prompt"""
+    return {
+        'client_name': client_name,
+        'client_type': client_data['type'],
+        'aum': client_data['aum'],
+        'satisfaction': client_data['satisfaction'],
+        'churn_risk': client_data['churn_risk'],
+        'status': client_data['status']
     }
+
+def prepare_analysis_prompt(ai_system, prompt_key, prompt_template, client_name, client_data, user_role, rag_system, use_knowledge_base=True,
+                            context_token_budget=None, analytics_context=None):
+    """Fill a role prompt template and enrich it with knowledge base context
     
-    portfolio_data = {
-        'CalPERS - California Public Employees': [
-            {'Asset Class': 'Global Equity', 'Current': 52, 'Target': 50, 'Value': 234.0},
-            {'Asset Class': 'Fixed Income', 'Current': 28, 'Target': 30, 'Value': 126.0},
-            {'Asset Class': 'Private Equity', 'Current': 13, 'Target': 13, 'Value': 58.5},
-            {'Asset Class': 'Real Estate', 'Current': 12, 'Target': 12, 'Value': 54.0},
-        ],
-        'Harvard Management Company': [
-            {'Asset Class': 'Global Equity', 'Current': 35, 'Target': 37, 'Value': 18.6},
-            {'Asset Class': 'Hedge Funds', 'Current': 25, 'Target': 23, 'Value': 13.3},
-            {'Asset Class': 'Private Equity', 'Current': 18, 'Target': 17, 'Value': 9.6},
-            {'Asset Class': 'Fixed Income', 'Current': 12, 'Target': 15, 'Value': 6.4},
-        ],
-        'Allianz Global Investors': [
-            {'Asset Class': 'Government Bonds', 'Current': 45, 'Target': 43, 'Value': 56.6},
-            {'Asset Class': 'Corporate Bonds', 'Current': 28, 'Target': 30, 'Value': 35.2},
-            {'Asset Class': 'Global Equity', 'Current': 20, 'Target': 22, 'Value': 25.2},
-            {'Asset Class': 'Real Estate', 'Current': 8, 'Target': 8, 'Value': 10.1},
-        ]
-    }
+    analytics_context defaults to client_analytics_context(client_name, user_role); threads without a
+    script context pass it in because the Streamlit caches behind it expect one.
+    """
+    
+    # Fill in the prompt template
+    prompt = prompt_template.format(
+        client_name=client_name,
+        aum=client_data['aum'],
+        satisfaction=client_data['satisfaction'],
+        churn_risk=client_data['churn_risk'],
+        client_type=client_data['type']
+    )
+    
+    # Ground the analysis in computed metrics rather than letting the model invent them
+    if analytics_context is None:
+        analytics_context = client_analytics_context(client_name, user_role)
+    context = analytics_context + "\n\n"
+    
+    # Add knowledge base context if enabled
+    if use_knowledge_base:
+        kb_context = rag_system.get_context_for_prompt(
+            f"{prompt_key.replace('_', ' ')} {prompt}", client_name, user_role, token_budget=context_token_budget
+        )
+        context += kb_context
     
-    return clients_data, portfolio_data
+    # Enhance the prompt
+    return ai_system.enhance_prompt(prompt, context, user_role)
 
-def check_ollama_status():
-    """Check if Ollama is running"""
-    try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=3)
-        if response.status_code == 200:
-            models = [model["name"] for model in response.json().get("models", [])]
-            return True, models
-        return False, []
-    except:
-        return False, []
+def build_insight(prompt_key, ai_response, client_name, client_data, selected_model, user_role):
+    """Package an AI response as an insight, or None if it is unusable"""
+    if not is_usable_response(ai_response):
+        return None
+    
+    # Determine priority based on content
+    priority = "HIGH" if client_data['churn_risk'] > 20 or "urgent" in ai_response.lower() else "MEDIUM"
+    
+    return {
+        'type': prompt_key.replace('_', ' ').title(),
+        'priority': priority,
+        'title': f"{prompt_key.replace('_', ' ').title()} - {client_name}",
+        'content': ai_response,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'model': selected_model,
+        'role': user_role
+    }
+
+def update_insight_status(status, prompt_key, insight):
+    """Mark a per-prompt status widget as complete or failed"""
+    if insight:
+        status.update(label=f"✅ {prompt_key.replace('_', ' ').title()} analysis complete", state="complete")
+    else:
+        status.update(label=f"❌ Failed to generate {prompt_key} insights", state="error")
+        st.warning(f"Could not generate complete insights for {prompt_key}")
+
+# Upper bound on prompts dispatched to the model server at once
+MAX_CONCURRENT_PROMPTS = 4
 
-def generate_enhanced_insights(client_name, client_data, portfolio_data, selected_model, user_role, rag_system, use_knowledge_base=True):
+# Minimum interval between live re-renders of a streaming response
+STREAM_REFRESH_SECONDS = 0.1
+
+class LiveInsightCard:
+    """Placeholder that renders a streaming AI response as tokens arrive"""
+    
+    def __init__(self, title: str, refresh_seconds: float = STREAM_REFRESH_SECONDS):
+        self.title = title
+        self.refresh_seconds = refresh_seconds
+        self.placeholder = st.empty()
+        self.tokens = []
+        self.last_render = 0.0
+    
+    def append(self, token: str, force: bool = False):
+        """Add a token and re-render if the refresh interval has passed"""
+        self.tokens.append(token)
+        now = time.monotonic()
+        if force or now - self.last_render >= self.refresh_seconds:
+            self.placeholder.markdown(f"### {self.title}\n\n{''.join(self.tokens)} ▌")
+            self.last_render = now
+    
+    def finish(self, insight: Optional[dict]):
+        """Hand the completed response over to the regular insight renderer"""
+        if insight:
+            with self.placeholder.container():
+                render_single_insight(insight)
+        else:
+            self.placeholder.empty()
+
+def generate_enhanced_insights(client_name, client_data, portfolio_data, selected_model, user_role, rag_system, use_knowledge_base=True,
+                               concurrent=False, max_workers=MAX_CONCURRENT_PROMPTS, stream=False, use_cache=True,
+                               context_token_budget=None):
     """Generate enhanced AI insights with better prompts and handling"""
     
-    insights = []
     role_obj = ROLES[user_role]
     ai_system = st.session_state.ai_system
     
     # Prepare client info for AI
-    client_info = {
-        'client_name': client_name,
-        'client_type': client_data['type'],
-        'aum': client_data['aum'],
-        'satisfaction': client_data['satisfaction'],
-        'churn_risk': client_data['churn_risk'],
-        'status': client_data['status']
-    }
+    client_info = build_client_info(client_name, client_data)
+    
+    if concurrent and len(role_obj.ai_prompts) > 1:
+        return generate_insights_concurrently(
+            client_name, client_data, selected_model, user_role, rag_system,
+            use_knowledge_base, ai_system, client_info, max_workers, stream, use_cache, context_token_budget
+        )
+    
+    insights = []
     
     # Generate insights for each available prompt type
     for prompt_key, prompt_template in role_obj.ai_prompts.items():
         with st.status(f"🧠 Generating {prompt_key.replace('_', ' ').title()} insights...") as status:
             
-            # Fill in the prompt template
-            prompt = prompt_template.format(
-                client_name=client_name,
-                aum=client_data['aum'],
-                satisfaction=client_data['satisfaction'],
-                churn_risk=client_data['churn_risk'],
-                client_type=client_data['type']
+            enhanced_prompt = prepare_analysis_prompt(
+                ai_system, prompt_key, prompt_template, client_name, client_data,
+                user_role, rag_system, use_knowledge_base, context_token_budget
             )
             
-            # Add knowledge base context if enabled
-            context = ""
-            if use_knowledge_base:
-                kb_context = rag_system.get_context_for_prompt(prompt_key, client_name, user_role)
-                context = kb_context
-            
-            # Enhance the prompt
-            enhanced_prompt = ai_system.enhance_prompt(prompt, context, user_role)
+            live_card = LiveInsightCard(f"{prompt_key.replace('_', ' ').title()} - {client_name}") if stream else None
             
             # Call AI with retry logic
             ai_response = ai_system.call_ai_with_retry(
                 enhanced_prompt,
                 selected_model,
                 user_role,
-                client_info
+                client_info,
+                on_token=live_card.append if live_card else None,
+                use_cache=use_cache
             )
             
-            if ai_response and len(ai_response) > 100:
-                status.update(label=f"✅ {prompt_key.replace('_', ' ').title()} analysis complete", state="complete")
-                
-                # Determine priority based on content
-                priority = "HIGH" if client_data['churn_risk'] > 20 or "urgent" in ai_response.lower() else "MEDIUM"
-                
-                insights.append({
-                    'type': prompt_key.replace('_', ' ').title(),
-                    'priority': priority,
-                    'title': f"{prompt_key.replace('_', ' ').title()} - {client_name}",
-                    'content': ai_response,
-                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'model': selected_model,
-                    'role': user_role
-                })
-            else:
-                status.update(label=f"❌ Failed to generate {prompt_key} insights", state="error")
-                st.warning(f"Could not generate complete insights for {prompt_key}")
+            insight = build_insight(prompt_key, ai_response, client_name, client_data, selected_model, user_role)
+            if live_card:
+                live_card.finish(insight)
+            update_insight_status(status, prompt_key, insight)
+            if insight:
+                insights.append(insight)
     
     return insights
 
+def generate_insights_concurrently(client_name, client_data, selected_model, user_role, rag_system,
+                                   use_knowledge_base, ai_system, client_info, max_workers=MAX_CONCURRENT_PROMPTS, stream=False,
+                                   use_cache=True, context_token_budget=None):
+    """Dispatch every prompt type for a role at once on a bounded thread pool"""
+    
+    role_obj = ROLES[user_role]
+    prompt_keys = list(role_obj.ai_prompts.keys())
+    
+    # Status widgets are created up front in the script thread and updated as results land
+    statuses = {
+        prompt_key: st.status(f"🧠 Generating {prompt_key.replace('_', ' ').title()} insights...", state="running")
+        for prompt_key in prompt_keys
+    }
+    
+    # Workers push streamed tokens onto a queue; only the script thread touches the cards
+    live_cards = {}
+    token_updates = queue.Queue()
+    if stream:
+        for prompt_key in prompt_keys:
+            with statuses[prompt_key]:
+                live_cards[prompt_key] = LiveInsightCard(f"{prompt_key.replace('_', ' ').title()} - {client_name}")
+    
+    # Worker threads need the script context so retry warnings still render
+    script_ctx = get_script_run_ctx()
+    results = {}
+    
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(max_workers, len(prompt_keys))),
+        thread_name_prefix="insight-worker",
+        initializer=add_script_run_ctx,
+        initargs=(None, script_ctx)
+    ) as executor:
+        futures = {}
+        for prompt_key in prompt_keys:
+            enhanced_prompt = prepare_analysis_prompt(
+                ai_system, prompt_key, role_obj.ai_prompts[prompt_key], client_name, client_data,
+                user_role, rag_system, use_knowledge_base, context_token_budget
+            )
+            on_token = (lambda token, key=prompt_key: token_updates.put((key, token))) if stream else None
+            future = executor.submit(
+                ai_system.call_ai_with_retry,
+                enhanced_prompt,
+                selected_model,
+                user_role,
+                client_info,
+                on_token=on_token,
+                use_cache=use_cache
+            )
+            futures[future] = prompt_key
+        
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=STREAM_REFRESH_SECONDS, return_when=FIRST_COMPLETED)
+            flush_token_updates(token_updates, live_cards)
+            
+            for future in done:
+                prompt_key = futures[future]
+                try:
+                    ai_response = future.result()
+                except Exception as e:
+                    st.error(f"AI Error: {str(e)}")
+                    ai_response = None
+                
+                insight = build_insight(prompt_key, ai_response, client_name, client_data, selected_model, user_role)
+                if prompt_key in live_cards:
+                    live_cards[prompt_key].finish(insight)
+                update_insight_status(statuses[prompt_key], prompt_key, insight)
+                if insight:
+                    results[prompt_key] = insight
+    
+    # Keep the role's prompt order regardless of completion order
+    return [results[prompt_key] for prompt_key in prompt_keys if prompt_key in results]
+
+def flush_token_updates(token_updates, live_cards):
+    """Drain streamed tokens queued by worker threads into their live cards"""
+    pending_tokens = {}
+    while True:
+        try:
+            prompt_key, token = token_updates.get_nowait()
+        except queue.Empty:
+            break
+        pending_tokens.setdefault(prompt_key, []).append(token)
+    
+    for prompt_key, tokens in pending_tokens.items():
+        live_cards[prompt_key].append("".join(tokens), force=True)
+
+# Batch analysis results, one JSON Lines file per run
+BATCH_RESULTS_DIR = os.environ.get("AI_BATCH_RESULTS_DIR", os.path.join(".ai_cache", "batches"))
+
+# Jobs queued behind the running ones; prompts are only prepared just ahead of the model server
+BATCH_QUEUE_DEPTH = 2
+BATCH_MESSAGE_LIMIT = 20  # Latest retry warnings and errors shown while a batch runs
+
+@dataclass
+class BatchReport:
+    """Outcome of a batch analysis over many clients"""
+    batch_id: str
+    jobs: int = 0
+    insights: Dict[str, List[dict]] = field(default_factory=dict)  # Client -> insights in prompt order
+    failed: List[Tuple[str, str]] = field(default_factory=list)    # (client, prompt key)
+    elapsed: float = 0.0
+    
+    @property
+    def completed(self) -> int:
+        return sum(len(insights) for insights in self.insights.values()) + len(self.failed)
+    
+    @property
+    def jobs_per_minute(self) -> float:
+        return 60 * self.completed / self.elapsed if self.elapsed else 0.0
+
+class BatchResultLog:
+    """Append-only JSON Lines record of a batch run, written as each job finishes"""
+    
+    def __init__(self, directory: str = BATCH_RESULTS_DIR, batch_id: Optional[str] = None):
+        os.makedirs(directory, exist_ok=True)
+        if batch_id is None:
+            # Timestamped IDs sort chronologically; a suffix separates runs started in the same second
+            stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+            batch_id, suffix = stamp, 1
+            while os.path.exists(os.path.join(directory, f"{batch_id}.jsonl")):
+                suffix += 1
+                batch_id = f"{stamp}-{suffix}"
+        self.batch_id = batch_id
+        self.path = os.path.join(directory, f"{batch_id}.jsonl")
+    
+    def append(self, record: dict):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+    
+    def write_header(self, jobs: int, selected_model: str, user_role: str):
+        """First line of the log: the planned job count, so a run cut short is not mistaken for a complete one"""
+        self.append({'header': True, 'jobs': jobs, 'model': selected_model, 'role': user_role,
+                     'started': datetime.now().isoformat(timespec='seconds')})
+    
+    @staticmethod
+    def list_batches(directory: str = BATCH_RESULTS_DIR) -> List[str]:
+        """Saved batch IDs, newest first"""
+        if not os.path.isdir(directory):
+            return []
+        return sorted((name[:-len('.jsonl')] for name in os.listdir(directory) if name.endswith('.jsonl')), reverse=True)
+    
+    @staticmethod
+    def load(batch_id: str, directory: str = BATCH_RESULTS_DIR) -> BatchReport:
+        """Rebuild a report from a saved run; a run that was cut short loads what had finished"""
+        report = BatchReport(batch_id=batch_id)
+        planned = None
+        with open(os.path.join(directory, f"{batch_id}.jsonl"), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Partial last line from an interrupted run
+                if record.get('header'):
+                    planned = record['jobs']
+                    continue
+                report.jobs += 1
+                report.elapsed = max(report.elapsed, record.get('batch_elapsed', 0.0))
+                if record.get('insight'):
+                    report.insights.setdefault(record['client_name'], []).append(record['insight'])
+                else:
+                    report.failed.append((record['client_name'], record['prompt_key']))
+        # Logs written before headers existed only know the jobs that finished
+        if planned is not None:
+            report.jobs = planned
+        return report
+
+def run_analysis_job(ai_system, client_name, client_data, prompt_key, prompt_template, selected_model, user_role, rag_system,
+                     use_knowledge_base=True, use_cache=True, context_token_budget=None, on_token=None, on_warning=None,
+                     analytics_context=None):
+    """Prepare and run one client and prompt pair without touching the page (batch and background worker)"""
+    enhanced_prompt = prepare_analysis_prompt(
+        ai_system, prompt_key, prompt_template, client_name, client_data,
+        user_role, rag_system, use_knowledge_base, context_token_budget, analytics_context
+    )
+    ai_response = ai_system.call_ai_with_retry(
+        enhanced_prompt,
+        selected_model,
+        user_role,
+        build_client_info(client_name, client_data),
+        on_token=on_token,
+        use_cache=use_cache,
+        on_warning=on_warning
+    )
+    return build_insight(prompt_key, ai_response, client_name, client_data, selected_model, user_role)
+
+def render_batch_report(report):
+    """Summary table for a batch run with each client's insights underneath"""
+    import pandas as pd
+    
+    failed_by_client = {}
+    for client_name, _ in report.failed:
+        failed_by_client[client_name] = failed_by_client.get(client_name, 0) + 1
+    client_names = list(report.insights) + [name for name in failed_by_client if name not in report.insights]
+    
+    st.caption(
+        f"Batch {report.batch_id}: {report.completed}/{report.jobs} analyses in {report.elapsed:.0f}s "
+        f"({report.jobs_per_minute:.1f} per minute)"
+    )
+    summary_df = pd.DataFrame([
+        {
+            'Client': client_name,
+            'Insights': len(report.insights.get(client_name, [])),
+            'High Priority': sum(insight['priority'] == 'HIGH' for insight in report.insights.get(client_name, [])),
+            'Failed': failed_by_client.get(client_name, 0)
+        }
+        for client_name in client_names
+    ])
+    st.dataframe(summary_df, hide_index=True, use_container_width=True)
+    
+    for client_name in client_names:
+        with st.expander(f"🏢 {client_name}"):
+            render_insights_display(report.insights.get(client_name, []))
+
+# Background analysis jobs; the pool is shared by every session, so size it for the model server.
+# Background workers get at most half the connection pool, and interactive and batch runs the rest,
+# so neither waits on the pool's blocking connection limit because of the other.
+BACKGROUND_WORKERS = max(1, min(int(os.environ.get("AI_BACKGROUND_WORKERS", MAX_CONCURRENT_PROMPTS)),
+                                OLLAMA_MAX_CONNECTIONS // 2))
+MAX_FOREGROUND_REQUESTS = OLLAMA_MAX_CONNECTIONS - BACKGROUND_WORKERS
+JOB_POLL_SECONDS = 1.0
+JOB_RETENTION_SECONDS = 3600  # Finished jobs stay available for polling this long
+
+@dataclass
+class AnalysisJob:
+    """State of one background analysis, shared by every session that asked for it"""
+    job_id: str
+    key: str
+    client_name: str
+    prompt_key: str
+    state: str = "queued"  # queued, running, done or failed
+    insight: Optional[dict] = None
+    error: Optional[str] = None
+    messages: List[str] = field(default_factory=list)  # Retry warnings
+    tokens: List[str] = field(default_factory=list)    # Response streamed so far
+    submitted: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+    
+    @property
+    def done(self) -> bool:
+        return self.state in ("done", "failed")
+
+class AnalysisJobRunner:
+    """Process-wide executor for AI analyses that outlives Streamlit reruns
+    
+    submit() returns a job ID for the UI to poll. A request identical to one that is
+    still queued or running joins that job instead of starting another generation.
+    """
+    
+    def __init__(self, ai_system: EnhancedAISystem, rag_system, max_workers: int = BACKGROUND_WORKERS,
+                 retention_seconds: float = JOB_RETENTION_SECONDS):
+        self.ai_system = ai_system
+        self.rag_system = rag_system
+        self.retention_seconds = retention_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="analysis-job")
+        self.lock = threading.Lock()
+        self.jobs = {}       # Job ID -> AnalysisJob
+        self.in_flight = {}  # Request key -> job ID of the unfinished job serving it
+    
+    @staticmethod
+    def make_key(client_name, client_data, prompt_key, selected_model, user_role, use_knowledge_base,
+                 use_cache, context_token_budget) -> str:
+        """Hash everything that determines the analysis"""
+        payload = json.dumps(
+            [client_name, client_data, prompt_key, selected_model, user_role, use_knowledge_base, use_cache, context_token_budget],
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def submit(self, client_name, client_data, prompt_key, selected_model, user_role, use_knowledge_base=True,
+               use_cache=True, context_token_budget=None) -> str:
+        """Queue an analysis, or join the identical one already in progress, and return its job ID"""
+        key = self.make_key(client_name, client_data, prompt_key, selected_model, user_role,
+                            use_knowledge_base, use_cache, context_token_budget)
+        # Cached analytics need the script context, so they are gathered here rather than in the worker,
+        # and before the job is registered so a failure cannot leave it in flight forever
+        analytics_context = client_analytics_context(client_name, user_role)
+        
+        with self.lock:
+            self.prune()
+            job_id = self.in_flight.get(key)
+            if job_id is not None:
+                return job_id
+            job = AnalysisJob(job_id=uuid.uuid4().hex, key=key, client_name=client_name, prompt_key=prompt_key)
+            self.jobs[job.job_id] = job
+            self.in_flight[key] = job.job_id
+        
+        try:
+            self.executor.submit(
+                self.run, job, client_data, selected_model, user_role, use_knowledge_base, use_cache,
+                context_token_budget, analytics_context
+            )
+        except BaseException:
+            with self.lock:
+                self.jobs.pop(job.job_id, None)
+                self.in_flight.pop(key, None)
+            raise
+        return job.job_id
+    
+    def run(self, job, client_data, selected_model, user_role, use_knowledge_base, use_cache, context_token_budget,
+            analytics_context):
+        job.state = "running"
+        try:
+            # Always streamed, so any session polling the job can show progress
+            job.insight = run_analysis_job(
+                self.ai_system, job.client_name, client_data, job.prompt_key,
+                ROLES[user_role].ai_prompts[job.prompt_key], selected_model, user_role, self.rag_system,
+                use_knowledge_base, use_cache, context_token_budget,
+                on_token=job.tokens.append,
+                on_warning=job.messages.append,
+                analytics_context=analytics_context
+            )
+            if job.insight is None:
+                job.error = "The model did not return a usable response"
+        except Exception as e:
+            job.error = str(e)
+        finally:
+            job.finished = time.time()
+            job.state = "done" if job.insight else "failed"
+            with self.lock:
+                self.in_flight.pop(job.key, None)
+    
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        with self.lock:
+            return self.jobs.get(job_id)
+    
+    def prune(self):
+        """Forget finished jobs past the retention period (caller holds the lock)"""
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.done and job.finished < cutoff]:
+            del self.jobs[job_id]
+
+@st.cache_resource
+def get_analysis_job_runner():
+    return AnalysisJobRunner(
+        EnhancedAISystem(session=get_ollama_session(), response_cache=get_response_cache()),
+        get_rag_system()
+    )
+
+@dataclass
+class BatchProgress:
+    """Live counters of a batch analysis running on a background thread"""
+    batch_id: str
+    jobs: int
+    completed: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    finished: Optional[float] = None  # time.time() when the run ended
+    error: Optional[str] = None       # Set if the run itself stopped early
+    messages: deque = field(default_factory=lambda: deque(maxlen=BATCH_MESSAGE_LIMIT))  # Latest warnings
+    
+    @property
+    def done(self) -> bool:
+        return self.finished is not None
+    
+    @property
+    def jobs_per_minute(self) -> float:
+        return 60 * self.completed / self.elapsed if self.elapsed else 0.0
+
+def run_batch_jobs(progress, result_log, jobs, ai_system, rag_system, selected_model, user_role, use_knowledge_base,
+                   use_cache, context_token_budget, max_workers, queue_depth):
+    """Work through (client, client data, prompt key, analytics context) jobs on a bounded pool (batch thread)
+    
+    At most max_workers requests reach the model server at once and only queue_depth more
+    wait behind them, so a large book never builds up a backlog of prepared prompts.
+    """
+    role_obj = ROLES[user_role]
+    jobs = iter(jobs)
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="batch-worker") as executor:
+            in_flight = {}
+            
+            def fill_queue():
+                while len(in_flight) < max_workers + queue_depth:
+                    job = next(jobs, None)
+                    if job is None:
+                        return
+                    client_name, client_data, prompt_key, analytics_context = job
+                    future = executor.submit(
+                        run_analysis_job, ai_system, client_name, client_data, prompt_key,
+                        role_obj.ai_prompts[prompt_key], selected_model, user_role, rag_system,
+                        use_knowledge_base, use_cache, context_token_budget,
+                        on_warning=progress.messages.append, analytics_context=analytics_context
+                    )
+                    in_flight[future] = (client_name, prompt_key)
+            
+            fill_queue()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    client_name, prompt_key = in_flight.pop(future)
+                    try:
+                        insight = future.result()
+                    except Exception as e:
+                        progress.messages.append(f"AI Error ({client_name}, {prompt_key}): {str(e)}")
+                        insight = None
+                    
+                    progress.elapsed = time.perf_counter() - started
+                    result_log.append({
+                        'client_name': client_name,
+                        'prompt_key': prompt_key,
+                        'insight': insight,
+                        'batch_elapsed': progress.elapsed
+                    })
+                    progress.completed += 1
+                    progress.failed += insight is None
+                fill_queue()
+    except Exception as e:
+        progress.error = str(e)
+    finally:
+        progress.elapsed = time.perf_counter() - started
+        progress.finished = time.time()
+
+class BatchRunner:
+    """Process-wide home of batch analyses, which run on their own threads so reruns cannot abandon them
+    
+    Results go to each run's BatchResultLog as they finish; the UI polls the progress counters.
+    """
+    
+    def __init__(self, retention_seconds: float = JOB_RETENTION_SECONDS):
+        self.retention_seconds = retention_seconds
+        self.lock = threading.Lock()
+        self.runs = {}  # Batch ID -> BatchProgress
+    
+    def start(self, client_store, client_names, selected_model, user_role, rag_system, ai_system,
+              use_knowledge_base=True, max_workers=MAX_CONCURRENT_PROMPTS, use_cache=True, context_token_budget=None,
+              queue_depth=BATCH_QUEUE_DEPTH) -> str:
+        """Plan every prompt of a role for every client, start the run and return its batch ID"""
+        prompt_keys = list(ROLES[user_role].ai_prompts.keys())
+        # Cached analytics need the script context, so each client's is gathered here, once, before the thread starts
+        jobs = []
+        for client_name in client_names:
+            client_data = client_store.client(client_name)
+            analytics_context = client_analytics_context(client_name, user_role)
+            jobs += [(client_name, client_data, prompt_key, analytics_context) for prompt_key in prompt_keys]
+        
+        result_log = BatchResultLog()
+        result_log.write_header(len(jobs), selected_model, user_role)
+        progress = BatchProgress(batch_id=result_log.batch_id, jobs=len(jobs))
+        with self.lock:
+            self.prune()
+            self.runs[progress.batch_id] = progress
+        
+        threading.Thread(
+            target=run_batch_jobs, name=f"batch-{progress.batch_id}", daemon=True,
+            args=(progress, result_log, jobs, ai_system, rag_system, selected_model, user_role, use_knowledge_base,
+                  use_cache, context_token_budget, max_workers, queue_depth)
+        ).start()
+        return progress.batch_id
+    
+    def get(self, batch_id: str) -> Optional[BatchProgress]:
+        with self.lock:
+            return self.runs.get(batch_id)
+    
+    def prune(self):
+        """Forget finished runs past the retention period (caller holds the lock); their logs stay on disk"""
+        cutoff = time.time() - self.retention_seconds
+        for batch_id in [batch_id for batch_id, run in self.runs.items() if run.done and run.finished < cutoff]:
+            del self.runs[batch_id]
+
+@st.cache_resource
+def get_batch_runner():
+    return BatchRunner()
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_batch_progress():
+    """Poll this session's batch run, then rerun to show its saved report once it has finished"""
+    progress = get_batch_runner().get(st.session_state['batch_run'])
+    if progress is None or progress.done:
+        batch_id = st.session_state.pop('batch_run')
+        st.session_state['batch_report'] = BatchResultLog.load(batch_id)
+        if progress is not None and progress.error:
+            st.session_state['batch_error'] = progress.error
+        st.rerun()
+    
+    rate = progress.jobs_per_minute
+    st.progress(progress.completed / progress.jobs if progress.jobs else 1.0,
+                text=f"Batch {progress.batch_id}: completed {progress.completed}/{progress.jobs} analyses in the background")
+    if rate:
+        st.caption(
+            f"⏱️ {progress.elapsed:.0f}s elapsed · {rate:.1f} analyses/min · "
+            f"about {(progress.jobs - progress.completed) / rate:.1f} min remaining · {progress.failed} failed"
+        )
+    for message in list(progress.messages):
+        st.warning(message)
+
+PDF_EXPORT_CACHE_SIZE = 32  # Rendered reports kept, so re-exporting unchanged insights is instant
+
+class ReportExportRunner:
+    """Renders report specs to PDF bytes on a background thread, keeping recent results by spec hash
+    
+    reportlab keeps module-level state, so a single worker renders one report at a time.
+    """
+    
+    def __init__(self, cache_size: int = PDF_EXPORT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-export")
+        self.lock = threading.Lock()
+        self.exports = OrderedDict()  # Spec hash -> Future of the PDF bytes
+    
+    def submit(self, spec) -> str:
+        """Queue a render unless the same spec is cached or rendering, and return its key"""
+        key = report_key(spec)
+        with self.lock:
+            future = self.exports.get(key)
+            if future is not None and not (future.done() and future.exception() is not None):
+                self.exports.move_to_end(key)
+                return key
+            self.exports[key] = self.executor.submit(render_report_bytes, spec)
+            while len(self.exports) > self.cache_size:
+                self.exports.popitem(last=False)
+        return key
+    
+    def get(self, key: str) -> Optional[Future]:
+        with self.lock:
+            return self.exports.get(key)
+
+@st.cache_resource
+def get_report_export_runner():
+    return ReportExportRunner()
+
+def publish_insights(insights, client_name):
+    """Make a finished analysis the current one; any export of the previous insights no longer applies"""
+    st.session_state['current_insights'] = insights
+    st.session_state['insights_client'] = client_name
+    st.session_state['insights_timestamp'] = datetime.now()
+    st.session_state.pop('pdf_export', None)
+
+def queue_insights_export(insights, client_name):
+    """Start rendering the insights PDF; render_pdf_export offers the download once it is ready"""
+    st.session_state['pdf_export'] = {
+        'key': get_report_export_runner().submit(insights_report_spec(insights, client_name)),
+        'file_name': insights_report_name(client_name, insights),
+    }
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_pdf_export_progress():
+    """Wait for the insights PDF, then rerun so the download button replaces this notice"""
+    future = get_report_export_runner().get(st.session_state['pdf_export']['key'])
+    if future is None or future.done():
+        st.rerun()
+    st.caption("📄 Building PDF report in the background...")
+
+def render_pdf_export():
+    export = st.session_state['pdf_export']
+    future = get_report_export_runner().get(export['key'])
+    if future is None:
+        # Evicted from the export cache; the Export button renders it again
+        del st.session_state['pdf_export']
+    elif not future.done():
+        render_pdf_export_progress()
+    elif future.exception() is not None:
+        st.error(f"PDF export failed: {future.exception()}")
+    else:
+        st.download_button(
+            "⬇️ Download PDF Report",
+            data=future.result(),
+            file_name=export['file_name'],
+            mime="application/pdf",
+            use_container_width=True
+        )
+
+JOB_STATE_LABELS = {
+    'queued': ("⏳", "running"),
+    'running': ("🧠", "running"),
+    'done': ("✅", "complete"),
+    'failed': ("❌", "error"),
+}
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_analysis_jobs(show_tokens=False):
+    """Poll this session's background analyses and publish the insights once all have finished"""
+    runner = get_analysis_job_runner()
+    submitted = st.session_state['analysis_jobs']
+    jobs = [runner.get(job_id) for job_id in submitted['job_ids']]
+    jobs = [job for job in jobs if job is not None]
+    finished = sum(job.done for job in jobs)
+    
+    st.progress(finished / len(jobs) if jobs else 1.0,
+                text=f"Analysing {submitted['client_name']} in the background: {finished}/{len(jobs)} complete")
+    for job in jobs:
+        icon, state = JOB_STATE_LABELS[job.state]
+        title = job.prompt_key.replace('_', ' ').title()
+        with st.status(f"{icon} {title}", state=state, expanded=show_tokens and job.state == "running"):
+            for message in list(job.messages):
+                st.warning(message)
+            if show_tokens and job.state == "running" and job.tokens:
+                st.markdown(f"{''.join(job.tokens)} ▌")
+            if job.error:
+                st.caption(job.error)
+    
+    if finished == len(jobs):
+        insights = [job.insight for job in jobs if job.insight]
+        publish_insights(insights, submitted['client_name'])
+        if submitted.get('generate_report') and insights:
+            queue_insights_export(insights, submitted['client_name'])
+        del st.session_state['analysis_jobs']
+        st.rerun()
+
 def render_insights_display(insights):
     """Render insights with enhanced formatting"""
     
@@ -753,7 +1742,7 @@ def main():
     role_obj = ROLES[selected_role]
     
     # Load data
-    clients_data, portfolio_data = load_enhanced_client_data()
+    client_store = load_client_store()
     
     # Check AI status
     ollama_running, available_models = check_ollama_status()
@@ -792,14 +1781,17 @@ def main():
         else:
             st.error("❌ AI System Offline")
             st.code("Run: ollama serve")
+            if st.button("🔄 Check again"):
+                get_ollama_status_monitor().refresh()
+                st.rerun()
             selected_model = None
         
         # Client Selection
         st.markdown("### 🏢 Client Selection")
         if "view_all_clients" in role_obj.permissions:
-            available_clients = list(clients_data.keys())
+            available_clients = client_store.client_names
         else:
-            available_clients = list(clients_data.keys())[:2]  # Limited access
+            available_clients = client_store.client_names[:2]  # Limited access
         
         selected_client = st.selectbox(
             "Select Client",
@@ -811,6 +1803,35 @@ def main():
             ai_timeout = st.slider("AI Timeout (seconds)", 30, 180, 90)
             use_streaming = st.checkbox("Enable response streaming", value=False)
             max_retries = st.number_input("Max retry attempts", 1, 5, 2)
+            run_concurrently = st.checkbox(
+                "Run analyses concurrently",
+                value=True,
+                help="Dispatch all prompt types at once. Set OLLAMA_NUM_PARALLEL on the server to benefit fully."
+            )
+            # Capped by the connections left over after the background workers
+            max_concurrent_requests = st.slider(
+                "Max concurrent AI requests",
+                1, MAX_FOREGROUND_REQUESTS, min(MAX_CONCURRENT_PROMPTS, MAX_FOREGROUND_REQUESTS),
+                help="Upper bound on requests sent to the model server at once, for concurrent and batch runs"
+            ) if MAX_FOREGROUND_REQUESTS > 1 else 1
+            run_in_background = st.checkbox(
+                "Run analyses in the background",
+                value=True,
+                help="Analyses keep running while you use the app, and identical requests from other analysts share one generation"
+            )
+            use_response_cache = st.checkbox(
+                "Reuse cached AI responses",
+                value=True,
+                help="Identical model, settings and prompts return the stored answer instantly"
+            )
+            context_token_budget = st.slider(
+                "Knowledge base context (tokens)",
+                300, 4000, CONTEXT_TOKEN_BUDGET, step=100,
+                help="Upper bound on retrieved passages added to each prompt"
+            )
+            if st.button("🗑️ Clear response cache"):
+                get_response_cache().clear()
+                st.success("Response cache cleared")
     
     # Main content - Tabs
     tab1, tab2, tab3, tab4 = st.tabs([
@@ -822,7 +1843,7 @@ def main():
     
     with tab1:
         # Dashboard content
-        client_info = clients_data[selected_client]
+        client_info = client_store.client(selected_client)
         st.header(f"📋 {selected_client}")
         
         # Metrics
@@ -838,13 +1859,19 @@ def main():
                      f"{'+' if churn_delta > 0 else ''}{churn_delta}%",
                      delta_color="inverse")
         with col4:
-            st.metric("Funded Ratio", f"{client_info.get('funded_ratio', 'N/A'):.1%}")
+            funded_ratio = client_info.get('funded_ratio')
+            st.metric("Funded Ratio", "N/A" if funded_ratio is None else f"{funded_ratio:.1%}")
         with col5:
             st.metric("Fee Rate", f"{client_info['fee_rate']}%")
         
+        # Imported here rather than at module level so importing the app stays cheap for workers and
+        # tests; every session's first render still loads them (IMPORT_BENCHMARK times that run too)
+        import pandas as pd
+        import plotly.express as px
+        
         # Portfolio visualization
         st.subheader("📊 Portfolio Analysis")
-        portfolio_df = pd.DataFrame(portfolio_data[selected_client])
+        portfolio_df = client_store.holdings_frame(selected_client)
         
         col1, col2 = st.columns(2)
         with col1:
@@ -872,6 +1899,39 @@ def main():
             )
             fig.add_hline(y=0, line_dash="dash", line_color="gray")
             st.plotly_chart(fig, use_container_width=True)
+        
+        # Stress testing
+        stress_result = get_stress_results(client_store.version).get(selected_client)
+        if "risk_analysis" in role_obj.permissions and stress_result:
+            st.subheader("🧪 Stress Testing")
+            monte_carlo = stress_result.monte_carlo
+            
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Median Funded Ratio (1Y)", f"{monte_carlo['median']:.1%}",
+                          f"{monte_carlo['median'] - stress_result.funded_ratio:+.1%}")
+            with col2:
+                st.metric("5th Percentile", f"{monte_carlo['p5']:.1%}")
+            with col3:
+                st.metric("1st Percentile", f"{monte_carlo['p1']:.1%}")
+            with col4:
+                st.metric(f"P(Funded < {UNDERFUNDED_THRESHOLD:.0%})", f"{monte_carlo['prob_underfunded']:.1%}")
+            
+            scenario_df = pd.DataFrame(stress_result.scenarios)
+            scenario_df['asset_return'] *= 100
+            scenario_df['funded_ratio'] *= 100
+            st.dataframe(
+                scenario_df,
+                column_config={
+                    'scenario': "Scenario",
+                    'asset_return': st.column_config.NumberColumn("Asset Return", format="%.1f%%"),
+                    'asset_change': st.column_config.NumberColumn("Asset Change ($B)", format="%.1f"),
+                    'funded_ratio': st.column_config.NumberColumn("Funded Ratio", format="%.1f%%")
+                },
+                hide_index=True,
+                use_container_width=True
+            )
+            st.caption(f"Monte Carlo over {monte_carlo['paths']:,} one-year paths of correlated equity, rate and private-market factors")
     
     with tab2:
         st.header(f"🧠 Enhanced {selected_role} AI Analysis")
@@ -926,32 +1986,62 @@ def main():
             # Run Analysis Button
             if st.button("🚀 Run Enhanced AI Analysis", type="primary", use_container_width=True):
                 
-                with st.spinner(f"Running enhanced {analysis_type} analysis with {selected_model}..."):
-                    
-                    # Check if quick analysis was triggered
-                    if 'quick_analysis' in st.session_state:
-                        analysis_type = st.session_state['quick_analysis']
-                        del st.session_state['quick_analysis']
-                    
-                    # Generate insights
-                    insights = generate_enhanced_insights(
-                        selected_client,
-                        clients_data[selected_client],
-                        portfolio_data,
-                        selected_model,
-                        selected_role,
-                        rag_system,
-                        use_knowledge_base
-                    )
-                    
-                    # Store in session state
-                    st.session_state['current_insights'] = insights
-                    st.session_state['insights_timestamp'] = datetime.now()
-                    
-                    st.success(f"✅ Generated {len(insights)} comprehensive insights")
+                # Check if quick analysis was triggered
+                if 'quick_analysis' in st.session_state:
+                    analysis_type = st.session_state['quick_analysis']
+                    del st.session_state['quick_analysis']
+                
+                if run_in_background:
+                    # Jobs keep running through reruns; identical requests from other sessions are shared
+                    runner = get_analysis_job_runner()
+                    st.session_state['analysis_jobs'] = {
+                        'client_name': selected_client,
+                        'generate_report': generate_report,
+                        'job_ids': [
+                            runner.submit(
+                                selected_client,
+                                client_store.client(selected_client),
+                                prompt_key,
+                                selected_model,
+                                selected_role,
+                                use_knowledge_base,
+                                use_cache=use_response_cache,
+                                context_token_budget=context_token_budget
+                            )
+                            for prompt_key in role_obj.ai_prompts
+                        ]
+                    }
+                    st.info("🕒 Analysis queued. You can keep using the app while it runs.")
+                else:
+                    with st.spinner(f"Running enhanced {analysis_type} analysis with {selected_model}..."):
+                        
+                        # Generate insights
+                        insights = generate_enhanced_insights(
+                            selected_client,
+                            client_store.client(selected_client),
+                            client_store.holdings_records(selected_client),
+                            selected_model,
+                            selected_role,
+                            rag_system,
+                            use_knowledge_base,
+                            concurrent=run_concurrently,
+                            max_workers=max_concurrent_requests,
+                            stream=use_streaming,
+                            use_cache=use_response_cache,
+                            context_token_budget=context_token_budget
+                        )
+                        
+                        # Store in session state
+                        publish_insights(insights, selected_client)
+                        
+                        st.success(f"✅ Generated {len(insights)} comprehensive insights")
                     
-                    if generate_report:
-                        st.info("📄 PDF report generation coming soon...")
+                    if generate_report and insights:
+                        queue_insights_export(insights, selected_client)
+            
+            # Background analyses are polled until they finish, then shown below
+            if st.session_state.get('analysis_jobs'):
+                render_analysis_jobs(use_streaming)
             
             # Display insights
             if 'current_insights' in st.session_state:
@@ -970,11 +2060,52 @@ def main():
                     if st.button("📧 Email Insights", use_container_width=True):
                         st.info("Email functionality coming soon...")
                 with col2:
-                    if st.button("📄 Export PDF", use_container_width=True):
-                        st.info("PDF export coming soon...")
+                    insights = st.session_state['current_insights']
+                    if st.button("📄 Export PDF", use_container_width=True, disabled=not insights):
+                        queue_insights_export(insights, st.session_state.get('insights_client', selected_client))
+                    if st.session_state.get('pdf_export'):
+                        render_pdf_export()
                 with col3:
                     if st.button("💾 Save to Knowledge Base", use_container_width=True):
                         st.success("Insights saved to knowledge base")
+            
+            # Batch mode: every prompt for every client the role can see
+            if "view_all_clients" in role_obj.permissions:
+                st.markdown("---")
+                st.markdown("## 🌐 Batch Analysis (All Clients)")
+                st.caption(
+                    f"Runs {len(role_obj.ai_prompts)} analyses for each of {len(available_clients)} clients, "
+                    f"at most {max_concurrent_requests} at a time. Results are saved as each one finishes."
+                )
+                
+                # The batch runs on a background thread, so using the rest of the page does not cancel it
+                if st.button("🚀 Run Batch Analysis", use_container_width=True,
+                             disabled='batch_run' in st.session_state):
+                    st.session_state['batch_run'] = get_batch_runner().start(
+                        client_store,
+                        available_clients,
+                        selected_model,
+                        selected_role,
+                        rag_system,
+                        st.session_state.ai_system,
+                        use_knowledge_base,
+                        max_workers=max_concurrent_requests,
+                        use_cache=use_response_cache,
+                        context_token_budget=context_token_budget
+                    )
+                if st.session_state.get('batch_run'):
+                    render_batch_progress()
+                if st.session_state.get('batch_error'):
+                    st.error(f"Batch stopped early: {st.session_state.pop('batch_error')}")
+                
+                saved_batches = BatchResultLog.list_batches()
+                if saved_batches:
+                    current_batch = st.session_state.get('batch_report')
+                    default_index = saved_batches.index(current_batch.batch_id) if current_batch and current_batch.batch_id in saved_batches else 0
+                    batch_id = st.selectbox("Saved batch runs", saved_batches, index=default_index)
+                    if current_batch is None or current_batch.batch_id != batch_id:
+                        current_batch = BatchResultLog.load(batch_id)
+                    render_batch_report(current_batch)
     
     with tab3:
         st.header("📚 Knowledge Base & Document Management")
@@ -1038,22 +2169,92 @@ def main():
                 with col1:
                     if st.button("📤 Upload Document", type="primary", use_container_width=True):
                         with st.spinner("Processing document..."):
-                            # Read file content
-                            file_content = uploaded_file.read()
+                            content_hash = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
                             
-                            # Add to RAG system
-                            doc_id = rag_system.add_document(
-                                file_content=str(file_content[:1000]),
-                                file_name=uploaded_file.name,
-                                document_type=doc_type,
-                                client_name=doc_client,
-                                roles_allowed=roles_with_access,
-                                uploaded_by=selected_role
-                            )
+                            # Extract clean text page by page
+                            file_content = None
+                            if rag_system.has_content(content_hash):
+                                st.info("This file is already in the knowledge base")
+                            else:
+                                try:
+                                    file_content = extract_text(uploaded_file, uploaded_file.name)
+                                except ExtractionError as e:
+                                    st.error(f"❌ {str(e)}")
                             
-                            st.success(f"✅ Document uploaded successfully!")
-                            st.info(f"Document ID: {doc_id}")
-                            st.balloons()
+                            if file_content is not None:
+                                # Add to RAG system
+                                doc_id = rag_system.add_document(
+                                    file_content=file_content,
+                                    file_name=uploaded_file.name,
+                                    document_type=doc_type,
+                                    client_name=doc_client,
+                                    roles_allowed=roles_with_access,
+                                    uploaded_by=selected_role,
+                                    content_hash=content_hash
+                                )
+                                
+                                # Cached analyses for this client no longer reflect its documents
+                                get_response_cache().invalidate_client(doc_client)
+                                
+                                st.success(f"✅ Document uploaded successfully!")
+                                st.info(f"Document ID: {doc_id}")
+                                if not file_content:
+                                    st.warning("No text could be extracted; the document is searchable by name only")
+                                st.balloons()
+            
+            # Bulk import, e.g. the reports PDF_GENERATOR.py writes to knowledge_base_samples/
+            with st.expander("📂 Bulk Import Folder"):
+                # Only folders under KNOWLEDGE_IMPORT_ROOTS can be imported, so the app can't index arbitrary server paths
+                bulk_folder = st.text_input("Folder on the server", value=SAMPLES_DIR)
+                st.caption(f"Allowed folders: {', '.join(IMPORT_ROOTS)} (set KNOWLEDGE_IMPORT_ROOTS to change)")
+                col1, col2 = st.columns(2)
+                with col1:
+                    bulk_roles = st.multiselect(
+                        "Roles with Access",
+                        list(ROLES.keys()),
+                        default=[selected_role],
+                        key="bulk_roles"
+                    )
+                with col2:
+                    bulk_default_client = st.selectbox(
+                        "Client for files not named after a client",
+                        ["Skip these files"] + available_clients,
+                        key="bulk_default_client"
+                    )
+                
+                if st.button("📥 Import Folder", use_container_width=True):
+                    if not within_roots(bulk_folder, IMPORT_ROOTS):
+                        st.error(f"❌ {bulk_folder} is outside the allowed import folders")
+                    elif not os.path.isdir(bulk_folder):
+                        st.error(f"❌ Folder not found: {bulk_folder}")
+                    else:
+                        progress_bar = st.progress(0.0, text="Hashing files...")
+                        report = ingest_directory(
+                            rag_system,
+                            bulk_folder,
+                            bulk_roles,
+                            uploaded_by=selected_role,
+                            clients=available_clients,
+                            default_client=None if bulk_default_client == "Skip these files" else bulk_default_client,
+                            progress=lambda done, total: progress_bar.progress(done / total, text=f"Extracted {done}/{total} files"),
+                            roots=IMPORT_ROOTS
+                        )
+                        progress_bar.empty()
+                        
+                        # Cached analyses for these clients no longer reflect their documents
+                        for client in report.clients:
+                            get_response_cache().invalidate_client(client)
+                        
+                        st.success(
+                            f"✅ Imported {len(report.added)} documents in {report.elapsed:.1f}s "
+                            f"({report.files_per_second:.1f} files/s)"
+                        )
+                        if report.duplicates:
+                            st.info(f"Skipped {len(report.duplicates)} files already in the knowledge base")
+                        if report.unmatched:
+                            st.warning(f"Skipped {len(report.unmatched)} files with no matching client")
+                        for path, error in report.failed.items():
+                            st.error(f"❌ {os.path.basename(path)}: {error}")
         else:
             st.warning("⚠️ You don't have permission to upload documents")
         
@@ -1110,8 +2311,7 @@ def main():
         st.markdown("---")
         st.markdown("### 📑 Recent Documents")
         
-        all_docs = rag_system.search_documents("", selected_role)
-        recent_docs = sorted(all_docs, key=lambda x: x['upload_date'], reverse=True)[:5]
+        recent_docs = rag_system.recent_documents(selected_role, limit=5)
         
         if recent_docs:
             for doc in recent_docs:
@@ -1129,87 +2329,118 @@ def main():
         st.header("📈 Reports & Analytics")
         
         if "performance_reports" in role_obj.permissions:
+            col1, col2 = st.columns([1, 1])
+            with col1:
+                history_period = st.selectbox("History", list(HISTORY_PERIODS.keys()), index=1)
+            with col2:
+                compare_clients = st.checkbox("Compare all clients", value=False)
+            
+            # One history and one batched metrics pass covers every client, window and the benchmark
+            all_clients = client_store.client_names
+            returns, metrics = get_risk_analytics(tuple(all_clients))
+            window = list(HISTORY_PERIODS.keys()).index(history_period)
+            client_col = all_clients.index(selected_client)
+            bench_col = len(all_clients)
+            
+            def metric_value(name, column=client_col):
+                return metrics[name][window, column]
+            
+            label = f" ({SIMULATED_LABEL})" if SIMULATED_HISTORIES else ""
+            if SIMULATED_HISTORIES:
+                st.warning(
+                    f"{SIMULATED_LABEL}: the returns and risk figures below come from a seeded synthetic history, "
+                    "not from client data. Use the client's reports for actual results."
+                )
+            
             # Performance metrics
-            st.subheader("Performance Summary")
+            st.subheader(f"Performance Summary{label}")
             
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("YTD Return", "+8.4%", "+2.1%")
+                st.metric(f"Return ({history_period})", f"{metric_value('total_return'):+.1%}",
+                          f"{metric_value('total_return') - metric_value('total_return', bench_col):+.1%}")
             with col2:
-                st.metric("Sharpe Ratio", "1.24", "+0.15")
+                st.metric("Sharpe Ratio", f"{metric_value('sharpe_ratio'):.2f}",
+                          f"{metric_value('sharpe_ratio') - metric_value('sharpe_ratio', bench_col):+.2f}")
             with col3:
-                st.metric("Information Ratio", "0.87", "+0.08")
+                st.metric("Information Ratio", f"{metric_value('information_ratio'):.2f}")
             with col4:
-                st.metric("Max Drawdown", "-12.4%", "-2.1%", delta_color="inverse")
+                st.metric("Max Drawdown", f"{metric_value('max_drawdown'):.1%}",
+                          f"{metric_value('max_drawdown') - metric_value('max_drawdown', bench_col):+.1%}",
+                          delta_color="inverse")
             
-            # Generate performance chart
-            dates = pd.date_range(start='2024-01-01', periods=60, freq='D')
-            base_return = 100
-            returns = []
-            benchmark_returns = []
+            import pandas as pd
+            import plotly.express as px
             
-            for i in range(60):
-                daily_return = np.random.normal(0.0003, 0.015)
-                benchmark_return = np.random.normal(0.0002, 0.012)
-                base_return *= (1 + daily_return)
-                returns.append(base_return)
-                benchmark_returns.append(100 * (1 + benchmark_return * i * 0.01))
-            
-            performance = pd.DataFrame({
-                'Date': dates,
-                'Portfolio': returns,
-                'Benchmark': benchmark_returns
-            })
+            # Generate performance chart
+            n_days = HISTORY_PERIODS[history_period]
+            shown = available_clients if compare_clients else [selected_client]
+            columns = [all_clients.index(name) for name in shown] + [bench_col]
+            performance = pd.DataFrame(
+                levels_from_returns(returns[-n_days:, columns]),
+                columns=shown + ['Benchmark']
+            )
+            performance.insert(0, 'Date', pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=n_days))
             
             fig = px.line(
                 performance, 
                 x='Date', 
-                y=['Portfolio', 'Benchmark'],
-                title="YTD Performance Comparison",
+                y=shown + ['Benchmark'],
+                title=f"Performance Comparison ({history_period}){label}",
                 labels={'value': 'Cumulative Return (Base 100)', 'variable': 'Series'}
             )
             fig.update_layout(hovermode='x unified')
             st.plotly_chart(fig, use_container_width=True)
             
             # Risk metrics
-            st.subheader("Risk Analytics")
+            st.subheader(f"Risk Analytics{label}")
             
             col1, col2 = st.columns(2)
             
             with col1:
-                # Risk distribution
-                risk_data = pd.DataFrame({
-                    'Risk Factor': ['Market Risk', 'Credit Risk', 'Liquidity Risk', 
-                                   'Operational Risk', 'Model Risk'],
-                    'Contribution': [45, 20, 15, 12, 8]
+                # Tail risk of the selected client across windows
+                var_data = pd.DataFrame({
+                    'Window': list(HISTORY_PERIODS.keys()),
+                    f'Historical VaR {VAR_CONFIDENCE:.0%}': metrics['var_historical'][:, client_col] * 100,
+                    'Historical CVaR': metrics['cvar_historical'][:, client_col] * 100,
+                    f'Parametric VaR {VAR_CONFIDENCE:.0%}': metrics['var_parametric'][:, client_col] * 100,
+                    'Parametric CVaR': metrics['cvar_parametric'][:, client_col] * 100
                 })
                 
                 fig = px.bar(
-                    risk_data,
-                    x='Risk Factor',
-                    y='Contribution',
-                    title="Risk Contribution by Factor (%)",
-                    color='Contribution',
-                    color_continuous_scale='Reds'
+                    var_data,
+                    x='Window',
+                    y=list(var_data.columns[1:]),
+                    barmode='group',
+                    title="1-Day Value at Risk (% of portfolio)",
+                    labels={'value': 'Loss (%)', 'variable': 'Measure'}
                 )
                 st.plotly_chart(fig, use_container_width=True)
             
             with col2:
-                # Tracking error decomposition
-                te_data = pd.DataFrame({
-                    'Source': ['Asset Allocation', 'Security Selection', 
-                              'Currency', 'Timing', 'Other'],
-                    'Contribution': [1.2, 0.8, 0.5, 0.3, 0.2]
-                })
-                
-                fig = px.pie(
-                    te_data,
-                    values='Contribution',
-                    names='Source',
-                    title="Tracking Error Decomposition",
-                    hole=0.4
+                # Risk and return of every visible client over the selected window
+                st.markdown(f"**Risk Summary ({history_period})**")
+                visible_columns = [all_clients.index(name) for name in available_clients]
+                risk_table = pd.DataFrame({
+                    'Return': metrics['total_return'][window, visible_columns] * 100,
+                    'Volatility': metrics['volatility'][window, visible_columns] * 100,
+                    'Sharpe': metrics['sharpe_ratio'][window, visible_columns],
+                    'Tracking Error': metrics['tracking_error'][window, visible_columns] * 100,
+                    'Info Ratio': metrics['information_ratio'][window, visible_columns],
+                    'Max Drawdown': metrics['max_drawdown'][window, visible_columns] * 100,
+                    f'VaR {VAR_CONFIDENCE:.0%}': metrics['var_historical'][window, visible_columns] * 100
+                }, index=available_clients)
+                percent = st.column_config.NumberColumn(format="%.1f%%")
+                ratio = st.column_config.NumberColumn(format="%.2f")
+                st.dataframe(
+                    risk_table,
+                    column_config={
+                        'Return': percent, 'Volatility': percent, 'Sharpe': ratio, 'Tracking Error': percent,
+                        'Info Ratio': ratio, 'Max Drawdown': percent,
+                        f'VaR {VAR_CONFIDENCE:.0%}': st.column_config.NumberColumn(format="%.2f%%")
+                    },
+                    use_container_width=True
                 )
-                st.plotly_chart(fig, use_container_width=True)
         else:
             st.warning("You don't have permission to view performance reports")
 
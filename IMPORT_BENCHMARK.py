@@ -0,0 +1,128 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+# Cold-import budgets in milliseconds; IMPORT_BUDGET_MS overrides the Streamlit app's
+DEFAULT_BUDGETS_MS = {
+    'GEN_AI_IB': float(os.environ.get("IMPORT_BUDGET_MS", "1500")),
+    'PDF_GENERATOR': 150.0,  # Imported by report workers, which should not pay for reportlab until they build
+}
+
+# Modules that must only be imported when a feature first needs them
+LAZY_MODULES = (
+    'pandas', 'plotly.express', 'pyarrow.dataset', 'yfinance', 'pypdf', 'docx', 'openpyxl',
+    'reportlab.platypus', 'matplotlib'
+)
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Importing the app only defers the charting and data-scan libraries to the first script run, which
+# every new session pays for, so that run has a budget of its own (streamlit itself is already loaded)
+FIRST_RENDER_BUDGET_MS = float(os.environ.get("FIRST_RENDER_BUDGET_MS", "3000"))
+
+FIRST_RENDER_SCRIPT = '''
+import sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("GEN_AI_IB.py", default_timeout=300)
+start = time.perf_counter()
+app.run()
+elapsed_ms = (time.perf_counter() - start) * 1000
+if app.exception:
+    sys.exit(app.exception[0].message)
+print("first-render:", elapsed_ms, *(name for name in %r if name in sys.modules))
+''' % (LAZY_MODULES,)
+
+def run_importtime(module: str) -> Dict[str, Tuple[int, int]]:
+    """Import a module in a fresh interpreter and return {module: (self_us, cumulative_us)}"""
+    env = dict(os.environ, PYTHONHASHSEED="0", PYTHONWARNINGS="ignore")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    
+    timings = {}
+    for line in result.stderr.splitlines():
+        # Format: "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+def benchmark(module: str, runs: int) -> Tuple[List[float], Dict[str, Tuple[int, int]]]:
+    """Median-friendly list of cumulative import times (ms) plus the last run's per-module timings"""
+    run_importtime(module)  # Warm-up: compile bytecode and fill the OS file cache
+    totals = []
+    timings = {}
+    for _ in range(runs):
+        timings = run_importtime(module)
+        totals.append(timings[module][1] / 1000)
+    return totals, timings
+
+def run_first_render() -> Tuple[float, List[str]]:
+    """Run the app's script once in a fresh interpreter; return its time (ms) and the lazy modules it loaded"""
+    env = dict(os.environ, PYTHONHASHSEED="0", PYTHONWARNINGS="ignore")
+    result = subprocess.run([sys.executable, "-c", FIRST_RENDER_SCRIPT], cwd=REPO_DIR, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"First render failed:\n{result.stderr[-2000:]}")
+    # Streamlit logs to stdout too, so find the tagged result line
+    line = [line for line in result.stdout.splitlines() if line.startswith("first-render:")][-1]
+    elapsed_ms, *loaded = line.split()[1:]
+    return float(elapsed_ms), loaded
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure cold import time with python -X importtime")
+    parser.add_argument('--module', action='append', dest='modules',
+                        help=f"Module to measure (repeatable; default: {', '.join(DEFAULT_BUDGETS_MS)})")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, help="Budget for every measured module")
+    parser.add_argument('--top', type=int, default=10, help="Show the slowest packages")
+    parser.add_argument('--first-render', action='store_true',
+                        help="Also time the app's first script run (always done when no --module is given)")
+    args = parser.parse_args(argv)
+    
+    failed = False
+    for module in args.modules or list(DEFAULT_BUDGETS_MS):
+        budget_ms = args.budget_ms or DEFAULT_BUDGETS_MS.get(module, DEFAULT_BUDGETS_MS['GEN_AI_IB'])
+        totals, timings = benchmark(module, args.runs)
+        median_ms = statistics.median(totals)
+        
+        print(f"{module}: median {median_ms:.0f} ms over {args.runs} runs "
+              f"(min {min(totals):.0f}, max {max(totals):.0f}), budget {budget_ms:.0f} ms")
+        
+        top_level = [(name, cumulative) for name, (_, cumulative) in timings.items() if "." not in name and name != module]
+        for name, cumulative in sorted(top_level, key=lambda item: item[1], reverse=True)[:args.top]:
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+        
+        eager = [name for name in LAZY_MODULES if name in timings]
+        if eager:
+            print(f"FAIL: imported eagerly: {', '.join(eager)}")
+            failed = True
+        if median_ms > budget_ms:
+            print(f"FAIL: {median_ms:.0f} ms exceeds the {budget_ms:.0f} ms budget")
+            failed = True
+    
+    if args.first_render or not args.modules:
+        run_first_render()  # Warm-up, as for imports
+        renders = [run_first_render() for _ in range(args.runs)]
+        totals = [elapsed_ms for elapsed_ms, _ in renders]
+        median_ms = statistics.median(totals)
+        print(f"First render: median {median_ms:.0f} ms over {args.runs} runs "
+              f"(min {min(totals):.0f}, max {max(totals):.0f}), budget {FIRST_RENDER_BUDGET_MS:.0f} ms")
+        print(f"  loaded on first render: {', '.join(renders[-1][1]) or 'none'}")
+        if median_ms > FIRST_RENDER_BUDGET_MS:
+            print(f"FAIL: first render takes {median_ms:.0f} ms, over the {FIRST_RENDER_BUDGET_MS:.0f} ms budget")
+            failed = True
+    
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
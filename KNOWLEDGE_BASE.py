@@ -0,0 +1,1067 @@
+import bisect
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import threading
+import zlib
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import requests
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Persistent knowledge base location, shared by every session in the process
+KNOWLEDGE_BASE_DIR = os.environ.get("KNOWLEDGE_BASE_DIR", ".knowledge_base")
+
+# Tokens are lowercase alphanumeric runs, so "risk_analysis" matches "risk" and "analysis"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase search terms"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+class Bitset:
+    """Growable packed bitset over integer positions (bit 0 is the high bit of byte 0)"""
+    
+    def __init__(self, bits: Optional[np.ndarray] = None):
+        self.bits = bits if bits is not None else np.zeros(0, dtype=np.uint8)
+    
+    def add(self, pos: int):
+        byte = pos >> 3
+        if byte >= len(self.bits):
+            grown = np.zeros(max(byte + 1, len(self.bits) * 2, 64), dtype=np.uint8)
+            grown[:len(self.bits)] = self.bits
+            self.bits = grown
+        self.bits[byte] |= 0x80 >> (pos & 7)
+    
+    def __and__(self, other: 'Bitset') -> 'Bitset':
+        size = min(len(self.bits), len(other.bits))
+        return Bitset(self.bits[:size] & other.bits[:size])
+    
+    def contains(self, positions: np.ndarray) -> np.ndarray:
+        """Vectorised membership test for an array of positions"""
+        positions = np.asarray(positions, dtype=np.int64)
+        inside = (positions >> 3) < len(self.bits)
+        result = np.zeros(len(positions), dtype=bool)
+        result[inside] = (self.bits[positions[inside] >> 3] & (0x80 >> (positions[inside] & 7))) != 0
+        return result
+    
+    def to_mask(self, size: int) -> np.ndarray:
+        """Unpack into a boolean array of the given length"""
+        mask = np.zeros(size, dtype=bool)
+        unpacked = np.unpackbits(self.bits[:(size + 7) // 8]).view(bool)[:size]
+        mask[:len(unpacked)] = unpacked
+        return mask
+    
+    def positions(self) -> np.ndarray:
+        return np.flatnonzero(np.unpackbits(self.bits))
+
+class AccessIndex:
+    """Per-role and per-client bitsets compiled from document ACLs"""
+    
+    def __init__(self):
+        self.roles = defaultdict(Bitset)
+        self.clients = defaultdict(Bitset)
+        self.combined = {}  # (role, client) -> intersected bitset, reset whenever a position is added
+    
+    def add(self, pos: int, roles_allowed: List[str], client_name: str):
+        for role in roles_allowed:
+            self.roles[role].add(pos)
+        self.clients[client_name].add(pos)
+        self.combined.clear()
+    
+    def allowed(self, user_role: str, client_filter: Optional[str] = None) -> Bitset:
+        """Positions the role may see, optionally restricted to one client"""
+        key = (user_role, client_filter or None)
+        bitset = self.combined.get(key)
+        if bitset is None:
+            bitset = self.roles.get(user_role, Bitset())
+            if client_filter:
+                bitset = bitset & self.clients.get(client_filter, Bitset())
+            self.combined[key] = bitset
+        return bitset
+
+class RecencyIndex:
+    """Per-role document positions kept in upload order, newest last"""
+    
+    def __init__(self):
+        self.entries = defaultdict(list)  # role -> [(upload_date, doc_pos)], sorted
+    
+    def add(self, doc_pos: int, roles_allowed: List[str], upload_date: str):
+        entry = (upload_date, doc_pos)
+        for role in roles_allowed:
+            entries = self.entries[role]
+            # Uploads arrive in time order, so this is an append unless the clock went backwards
+            if not entries or entries[-1] <= entry:
+                entries.append(entry)
+            else:
+                bisect.insort(entries, entry)
+    
+    def recent(self, user_role: str, limit: int) -> List[int]:
+        """Positions of the newest documents a role may see, newest first"""
+        entries = self.entries.get(user_role, [])
+        return [doc_pos for _, doc_pos in reversed(entries[-limit:])] if limit > 0 else []
+
+class InvertedIndex:
+    """Tokenizing inverted index with BM25 ranking over integer document ids"""
+    
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {doc_id: term frequency}
+        self.compiled = {}  # term -> (ids, frequencies) arrays, rebuilt after the term gains postings
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self.doc_count = 0
+        self.total_length = 0
+    
+    def add(self, doc_id: int, text: str):
+        """Index a document's text under doc_id"""
+        self.add_counts(doc_id, Counter(tokenize(text)))
+    
+    def add_counts(self, doc_id: int, term_counts: Dict[str, int]):
+        """Index precomputed term frequencies, e.g. when reloading from disk"""
+        for term, frequency in term_counts.items():
+            self.postings[term][doc_id] = frequency
+            self.compiled.pop(term, None)
+        
+        if doc_id >= len(self.doc_lengths):
+            grown = np.zeros(max(doc_id + 1, len(self.doc_lengths) * 2, 64), dtype=np.float32)
+            grown[:len(self.doc_lengths)] = self.doc_lengths
+            self.doc_lengths = grown
+        length = sum(term_counts.values())
+        self.doc_lengths[doc_id] = length
+        self.doc_count += 1
+        self.total_length += length
+    
+    def term_postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        compiled = self.compiled.get(term)
+        if compiled is None:
+            postings = self.postings.get(term)
+            if not postings:
+                return None
+            compiled = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            )
+            self.compiled[term] = compiled
+        return compiled
+    
+    def score(self, query: str, allowed: Optional[Bitset] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """BM25 scores as (ids, scores) for every permitted document containing a query term"""
+        if not self.doc_count:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        
+        avg_length = self.total_length / self.doc_count or 1.0
+        id_parts, score_parts = [], []
+        
+        # Only the posting lists of the query terms are visited, filtered before any scoring
+        for term, query_frequency in Counter(tokenize(query)).items():
+            postings = self.term_postings(term)
+            if postings is None:
+                continue
+            ids, frequencies = postings
+            idf = math.log(1 + (self.doc_count - len(ids) + 0.5) / (len(ids) + 0.5))
+            
+            if allowed is not None:
+                keep = allowed.contains(ids)
+                ids, frequencies = ids[keep], frequencies[keep]
+            
+            length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[ids] / avg_length)
+            id_parts.append(ids)
+            score_parts.append(query_frequency * idf * frequencies * (self.k1 + 1) / (frequencies + length_norm))
+        
+        if not id_parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        ids, inverse = np.unique(np.concatenate(id_parts), return_inverse=True)
+        return ids, np.bincount(inverse, weights=np.concatenate(score_parts))
+    
+    def search(self, query: str, top_k: Optional[int] = None,
+               allowed: Optional[Bitset] = None) -> List[Tuple[int, float]]:
+        """Return (doc_id, score) pairs for the best matches, highest score first"""
+        ids, scores = self.score(query, allowed)
+        
+        if top_k is not None and top_k < len(ids):
+            best = np.argpartition(-scores, top_k)[:top_k]
+            ids, scores = ids[best], scores[best]
+        order = np.argsort(-scores, kind='stable')
+        return [(int(doc_id), float(score)) for doc_id, score in zip(ids[order], scores[order])]
+
+# Embedding settings; set OLLAMA_EMBED_MODEL (e.g. nomic-embed-text) to use the model server
+OLLAMA_EMBED_MODEL = os.environ.get("OLLAMA_EMBED_MODEL", "")
+HASHING_EMBEDDING_DIM = 384
+EMBED_BATCH_SIZE = 64  # Passages per embedding request
+
+class HashingEmbedder:
+    """CPU-only local embedder using signed feature hashing of words and word pairs"""
+    
+    def __init__(self, dim: int = HASHING_EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            terms = tokenize(text)
+            features = terms + [f"{a} {b}" for a, b in zip(terms, terms[1:])]
+            for feature in features:
+                # crc32 is stable across processes, unlike the salted built-in hash
+                bucket = zlib.crc32(feature.encode('utf-8'))
+                vectors[row, bucket % self.dim] += 1.0 if bucket & 0x80000000 else -1.0
+        return vectors
+
+class OllamaEmbedder:
+    """Embedder backed by the Ollama /api/embed endpoint"""
+    
+    def __init__(self, session: requests.Session, base_url: str, model: str, timeout: int = 60):
+        self.session = session
+        self.base_url = base_url
+        self.model = model
+        self.timeout = timeout
+        self.name = f"ollama-{model}"
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        response = self.session.post(
+            f"{self.base_url}/api/embed",
+            json={"model": self.model, "input": texts},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return np.asarray(response.json()["embeddings"], dtype=np.float32)
+
+def create_embedder(session: requests.Session, base_url: str):
+    """Use the Ollama embedding model when configured, otherwise the local stand-in"""
+    if OLLAMA_EMBED_MODEL:
+        return OllamaEmbedder(session, base_url, OLLAMA_EMBED_MODEL)
+    return HashingEmbedder()
+
+class VectorIndex:
+    """Contiguous float32 embedding matrix with cosine search and an optional IVF index"""
+    
+    def __init__(self, ann_threshold: int = 5000, n_probe: int = 8, seed: int = 42):
+        self.matrix = None  # Unit-normalised rows, over-allocated to amortise appends
+        self.size = 0
+        self.ann_threshold = ann_threshold
+        self.n_probe = n_probe
+        self.seed = seed
+        self.centroids = None
+        self.assignments = None
+        self.trained_size = 0
+    
+    @property
+    def vectors(self) -> np.ndarray:
+        return self.matrix[:self.size] if self.matrix is not None else np.zeros((0, 0), dtype=np.float32)
+    
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+    
+    def add(self, vectors: np.ndarray) -> range:
+        """Append embeddings and return the row ids they were given"""
+        vectors = self.normalize(vectors)
+        count, dim = vectors.shape
+        
+        if self.matrix is None:
+            self.matrix = np.zeros((max(64, count), dim), dtype=np.float32)
+            self.assignments = np.full(self.matrix.shape[0], -1, dtype=np.int32)
+        elif self.size + count > self.matrix.shape[0]:
+            capacity = max(self.matrix.shape[0] * 2, self.size + count)
+            matrix = np.zeros((capacity, dim), dtype=np.float32)
+            matrix[:self.size] = self.matrix[:self.size]
+            assignments = np.full(capacity, -1, dtype=np.int32)
+            assignments[:self.size] = self.assignments[:self.size]
+            self.matrix, self.assignments = matrix, assignments
+        
+        rows = range(self.size, self.size + count)
+        self.matrix[rows.start:rows.stop] = vectors
+        self.size += count
+        
+        # Retrain the coarse quantiser whenever the corpus has doubled since the last build
+        if self.size >= self.ann_threshold and self.size >= 2 * self.trained_size:
+            self.build_ann()
+        elif self.centroids is not None:
+            self.assignments[rows.start:rows.stop] = np.argmax(vectors @ self.centroids.T, axis=1)
+        
+        return rows
+    
+    def build_ann(self, iterations: int = 10):
+        """Train an inverted-file index with spherical k-means"""
+        vectors = self.vectors
+        n_lists = max(1, int(math.sqrt(self.size)))
+        rng = np.random.default_rng(self.seed)
+        sample = vectors[rng.choice(self.size, size=min(self.size, n_lists * 40), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)]
+        
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]
+            centroids = self.normalize(sums)
+        
+        self.centroids = centroids
+        self.assignments[:self.size] = np.argmax(vectors @ centroids.T, axis=1)
+        self.trained_size = self.size
+    
+    def search_many(self, queries: np.ndarray, top_k: int,
+                    mask: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        """Batched cosine search; mask is an optional boolean row filter
+        
+        Only positive similarities are returned: zero rows (keyword-only passages) and a
+        zero query match nothing, so they earn no rank credit when rankings are fused.
+        """
+        if self.size == 0:
+            return [[] for _ in range(len(np.atleast_2d(queries)))]
+        
+        queries = self.normalize(queries)
+        results = []
+        for query in queries:
+            if not query.any():
+                results.append([])
+                continue
+            if self.centroids is not None:
+                probe = np.argsort(self.centroids @ query)[-self.n_probe:]
+                candidates = np.flatnonzero(np.isin(self.assignments[:self.size], probe))
+            else:
+                candidates = np.arange(self.size)
+            
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+            scores = self.matrix[candidates] @ query
+            relevant = scores > 0
+            candidates, scores = candidates[relevant], scores[relevant]
+            if len(candidates) == 0:
+                results.append([])
+                continue
+            
+            k = min(top_k, len(candidates))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            results.append([(int(candidates[i]), float(scores[i])) for i in best])
+        
+        return results
+    
+    def search(self, query: np.ndarray, top_k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        return self.search_many(np.atleast_2d(query), top_k, mask)[0]
+
+def reciprocal_rank_fusion(rankings: List[List[Tuple[int, float]]], k: int = 60) -> List[int]:
+    """Merge several ranked id lists without having to calibrate their scores"""
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking):
+            fused[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)
+
+
+# Chunking and context assembly settings
+CHUNK_WORDS = 150
+CHUNK_OVERLAP_WORDS = 30
+CONTEXT_TOKEN_BUDGET = 1500
+CHARS_PER_TOKEN = 4  # Rough average for English prose
+HEADING_MAX_CHARS = 80
+MIN_SECTION_WORDS = 12
+
+WORD_PATTERN = re.compile(r"\S+")
+NUMBERED_HEADING = re.compile(r"^(\d+(\.\d+)*[.)]|[IVX]+\.)\s+\S")
+
+@dataclass
+class Chunk:
+    """Character span of a passage and of the section heading it sits under"""
+    start: int
+    end: int
+    heading_start: int = 0
+    heading_end: int = 0
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+def is_heading(line: str) -> bool:
+    """Short title-like lines (Title Case, ALL CAPS, trailing colon or numbered) start a section"""
+    stripped = line.strip()
+    if not stripped or len(stripped) > HEADING_MAX_CHARS or stripped.endswith(('.', ',', ';')):
+        return False
+    return stripped.endswith(':') or stripped.isupper() or stripped.istitle() or bool(NUMBERED_HEADING.match(stripped))
+
+def split_sections(text: str) -> List[Tuple[Tuple[int, int], int, int]]:
+    """Split text into ((heading_start, heading_end), body_start, body_end) sections"""
+    sections = []
+    heading = (0, 0)
+    body_start = 0
+    pos = 0
+    
+    for line in text.splitlines(keepends=True):
+        if is_heading(line):
+            if text[body_start:pos].strip():
+                sections.append((heading, body_start, pos))
+            heading = (pos + len(line) - len(line.lstrip()), pos + len(line.rstrip()))
+            body_start = pos + len(line)
+        pos += len(line)
+    
+    if text[body_start:].strip():
+        sections.append((heading, body_start, len(text)))
+    
+    # Table rows and captions look like headings too; fold tiny sections into a neighbour
+    merged = []
+    for section in sections:
+        tiny = len(WORD_PATTERN.findall(text, section[1], section[2])) < MIN_SECTION_WORDS
+        if merged and (tiny or merged[-1][3]):
+            previous = merged[-1]
+            heading = section[0] if previous[3] else previous[0]
+            merged[-1] = (heading, previous[1], section[2], tiny and previous[3])
+        else:
+            merged.append(section + (tiny,))
+    return [section[:3] for section in merged]
+
+def chunk_text(text: str, chunk_words: int = CHUNK_WORDS, overlap_words: int = CHUNK_OVERLAP_WORDS) -> List[Chunk]:
+    """Split text into overlapping, section-aware passages"""
+    chunks = []
+    
+    for heading, body_start, body_end in split_sections(text):
+        words = [match.span() for match in WORD_PATTERN.finditer(text, body_start, body_end)]
+        start = 0
+        while start < len(words):
+            end = min(start + chunk_words, len(words))
+            
+            # Prefer to stop at a sentence boundary in the last third of the window
+            if end < len(words):
+                for candidate in range(end, start + chunk_words * 2 // 3, -1):
+                    if text[words[candidate - 1][1] - 1] in '.!?:':
+                        end = candidate
+                        break
+            
+            chunks.append(Chunk(words[start][0], words[end - 1][1], *heading))
+            if end >= len(words):
+                break
+            start = max(end - overlap_words, start + 1)
+    
+    # Every document gets at least one passage so it stays findable by name
+    return chunks or [Chunk(0, 0)]
+
+def char_to_byte_offsets(text: str, positions: List[int]) -> Dict[int, int]:
+    """Map character offsets to UTF-8 byte offsets in one pass"""
+    offsets = {}
+    previous_char, previous_byte = 0, 0
+    for position in sorted(set(positions)):
+        previous_byte += len(text[previous_char:position].encode('utf-8'))
+        previous_char = position
+        offsets[position] = previous_byte
+    return offsets
+
+def lock_file(handle):
+    """Block until this process holds the exclusive lock on an open file"""
+    if fcntl is not None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        return
+    handle.seek(0)
+    while True:
+        try:
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            pass  # LK_LOCK gives up after about ten seconds; keep waiting
+
+def unlock_file(handle):
+    if fcntl is not None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+    else:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+class DocumentStore:
+    """Append-only on-disk document store with memory-mapped content and index files
+    
+    Content, metadata and per-passage term frequencies go to append-only segment
+    files. chunks.idx and docs.idx hold fixed-width records pointing into them; the
+    document record is written last, so an interrupted append is never visible.
+    Writers in different processes (the app and KNOWLEDGE_INGEST.py) take turns
+    through a lock file.
+    """
+    
+    FORMAT_VERSION = 2
+    DOC_DTYPE = np.dtype([
+        ('content_offset', '<u8'), ('content_length', '<u8'),
+        ('meta_offset', '<u8'), ('meta_length', '<u4'),
+        ('chunk_start', '<u8'), ('chunk_count', '<u4'),
+    ])
+    CHUNK_DTYPE = np.dtype([
+        ('doc_pos', '<u4'),
+        ('start', '<u8'), ('length', '<u4'),  # Byte span within the document content
+        ('heading_start', '<u8'), ('heading_length', '<u4'),
+        ('terms_offset', '<u8'), ('terms_length', '<u4'),
+    ])
+    SEGMENTS = ('content.seg', 'meta.seg', 'terms.seg', 'vectors.f32', 'chunks.idx', 'docs.idx')
+    LOCK_FILE = 'store.lock'
+    
+    def __init__(self, root: str = KNOWLEDGE_BASE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.lock = threading.RLock()
+        self.manifest_path = os.path.join(root, 'manifest.json')
+        self.manifest = self.read_manifest()
+        # Checked before recover() creates any segment file, so an old store is left exactly as it was
+        if self.stored_format() != self.FORMAT_VERSION:
+            raise RuntimeError(f"{root} uses an older store format; move it aside and re-ingest the documents")
+        self.manifest['format'] = self.FORMAT_VERSION
+        self.handles = {name: open(self.path(name), 'ab') for name in self.SEGMENTS}
+        self.lock_handle = open(self.path(self.LOCK_FILE), 'ab')
+        self.lock_depth = 0
+        self.count = self.chunk_count = 0
+        self.seen = None
+        self.maps = {}
+        self.index_maps = {}
+        # Recovery runs under the lock so it never truncates another process's append in progress
+        with self.exclusive():
+            pass
+    
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+    
+    def __len__(self):
+        return self.count
+    
+    @property
+    def dim(self) -> Optional[int]:
+        return self.manifest.get('dim')
+    
+    @property
+    def embedder_name(self) -> Optional[str]:
+        return self.manifest.get('embedder')
+    
+    def stored_format(self) -> int:
+        """Format version on disk; stores written before the manifest recorded it are version 1"""
+        if 'format' in self.manifest:
+            return self.manifest['format']
+        docs_path = self.path('docs.idx')
+        if self.manifest or (os.path.exists(docs_path) and os.path.getsize(docs_path)):
+            return 1
+        return self.FORMAT_VERSION  # A new, empty store
+    
+    def read_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def write_manifest(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+    
+    def truncate(self, name: str, size: int):
+        if os.path.getsize(self.path(name)) > size:
+            with open(self.path(name), 'r+b') as f:
+                f.truncate(size)
+    
+    def recover(self) -> Tuple[int, int]:
+        """Drop any partially written trailing records, passages and vectors"""
+        for name in self.SEGMENTS:
+            open(self.path(name), 'ab').close()
+        
+        count = os.path.getsize(self.path('docs.idx')) // self.DOC_DTYPE.itemsize
+        self.truncate('docs.idx', count * self.DOC_DTYPE.itemsize)
+        
+        chunk_count = 0
+        if count:
+            last = np.fromfile(self.path('docs.idx'), dtype=self.DOC_DTYPE, count=1,
+                               offset=(count - 1) * self.DOC_DTYPE.itemsize)[0]
+            chunk_count = int(last['chunk_start'] + last['chunk_count'])
+        self.truncate('chunks.idx', chunk_count * self.CHUNK_DTYPE.itemsize)
+        self.truncate('vectors.f32', chunk_count * 4 * (self.dim or 0))
+        return count, chunk_count
+    
+    @contextmanager
+    def exclusive(self):
+        """Hold the cross-process write lock, first catching up with what other writers appended
+        
+        Re-entrant within a process; appends and vector rewrites take it themselves.
+        """
+        with self.lock:
+            if not self.lock_depth:
+                lock_file(self.lock_handle)
+                try:
+                    self.sync()
+                except BaseException:
+                    unlock_file(self.lock_handle)
+                    raise
+            self.lock_depth += 1
+            try:
+                yield
+            finally:
+                self.lock_depth -= 1
+                if not self.lock_depth:
+                    self.seen = self.stamp()
+                    unlock_file(self.lock_handle)
+    
+    def sync(self):
+        """Re-read the manifest and record counts, which another process may have changed (caller holds the lock)"""
+        self.manifest = dict(self.read_manifest(), format=self.FORMAT_VERSION)
+        self.count, self.chunk_count = self.recover()
+        for handle in self.handles.values():
+            handle.seek(0, os.SEEK_END)  # tell() gives the write offset, which others may have moved
+    
+    def stamp(self) -> Tuple[int, int]:
+        try:
+            manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+        except OSError:
+            manifest_mtime = 0
+        return os.path.getsize(self.path('docs.idx')), manifest_mtime
+    
+    def changed(self) -> bool:
+        """Whether another process appended or re-embedded since this handle last held the lock"""
+        return self.stamp() != self.seen
+    
+    def write(self, name: str, data: bytes) -> int:
+        handle = self.handles[name]
+        offset = handle.tell()
+        handle.write(data)
+        return offset
+    
+    def append(self, metadata: dict, content: str, chunks: List[Chunk], term_counts: List[Dict[str, int]],
+               embeddings: np.ndarray, embedder_name: str) -> int:
+        """Persist one document with its passages and return its position"""
+        embeddings = np.ascontiguousarray(np.atleast_2d(embeddings), dtype='<f4')
+        
+        with self.exclusive():
+            if self.dim is None:
+                self.manifest.update({'dim': int(embeddings.shape[1]), 'embedder': embedder_name})
+                self.write_manifest()
+            elif embeddings.shape[1] != self.dim:
+                raise ValueError(f"Embeddings have {embeddings.shape[1]} dimensions, store expects {self.dim}")
+            
+            doc_pos = self.count
+            offsets = char_to_byte_offsets(
+                content,
+                [p for chunk in chunks for p in (chunk.start, chunk.end, chunk.heading_start, chunk.heading_end)]
+            )
+            
+            chunk_records = np.zeros(len(chunks), dtype=self.CHUNK_DTYPE)
+            for row, (chunk, counts) in zip(chunk_records, zip(chunks, term_counts)):
+                terms_bytes = json.dumps(counts).encode('utf-8')
+                row['doc_pos'] = doc_pos
+                row['start'] = offsets[chunk.start]
+                row['length'] = offsets[chunk.end] - offsets[chunk.start]
+                row['heading_start'] = offsets[chunk.heading_start]
+                row['heading_length'] = offsets[chunk.heading_end] - offsets[chunk.heading_start]
+                row['terms_offset'] = self.write('terms.seg', terms_bytes)
+                row['terms_length'] = len(terms_bytes)
+            
+            content_bytes = content.encode('utf-8')
+            meta_bytes = json.dumps(metadata).encode('utf-8')
+            record = np.zeros(1, dtype=self.DOC_DTYPE)
+            record['content_offset'] = self.write('content.seg', content_bytes)
+            record['content_length'] = len(content_bytes)
+            record['meta_offset'] = self.write('meta.seg', meta_bytes)
+            record['meta_length'] = len(meta_bytes)
+            record['chunk_start'] = self.chunk_count
+            record['chunk_count'] = len(chunks)
+            self.write('vectors.f32', embeddings.tobytes())
+            self.write('chunks.idx', chunk_records.tobytes())
+            
+            # The document record commits everything it points at, so it goes last
+            for name in self.SEGMENTS[:-1]:
+                self.handles[name].flush()
+            self.write('docs.idx', record.tobytes())
+            self.handles['docs.idx'].flush()
+            
+            self.count += 1
+            self.chunk_count += len(chunks)
+            return doc_pos
+    
+    def index_map(self, name: str, dtype: np.dtype, count: int) -> np.ndarray:
+        """Memory-mapped view of a fixed-width record file"""
+        with self.lock:
+            index_map = self.index_maps.get(name)
+            if index_map is None or len(index_map) != count:
+                if count:
+                    index_map = np.memmap(self.path(name), dtype=dtype, mode='r', shape=(count,))
+                else:
+                    index_map = np.zeros(0, dtype=dtype)
+                self.index_maps[name] = index_map
+            return index_map
+    
+    def records(self) -> np.ndarray:
+        return self.index_map('docs.idx', self.DOC_DTYPE, self.count)
+    
+    def chunk_records(self) -> np.ndarray:
+        return self.index_map('chunks.idx', self.CHUNK_DTYPE, self.chunk_count)
+    
+    def read(self, name: str, offset: int, length: int) -> bytes:
+        """Read a slice of a segment through its memory map, remapping after growth"""
+        if not length:
+            return b""
+        end = offset + length
+        with self.lock:
+            segment_map = self.maps.get(name)
+            if segment_map is None or len(segment_map) < end:
+                self.handles[name].flush()
+                if segment_map is not None:
+                    segment_map.close()
+                with open(self.path(name), 'rb') as f:
+                    segment_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.maps[name] = segment_map
+            return segment_map[offset:end]
+    
+    def read_content(self, doc_pos: int) -> str:
+        record = self.records()[doc_pos]
+        return self.read('content.seg', int(record['content_offset']), int(record['content_length'])).decode('utf-8')
+    
+    def read_passage(self, chunk_id: int) -> Tuple[str, str]:
+        """Return the (heading, text) of a passage without reading the rest of its document"""
+        chunk = self.chunk_records()[chunk_id]
+        base = int(self.records()[int(chunk['doc_pos'])]['content_offset'])
+        heading = self.read('content.seg', base + int(chunk['heading_start']), int(chunk['heading_length']))
+        text = self.read('content.seg', base + int(chunk['start']), int(chunk['length']))
+        return heading.decode('utf-8'), text.decode('utf-8')
+    
+    def iter_metadata(self, start: int = 0) -> Iterator[dict]:
+        for record in self.records()[start:]:
+            yield json.loads(self.read('meta.seg', int(record['meta_offset']), int(record['meta_length'])))
+    
+    def iter_chunk_terms(self, start: int = 0) -> Iterator[Tuple[int, Dict[str, int]]]:
+        """Yield (document position, term counts) for every passage from start without touching content"""
+        for chunk in self.chunk_records()[start:]:
+            yield int(chunk['doc_pos']), json.loads(self.read('terms.seg', int(chunk['terms_offset']), int(chunk['terms_length'])))
+    
+    def load_vectors(self) -> np.ndarray:
+        """Memory-mapped (passages, dim) embedding matrix"""
+        with self.lock:
+            if not self.chunk_count or not self.dim:
+                return np.zeros((0, self.dim or 0), dtype=np.float32)
+            self.handles['vectors.f32'].flush()
+            return np.memmap(self.path('vectors.f32'), dtype='<f4', mode='r', shape=(self.chunk_count, self.dim))
+    
+    def rewrite_vectors(self, matrix: np.ndarray, embedder_name: str):
+        """Replace every stored embedding, e.g. after switching embedding models"""
+        matrix = np.ascontiguousarray(matrix, dtype='<f4')
+        with self.exclusive():
+            if len(matrix) != self.chunk_count:
+                raise ValueError(f"{len(matrix)} vectors for {self.chunk_count} passages; another writer appended meanwhile")
+            self.handles['vectors.f32'].close()
+            tmp_path = f"{self.path('vectors.f32')}.tmp"
+            matrix.tofile(tmp_path)
+            os.replace(tmp_path, self.path('vectors.f32'))
+            self.handles['vectors.f32'] = open(self.path('vectors.f32'), 'ab')
+            self.manifest.update({'dim': int(matrix.shape[1]), 'embedder': embedder_name})
+            self.write_manifest()
+    
+    def close(self):
+        with self.lock:
+            for handle in self.handles.values():
+                handle.close()
+            self.lock_handle.close()
+            for segment_map in self.maps.values():
+                segment_map.close()
+            self.maps.clear()
+            self.index_maps.clear()
+
+class StoredDocument(dict):
+    """Document metadata that reads its content from the store only when accessed"""
+    
+    def __init__(self, metadata: dict, store: DocumentStore, pos: int):
+        super().__init__(metadata)
+        self.store = store
+        self.pos = pos
+    
+    def __missing__(self, key):
+        if key == 'content':
+            return self.store.read_content(self.pos)
+        raise KeyError(key)
+
+class SimpleRAGSystem:
+    """RAG system over the shared persistent document store, retrieving at passage level"""
+    
+    def __init__(self, store: Optional[DocumentStore] = None, embedder=None,
+                 chunk_words: int = CHUNK_WORDS, overlap_words: int = CHUNK_OVERLAP_WORDS,
+                 context_token_budget: int = CONTEXT_TOKEN_BUDGET):
+        self.store = store if store is not None else DocumentStore()
+        self.lock = threading.Lock()
+        self.index = InvertedIndex()  # Keyed by passage id
+        self.embedder = embedder or HashingEmbedder()
+        self.fallback_embedder = HashingEmbedder()  # Stands in while the configured embedder is unreachable
+        self.vectors = VectorIndex()  # One row per passage
+        self.vectors_embedder = None  # Name of the embedder behind self.vectors
+        self.chunk_words = chunk_words
+        self.overlap_words = overlap_words
+        self.context_token_budget = context_token_budget
+        self.documents = []
+        self.chunk_docs = []  # Passage id -> document position
+        self.content_hashes = {}  # Source file hash -> document id
+        self.doc_access = AccessIndex()  # Role and client bitsets over document positions
+        self.chunk_access = AccessIndex()  # The same ACLs over passage ids, for filtering postings
+        self.recency = RecencyIndex()
+        self.load()
+    
+    def load(self):
+        """Rebuild the in-memory indexes from the store without re-reading content"""
+        with self.store.exclusive():
+            self.load_appended()
+            if self.chunk_docs and self.store.embedder_name != self.embedder.name:
+                try:
+                    self.reembed()
+                except Exception as e:
+                    logger.warning("Re-embedding with %s failed, keeping the %s vectors: %s",
+                                   self.embedder.name, self.store.embedder_name, e)
+    
+    def load_appended(self):
+        """Index the documents added to the store since this instance last looked (caller holds the store lock)"""
+        first_doc, first_chunk = len(self.documents), len(self.chunk_docs)
+        for doc_pos, metadata in enumerate(self.store.iter_metadata(first_doc), first_doc):
+            self.documents.append(StoredDocument(metadata, self.store, doc_pos))
+            self.doc_access.add(doc_pos, metadata['roles_allowed'], metadata['client_name'])
+            self.recency.add(doc_pos, metadata['roles_allowed'], metadata['upload_date'])
+            if metadata.get('content_hash'):
+                self.content_hashes[metadata['content_hash']] = metadata['id']
+        for chunk_id, (doc_pos, term_counts) in enumerate(self.store.iter_chunk_terms(first_chunk), first_chunk):
+            self.index.add_counts(chunk_id, term_counts)
+            self.chunk_docs.append(doc_pos)
+            self.chunk_access.add(chunk_id, self.documents[doc_pos]['roles_allowed'], self.documents[doc_pos]['client_name'])
+        
+        if self.store.embedder_name != self.vectors_embedder:
+            self.vectors = VectorIndex()  # Another writer re-embedded the whole store
+        if len(self.chunk_docs) > self.vectors.size:
+            self.vectors.add(self.store.load_vectors()[self.vectors.size:])
+        self.vectors_embedder = self.store.embedder_name
+    
+    def refresh(self):
+        """Pick up documents another process, e.g. the bulk import CLI, added since the last look"""
+        if self.store.changed():
+            with self.lock, self.store.exclusive():
+                self.load_appended()
+    
+    def passage_index_text(self, file_name, heading, text):
+        return f"{file_name} {heading} {text}"
+    
+    def reembed(self, batch_size: int = EMBED_BATCH_SIZE):
+        """Recompute every stored passage embedding with the current embedder"""
+        logger.info("Re-embedding %d passages with %s", len(self.chunk_docs), self.embedder.name)
+        batches = []
+        for start in range(0, len(self.chunk_docs), batch_size):
+            texts = []
+            for chunk_id in range(start, min(start + batch_size, len(self.chunk_docs))):
+                heading, text = self.store.read_passage(chunk_id)
+                texts.append(self.passage_index_text(self.documents[self.chunk_docs[chunk_id]]['file_name'], heading, text))
+            batches.append(self.embedder.embed(texts))
+        matrix = np.vstack(batches)
+        self.store.rewrite_vectors(matrix, self.embedder.name)
+        self.vectors = VectorIndex()
+        self.vectors.add(matrix)
+        self.vectors_embedder = self.embedder.name
+    
+    @staticmethod
+    def embed_batches(embedder, texts, batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+        return np.vstack([embedder.embed(texts[start:start + batch_size]) for start in range(0, len(texts), batch_size)])
+    
+    def embed_passages(self, texts) -> Tuple[np.ndarray, str]:
+        """Embeddings for new passages and the name of the embedder to store them under
+        
+        The store's dimension is only fixed by a successful call to the configured
+        embedder. Until then a failed call falls back to the local hashing embedder,
+        recorded under its own name, and the stored vectors are replaced once the
+        configured embedder answers. After that a failed call stores zero rows, which
+        leaves those passages keyword-only.
+        """
+        try:
+            return self.embed_batches(self.embedder, texts), self.embedder.name
+        except Exception as e:
+            if self.store.embedder_name == self.embedder.name:
+                logger.warning("Embedding failed, new passages are keyword-only: %s", e)
+                return np.zeros((len(texts), self.store.dim), dtype=np.float32), self.embedder.name
+            logger.warning("Embedding with %s failed, using %s for now: %s", self.embedder.name, self.fallback_embedder.name, e)
+            return self.embed_batches(self.fallback_embedder, texts), self.fallback_embedder.name
+    
+    def query_embedder(self):
+        """The embedder that produced the indexed vectors, or None if it is not available"""
+        for embedder in (self.embedder, self.fallback_embedder):
+            if embedder.name == self.vectors_embedder:
+                return embedder
+        return None
+    
+    def add_document(self, file_content, file_name, document_type, client_name, roles_allowed, uploaded_by, content_hash=None):
+        """Add a document to the knowledge base"""
+        return self.add_documents([{
+            'file_content': file_content,
+            'file_name': file_name,
+            'document_type': document_type,
+            'client_name': client_name,
+            'roles_allowed': roles_allowed,
+            'uploaded_by': uploaded_by,
+            'content_hash': content_hash
+        }])[0]
+    
+    def add_documents(self, documents: List[dict]) -> List[str]:
+        """Batch-insert documents, embedding their passages in large batches"""
+        if not documents:
+            return []
+        
+        prepared = []
+        texts = []
+        for document in documents:
+            content = document['file_content']
+            doc_metadata = {
+                'id': hashlib.md5(f"{document['file_name']}{datetime.now()}".encode()).hexdigest()[:8],
+                'file_name': document['file_name'],
+                'document_type': document['document_type'],
+                'client_name': document['client_name'],
+                'roles_allowed': document['roles_allowed'],
+                'uploaded_by': document['uploaded_by'],
+                'upload_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'content_hash': document.get('content_hash')
+            }
+            
+            chunks = chunk_text(content, self.chunk_words, self.overlap_words)
+            chunk_texts = [
+                self.passage_index_text(doc_metadata['file_name'], content[chunk.heading_start:chunk.heading_end], content[chunk.start:chunk.end])
+                for chunk in chunks
+            ]
+            prepared.append((doc_metadata, content, chunks, [Counter(tokenize(text)) for text in chunk_texts]))
+            texts.extend(chunk_texts)
+        
+        embeddings, embedder_name = self.embed_passages(texts)
+        
+        with self.lock, self.store.exclusive():
+            # Another process (e.g. KNOWLEDGE_INGEST.py) may have appended since this instance loaded
+            self.load_appended()
+            if self.store.embedder_name not in (None, embedder_name):
+                if embedder_name == self.embedder.name:
+                    # The stored vectors came from the fallback; replace them now that the embedder answers
+                    self.reembed()
+                else:
+                    embeddings = np.zeros((len(texts), self.store.dim), dtype=np.float32)
+                    embedder_name = self.store.embedder_name
+            
+            row = 0
+            for doc_metadata, content, chunks, term_counts in prepared:
+                doc_embeddings = embeddings[row:row + len(chunks)]
+                row += len(chunks)
+                doc_pos = self.store.append(doc_metadata, content, chunks, term_counts, doc_embeddings, embedder_name)
+                self.documents.append(StoredDocument(doc_metadata, self.store, doc_pos))
+                self.doc_access.add(doc_pos, doc_metadata['roles_allowed'], doc_metadata['client_name'])
+                self.recency.add(doc_pos, doc_metadata['roles_allowed'], doc_metadata['upload_date'])
+                for counts in term_counts:
+                    chunk_id = len(self.chunk_docs)
+                    self.index.add_counts(chunk_id, counts)
+                    self.chunk_docs.append(doc_pos)
+                    self.chunk_access.add(chunk_id, doc_metadata['roles_allowed'], doc_metadata['client_name'])
+                if doc_metadata['content_hash']:
+                    self.content_hashes[doc_metadata['content_hash']] = doc_metadata['id']
+            self.vectors.add(embeddings)
+        
+        return [doc_metadata['id'] for doc_metadata, _, _, _ in prepared]
+    
+    def has_content(self, content_hash: str) -> bool:
+        """Whether a file with this content hash is already indexed"""
+        self.refresh()
+        return content_hash in self.content_hashes
+    
+    def search_documents(self, query, user_role, client_filter=None, top_k=None):
+        """Search documents based on query and permissions, ranked by their best-matching passage"""
+        self.refresh()
+        with self.lock:
+            # An empty query lists every visible document in upload order
+            if not query.strip():
+                positions = self.doc_access.allowed(user_role, client_filter).positions()
+                if top_k is not None:
+                    positions = positions[:top_k]
+                return [self.documents[doc_pos] for doc_pos in positions]
+            
+            ranked = self.index.search(query, allowed=self.chunk_access.allowed(user_role, client_filter))
+            
+            results = []
+            seen = set()
+            for chunk_id, _ in ranked:
+                doc_pos = self.chunk_docs[chunk_id]
+                if doc_pos not in seen:
+                    seen.add(doc_pos)
+                    results.append(self.documents[doc_pos])
+                    if top_k is not None and len(results) >= top_k:
+                        break
+            return results
+    
+    def recent_documents(self, user_role, limit=5):
+        """Newest documents visible to a role, without scanning or sorting the corpus"""
+        self.refresh()
+        with self.lock:
+            return [self.documents[doc_pos] for doc_pos in self.recency.recent(user_role, limit)]
+    
+    def search_passages(self, query, user_role, client_filter=None, top_k=24):
+        """Hybrid passage retrieval fusing BM25 keyword ranks with embedding similarity"""
+        self.refresh()
+        query_embedding = None
+        embedder = self.query_embedder()
+        if embedder is not None:
+            try:
+                query_embedding = embedder.embed([query])
+            except Exception as e:
+                logger.warning("Query embedding failed, using keyword search only: %s", e)
+        
+        with self.lock:
+            allowed = self.chunk_access.allowed(user_role, client_filter)
+            rankings = [self.index.search(query, top_k, allowed=allowed)]
+            if query_embedding is not None:
+                rankings.append(self.vectors.search(query_embedding, top_k, mask=allowed.to_mask(len(self.chunk_docs))))
+            return reciprocal_rank_fusion(rankings)[:top_k]
+    
+    def get_context_for_prompt(self, query, client_name, user_role, token_budget=None):
+        """Assemble the best passages for the prompt, up to a token budget"""
+        budget = token_budget or self.context_token_budget
+        context = "RELEVANT KNOWLEDGE BASE DOCUMENTS:\n\n"
+        used = estimate_tokens(context)
+        
+        # Greedily take passages in relevance order, skipping overlaps and anything over budget
+        selected = defaultdict(list)
+        taken_spans = defaultdict(list)
+        chunk_ids = self.search_passages(query, user_role, client_name)
+        with self.lock:
+            # Read after the search, which may have picked up passages another process appended
+            records = self.store.chunk_records()
+            candidates = [
+                (chunk_id, self.chunk_docs[chunk_id], int(records[chunk_id]['start']), int(records[chunk_id]['length']))
+                for chunk_id in chunk_ids
+            ]
+        
+        for chunk_id, doc_pos, start, length in candidates:
+            end = start + length
+            if any(start < taken_end and taken_start < end for taken_start, taken_end in taken_spans[doc_pos]):
+                continue
+            
+            heading, text = self.store.read_passage(chunk_id)
+            passage = f"[{heading}] {text}" if heading else text
+            cost = estimate_tokens(passage) + (0 if doc_pos in selected else 30)  # Document header overhead
+            if used + cost > budget:
+                continue
+            
+            used += cost
+            selected[doc_pos].append((start, passage))
+            taken_spans[doc_pos].append((start, end))
+        
+        for doc_pos, passages in selected.items():
+            doc = self.documents[doc_pos]
+            context += f"📄 Document: {doc['file_name']}\n"
+            context += f"Type: {doc['document_type']}\n"
+            context += f"Date: {doc['upload_date']}\n"
+            context += "Relevant Passages:\n"
+            for _, passage in sorted(passages):  # Document order reads better than score order
+                context += f"{passage}\n\n"
+            context += "-" * 50 + "\n\n"
+        
+        return context
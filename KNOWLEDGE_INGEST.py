@@ -0,0 +1,253 @@
+import argparse
+import hashlib
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import requests
+
+from DOCUMENT_EXTRACTION import SUPPORTED_EXTENSIONS, ExtractionError, extract_text
+from KNOWLEDGE_BASE import KNOWLEDGE_BASE_DIR, DocumentStore, SimpleRAGSystem, create_embedder
+
+# Where PDF_GENERATOR.py writes its sample reports
+SAMPLES_DIR = "knowledge_base_samples"
+
+# Folders the app's bulk import may read (os.pathsep-separated); the CLI is not restricted
+IMPORT_ROOTS = [root for root in os.environ.get("KNOWLEDGE_IMPORT_ROOTS", SAMPLES_DIR).split(os.pathsep) if root]
+
+INGEST_BATCH_SIZE = 32
+HASH_BLOCK_BYTES = 1024 * 1024
+
+# First keyword found in the file name decides the document type
+DOCUMENT_TYPE_KEYWORDS = [
+    ('risk', "Risk Analysis"),
+    ('compliance', "Compliance Document"),
+    ('performance', "Performance Report"),
+    ('meeting', "Meeting Notes"),
+    ('minutes', "Meeting Notes"),
+    ('research', "Research Report"),
+    ('outlook', "Research Report"),
+    ('statement', "Financial Statement"),
+    ('financial', "Financial Statement"),
+]
+DEFAULT_DOCUMENT_TYPE = "Research Report"
+
+NAME_TOKEN = re.compile(r"[a-z0-9]+")
+
+@dataclass
+class IngestReport:
+    """Outcome of a bulk ingestion run"""
+    added: List[str] = field(default_factory=list)
+    duplicates: List[str] = field(default_factory=list)
+    unmatched: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+    clients: set = field(default_factory=set)
+    elapsed: float = 0.0
+    
+    @property
+    def files_per_second(self) -> float:
+        return len(self.added) / self.elapsed if self.elapsed else 0.0
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's bytes, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def name_tokens(file_name: str) -> List[str]:
+    return NAME_TOKEN.findall(os.path.splitext(file_name)[0].lower())
+
+def guess_document_type(file_name: str) -> str:
+    tokens = name_tokens(file_name)
+    for keyword, document_type in DOCUMENT_TYPE_KEYWORDS:
+        if keyword in tokens:
+            return document_type
+    return DEFAULT_DOCUMENT_TYPE
+
+def match_client(file_name: str, clients: List[str]) -> Optional[str]:
+    """Pick the client whose leading name (e.g. 'CalPERS') appears in the file name"""
+    tokens = name_tokens(file_name)
+    for client in clients:
+        leading = name_tokens(client)
+        if leading and leading[0] in tokens:
+            return client
+    return None
+
+def within_roots(path: str, roots: Sequence[str]) -> bool:
+    """Whether a path, with symlinks resolved, is one of the roots or lies below one"""
+    path = os.path.realpath(path)
+    for root in roots:
+        root = os.path.realpath(root)
+        try:
+            if os.path.commonpath([path, root]) == root:
+                return True
+        except ValueError:  # Different drives
+            continue
+    return False
+
+def iter_candidate_files(directory: str, recursive: bool = True) -> Iterator[str]:
+    """Yield supported files under a directory in a stable order"""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                yield os.path.join(root, name)
+        if not recursive:
+            break
+
+def extract_file(path: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """Process pool worker: return (path, text, error)"""
+    try:
+        return path, extract_text(path, os.path.basename(path)), None
+    except ExtractionError as e:
+        return path, None, str(e)
+
+def ingest_directory(rag_system: SimpleRAGSystem, directory: str, roles_allowed: List[str],
+                     uploaded_by: str = "Bulk Import", clients: Optional[List[str]] = None,
+                     default_client: Optional[str] = None, document_type: Optional[str] = None,
+                     max_workers: Optional[int] = None, batch_size: int = INGEST_BATCH_SIZE,
+                     progress: Optional[Callable[[int, int], None]] = None,
+                     roots: Optional[Sequence[str]] = None) -> IngestReport:
+    """Extract every supported file under a directory in parallel and batch-insert it
+    
+    Files whose content hash is already indexed are skipped, so re-running over a
+    growing folder only pays for the new files. Each file is assigned to the client
+    named in its file name, falling back to default_client; files matching neither
+    are reported as unmatched. With roots, the directory and every file (after
+    resolving symlinks) must lie under one of them.
+    """
+    if roots is not None and not within_roots(directory, roots):
+        raise ValueError(f"{directory} is outside the allowed import folders")
+    
+    started = time.perf_counter()
+    report = IngestReport()
+    
+    # Hashing is cheap next to extraction, so duplicates are dropped before any parsing
+    pending = {}  # Path -> (content hash, client)
+    seen_hashes = set()
+    for path in iter_candidate_files(directory):
+        if roots is not None and not within_roots(path, roots):
+            report.failed[path] = "Links outside the allowed import folders"
+            continue
+        try:
+            content_hash = file_digest(path)
+        except OSError as e:
+            report.failed[path] = f"Could not read {os.path.basename(path)}: {e}"
+            continue
+        if rag_system.has_content(content_hash) or content_hash in seen_hashes:
+            report.duplicates.append(path)
+            continue
+        
+        client_name = match_client(os.path.basename(path), clients or []) or default_client
+        if client_name is None:
+            report.unmatched.append(path)
+            continue
+        pending[path] = (content_hash, client_name)
+        seen_hashes.add(content_hash)
+    
+    batch = []
+    
+    def flush():
+        rag_system.add_documents(batch)
+        report.added.extend(document['file_name'] for document in batch)
+        report.clients.update(document['client_name'] for document in batch)
+        batch.clear()
+    
+    def collect(path, text, error):
+        if error is not None:
+            report.failed[path] = error
+            return
+        file_name = os.path.basename(path)
+        content_hash, client_name = pending[path]
+        batch.append({
+            'file_content': text,
+            'file_name': file_name,
+            'document_type': document_type or guess_document_type(file_name),
+            'client_name': client_name,
+            'roles_allowed': list(roles_allowed),
+            'uploaded_by': uploaded_by,
+            'content_hash': content_hash
+        })
+        if len(batch) >= batch_size:
+            flush()
+    
+    total = len(pending)
+    if total == 1 or max_workers == 1:
+        for done, path in enumerate(pending, 1):
+            collect(*extract_file(path))
+            if progress:
+                progress(done, total)
+    elif total:
+        # Spawned workers avoid forking a process that is already running threads (e.g. Streamlit)
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(extract_file, path) for path in pending]
+            for done, future in enumerate(as_completed(futures), 1):
+                collect(*future.result())
+                if progress:
+                    progress(done, total)
+    
+    if batch:
+        flush()
+    
+    report.elapsed = time.perf_counter() - started
+    return report
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Bulk-load a folder of client documents into the knowledge base. "
+                    "Safe to run while the app is up; the app picks the documents up on its next upload or start."
+    )
+    parser.add_argument('directory', nargs='?', default=SAMPLES_DIR)
+    parser.add_argument('--role', action='append', required=True, dest='roles',
+                        help="Role allowed to see the documents (repeatable)")
+    parser.add_argument('--client', action='append', default=[], dest='clients',
+                        help="Client name to match against file names (repeatable)")
+    parser.add_argument('--default-client', help="Client for files that match no --client")
+    parser.add_argument('--type', dest='document_type', help="Document type for every file (default: from file name)")
+    parser.add_argument('--uploaded-by', default="Bulk Import")
+    parser.add_argument('--store', default=KNOWLEDGE_BASE_DIR)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=INGEST_BATCH_SIZE)
+    args = parser.parse_args(argv)
+    
+    if not os.path.isdir(args.directory):
+        parser.error(f"{args.directory} is not a directory")
+    
+    base_url = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+    store = DocumentStore(args.store)
+    rag_system = SimpleRAGSystem(store=store, embedder=create_embedder(requests.Session(), base_url))
+    
+    def show_progress(done, total):
+        print(f"\rExtracted {done}/{total} files", end="", flush=True)
+    
+    try:
+        report = ingest_directory(
+            rag_system, args.directory, args.roles,
+            uploaded_by=args.uploaded_by,
+            clients=args.clients,
+            default_client=args.default_client,
+            document_type=args.document_type,
+            max_workers=args.workers,
+            batch_size=args.batch_size,
+            progress=show_progress
+        )
+    finally:
+        store.close()
+    
+    print()
+    print(f"Added {len(report.added)} documents in {report.elapsed:.1f}s ({report.files_per_second:.1f} files/s)")
+    print(f"Skipped {len(report.duplicates)} already indexed, {len(report.unmatched)} without a client")
+    for path in report.unmatched:
+        print(f"  no client: {path}")
+    for path, error in report.failed.items():
+        print(f"  failed: {path}: {error}")
+    return 1 if report.failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
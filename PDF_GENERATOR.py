@@ -1,267 +1,391 @@
-﻿import os
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER
-from reportlab.pdfgen import canvas
-import matplotlib.pyplot as plt
-import numpy as np
-from datetime import datetime, timedelta
-import pandas as pd
-
-# Create directory for PDFs
-os.makedirs('knowledge_base_samples', exist_ok=True)
-
-def create_calpers_risk_report():
-    """Create CalPERS Q4 2023 Risk Assessment Report"""
-    doc = SimpleDocTemplate("knowledge_base_samples/CalPERS_Risk_Assessment_Q4_2023.pdf", pagesize=letter)
-    story = []
-    styles = getSampleStyleSheet()
-    
-    # Title
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
+﻿import argparse
+import dataclasses
+import functools
+import hashlib
+import inspect
+import io
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from html import escape
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+# reportlab is imported where it is first needed, so importing this module stays cheap
+# for the app and for worker processes (see IMPORT_BENCHMARK.py)
+
+@dataclass
+class TableBlock:
+    """A table whose first row is the header"""
+    rows: List[List[str]]
+    col_widths: Optional[List[float]] = None  # Inches; None sizes columns to their content
+    body_color: Optional[str] = 'beige'       # reportlab colour name or hex, None for no fill
+    total_row: bool = False                   # Highlight the last row as a total
+    header_font_size: Optional[int] = None    # Points; None keeps the Table default
+    header_padding: Optional[int] = None      # Bottom padding of the header row; None keeps the default
+
+@dataclass
+class Section:
+    """A heading followed by an optional table and paragraphs"""
+    heading: str
+    paragraphs: List[str] = field(default_factory=list)
+    table: Optional[TableBlock] = None
+    heading_style: str = 'Heading2'
+    page_break_before: bool = False
+
+@dataclass
+class ReportSpec:
+    """Declarative report layout rendered by render_report"""
+    title: str
+    subtitle: str = ""
+    brand_color: Optional[str] = '#1e3a8a'  # Title and table header colour; None for the plain title style
+    notice: str = ""                        # Line under the subtitle, e.g. a confidentiality marking
+    sections: List[Section] = field(default_factory=list)
+
+def resolve_color(name: str):
+    from reportlab.lib import colors
+    
+    return colors.HexColor(name) if name.startswith('#') else getattr(colors, name)
+
+# Styles are compiled once per process and shared by every report
+
+@functools.lru_cache(maxsize=None)
+def sample_styles():
+    from reportlab.lib.styles import getSampleStyleSheet
+    
+    return getSampleStyleSheet()
+
+@functools.lru_cache(maxsize=None)
+def title_style(brand_color: Optional[str]):
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.styles import ParagraphStyle
+    
+    if brand_color is None:
+        return sample_styles()['Title']
+    return ParagraphStyle(
+        f'CustomTitle{brand_color}',
+        parent=sample_styles()['Heading1'],
         fontSize=24,
-        textColor=colors.HexColor('#1e3a8a'),
+        textColor=resolve_color(brand_color),
         spaceAfter=30,
         alignment=TA_CENTER
     )
+
+@functools.lru_cache(maxsize=None)
+def table_style(header_color: str, body_color: Optional[str], total_row: bool, header: bool = True,
+                header_font_size: Optional[int] = None, header_padding: Optional[int] = None):
+    from reportlab.lib import colors
+    from reportlab.platypus import TableStyle
+    
+    # header=False styles the continuation pieces of a streamed table, which have no header row
+    commands = []
+    if header:
+        commands += [
+            ('BACKGROUND', (0, 0), (-1, 0), resolve_color(header_color)),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold')
+        ]
+        if header_font_size is not None:
+            commands.append(('FONTSIZE', (0, 0), (-1, 0), header_font_size))
+        if header_padding is not None:
+            commands.append(('BOTTOMPADDING', (0, 0), (-1, 0), header_padding))
+    commands.append(('ALIGN', (0, 0), (-1, -1), 'CENTER'))
+    if body_color:
+        commands.append(('BACKGROUND', (0, 1 if header else 0), (-1, -1), resolve_color(body_color)))
+    commands.append(('GRID', (0, 0), (-1, -1), 1, colors.black))
+    if total_row:
+        commands += [
+            ('BACKGROUND', (0, -1), (-1, -1), colors.grey),
+            ('TEXTCOLOR', (0, -1), (-1, -1), colors.whitesmoke)
+        ]
+    return TableStyle(commands)
+
+# Tables longer than this are laid out a piece at a time instead of as one Table
+TABLE_CHUNK_ROWS = 100
+STORY_LOOKAHEAD = 8  # Flowables pulled ahead of the layout, enough for keepWithNext groups
+
+@functools.lru_cache(maxsize=None)
+def streaming_table_class():
+    """Flowable for long tables, defined on first use so reportlab stays unimported until then"""
+    from reportlab.platypus import Flowable, Table
     
-    story.append(Paragraph("CalPERS Risk Assessment Report", title_style))
-    story.append(Paragraph("Q4 2023 - Confidential", styles['Heading2']))
-    story.append(Spacer(1, 0.5*inch))
-    
-    # Executive Summary
-    story.append(Paragraph("Executive Summary", styles['Heading2']))
-    summary_text = """
-    The California Public Employees' Retirement System (CalPERS) portfolio demonstrates strong risk-adjusted 
-    performance with a current funded ratio of 83%. Key risk metrics remain within acceptable ranges, though 
-    attention is required on private equity concentration and emerging market exposure. The portfolio's 
-    Value-at-Risk (VaR) stands at $18.2 billion (95% confidence, 1-month horizon), representing 4.04% of 
-    total assets under management.
+    class StreamingTable(Flowable):
+        """Lays out a TableBlock one page at a time
+        
+        Only the rows for the current page (at most TABLE_CHUNK_ROWS) become a Table;
+        the remainder is a new StreamingTable, so a long table never exists as one
+        Table. Pages after the first repeat the header row.
+        """
+        
+        def __init__(self, block: TableBlock, header_color: str, start: int = 1, header: bool = True,
+                     col_widths: Optional[List[float]] = None):
+            super().__init__()
+            self.block = block
+            self.header_color = header_color
+            self.start = start     # Index of the first body row still to lay out
+            self.header = header   # False while continuing directly below a finished piece
+            self.col_widths = col_widths
+            self.piece = None
+        
+        def next_piece(self) -> Tuple[object, int]:
+            """The Table for the next chunk of rows and the row index after it"""
+            if self.piece is None or self.piece[0] != self.header:
+                rows = self.block.rows
+                end = min(self.start + TABLE_CHUNK_ROWS, len(rows))
+                table = Table(
+                    rows[:1] + rows[self.start:end] if self.header else rows[self.start:end],
+                    colWidths=self.col_widths, repeatRows=1 if self.header else 0
+                )
+                table.setStyle(table_style(
+                    self.header_color, self.block.body_color, self.block.total_row and end == len(rows), self.header,
+                    self.block.header_font_size, self.block.header_padding
+                ))
+                self.piece = (self.header, table, end)
+            return self.piece[1], self.piece[2]
+        
+        def rest(self, start: int, header: bool, table) -> list:
+            if start >= len(self.block.rows):
+                return []
+            # Later pieces keep the first piece's column widths so columns line up across pages
+            return [StreamingTable(self.block, self.header_color, start, header, self.col_widths or table._colWidths)]
+        
+        def wrap(self, availWidth, availHeight):
+            table, end = self.next_piece()
+            width, height = table.wrap(availWidth, availHeight)
+            if end < len(self.block.rows):
+                # More rows follow this piece, so always go through split() to queue them
+                height = max(height, availHeight + 1)
+            self.width, self.height = width, height
+            return width, height
+        
+        def split(self, availWidth, availHeight):
+            table, end = self.next_piece()
+            width, height = table.wrap(availWidth, availHeight)
+            if height <= availHeight:
+                return [table] + self.rest(end, False, table)
+            parts = table.split(availWidth, availHeight)
+            if not parts:
+                # Postponed to the next frame, which starts with the header
+                self.header = True
+                return []
+            body_rows = len(parts[0]._cellvalues) - (1 if self.header else 0)
+            return [parts[0]] + self.rest(self.start + body_rows, True, table)
+        
+        def draw(self):
+            self.piece[1].drawOn(self.canv, 0, 0)
+    
+    return StreamingTable
+
+class LazyStory(list):
+    """A story for doc.build() that pulls flowables from an iterator as the layout consumes them
+    
+    doc.build() checks len() before handling each flowable, so topping the list up
+    there keeps only STORY_LOOKAHEAD flowables (plus any split remainders) alive.
     """
-    story.append(Paragraph(summary_text, styles['Normal']))
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Risk Metrics Table
-    story.append(Paragraph("Key Risk Metrics", styles['Heading2']))
-    
-    risk_data = [
-        ['Risk Metric', 'Current Value', 'Target Range', 'Status'],
-        ['Portfolio VaR (95%, 1-month)', '$18.2B (4.04%)', '< 5%', '✓ Within Range'],
-        ['Tracking Error', '3.8%', '3-5%', '✓ Optimal'],
-        ['Sharpe Ratio', '1.15', '> 1.0', '✓ Good'],
-        ['Maximum Drawdown (3Y)', '-12.4%', '< -15%', '✓ Acceptable'],
-        ['Liquidity Coverage Ratio', '142%', '> 120%', '✓ Strong'],
-        ['Private Assets Allocation', '35%', '30-40%', '✓ On Target'],
-        ['Currency Risk Exposure', '18.5%', '< 20%', '⚠ Monitor'],
-        ['Concentration Risk (Top 10)', '8.2%', '< 10%', '✓ Diversified']
-    ]
     
-    table = Table(risk_data, colWidths=[2.5*inch, 1.5*inch, 1.2*inch, 1.2*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a8a')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    story.append(table)
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Stress Test Results
-    story.append(Paragraph("Stress Test Scenarios", styles['Heading2']))
-    
-    stress_text = """
+    def __init__(self, flowables, lookahead: int = STORY_LOOKAHEAD):
+        super().__init__()
+        self.pending = iter(flowables)
+        self.lookahead = lookahead
+    
+    def __len__(self):
+        while self.pending is not None and list.__len__(self) < self.lookahead:
+            try:
+                self.append(next(self.pending))
+            except StopIteration:
+                self.pending = None
+        return list.__len__(self)
+
+def report_flowables(spec: ReportSpec) -> Iterator:
+    """Yield the flowables for a report in page order"""
+    from reportlab.lib.units import inch
+    from reportlab.platypus import PageBreak, Paragraph, Spacer, Table
+    
+    styles = sample_styles()
+    yield Paragraph(spec.title, title_style(spec.brand_color))
+    if spec.subtitle:
+        yield Paragraph(spec.subtitle, styles['Heading2'])
+    if spec.notice:
+        yield Paragraph(spec.notice, styles['Normal'])
+    yield Spacer(1, 0.5*inch)
+    
+    header_color = spec.brand_color or 'grey'
+    for position, section in enumerate(spec.sections):
+        if section.page_break_before:
+            yield PageBreak()
+        elif position:
+            yield Spacer(1, 0.3*inch)
+        
+        yield Paragraph(section.heading, styles[section.heading_style])
+        if section.table:
+            block = section.table
+            col_widths = [width * inch for width in block.col_widths] if block.col_widths else None
+            if len(block.rows) > TABLE_CHUNK_ROWS + 1:
+                yield streaming_table_class()(block, header_color, col_widths=col_widths)
+            else:
+                table = Table(block.rows, colWidths=col_widths, repeatRows=1)
+                table.setStyle(table_style(header_color, block.body_color, block.total_row,
+                                           header_font_size=block.header_font_size, header_padding=block.header_padding))
+                yield table
+            if section.paragraphs:
+                yield Spacer(1, 0.3*inch)
+        for text in section.paragraphs:
+            yield Paragraph(text, styles['Normal'])
+
+def render_report(output_path: Union[str, BinaryIO], spec: ReportSpec):
+    """Shared builder for every report: lay out a spec with the compiled styles
+    
+    Flowables are created as the layout reaches them and dropped once their page
+    is drawn, so memory stays flat however long the report is. output_path may also
+    be a binary file object.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate
+    
+    doc = SimpleDocTemplate(output_path, pagesize=letter)
+    doc.build(LazyStory(report_flowables(spec)))
+
+def render_report_bytes(spec: ReportSpec) -> bytes:
+    """Render a spec in memory, for downloads that should not touch the filesystem"""
+    buffer = io.BytesIO()
+    render_report(buffer, spec)
+    return buffer.getvalue()
+
+# Bump when output changes for a reason the hashed rendering code below does not show
+TEMPLATE_VERSION = 1
+
+# Everything that turns a spec into a PDF; build caching hashes this code, not the whole module,
+# so editing specs, prompts or the CLI does not rebuild every report
+RENDERING_CODE = (
+    TableBlock, Section, ReportSpec, resolve_color, sample_styles, title_style, table_style,
+    streaming_table_class, LazyStory, report_flowables, render_report
+)
+
+SAMPLE_SPECS = {
+    "CalPERS_Risk_Assessment_Q4_2023.pdf": ReportSpec(
+        title="CalPERS Risk Assessment Report",
+        subtitle="Q4 2023 - Confidential",
+        brand_color='#1e3a8a',
+        sections=[
+            Section("Executive Summary", paragraphs=["""
+    The California Public Employees' Retirement System (CalPERS) portfolio demonstrates strong risk-adjusted
+    performance with a current funded ratio of 83%. Key risk metrics remain within acceptable ranges, though
+    attention is required on private equity concentration and emerging market exposure. The portfolio's
+    Value-at-Risk (VaR) stands at $18.2 billion (95% confidence, 1-month horizon), representing 4.04% of
+    total assets under management.
+    """]),
+            Section("Key Risk Metrics", table=TableBlock(
+                rows=[
+                    ['Risk Metric', 'Current Value', 'Target Range', 'Status'],
+                    ['Portfolio VaR (95%, 1-month)', '$18.2B (4.04%)', '< 5%', '✓ Within Range'],
+                    ['Tracking Error', '3.8%', '3-5%', '✓ Optimal'],
+                    ['Sharpe Ratio', '1.15', '> 1.0', '✓ Good'],
+                    ['Maximum Drawdown (3Y)', '-12.4%', '< -15%', '✓ Acceptable'],
+                    ['Liquidity Coverage Ratio', '142%', '> 120%', '✓ Strong'],
+                    ['Private Assets Allocation', '35%', '30-40%', '✓ On Target'],
+                    ['Currency Risk Exposure', '18.5%', '< 20%', '⚠ Monitor'],
+                    ['Concentration Risk (Top 10)', '8.2%', '< 10%', '✓ Diversified']
+                ],
+                col_widths=[2.5, 1.5, 1.2, 1.2],
+                header_font_size=12,
+                header_padding=12
+            )),
+            Section("Stress Test Scenarios", paragraphs=["""
     Recent stress testing indicates the portfolio would experience the following impacts under adverse scenarios:
     • Global Equity Market Crash (-30%): Portfolio impact of -15.6%, funded ratio drops to 70%
     • Interest Rate Spike (+300bps): Portfolio impact of -8.2%, primarily affecting fixed income
     • Geopolitical Crisis Scenario: Portfolio impact of -11.3%, with emerging markets most affected
     • Climate Transition Risk: Long-term impact estimated at -5.7% without adaptation measures
-    """
-    story.append(Paragraph(stress_text, styles['Normal']))
-    
-    # Recommendations
-    story.append(PageBreak())
-    story.append(Paragraph("Risk Mitigation Recommendations", styles['Heading2']))
-    
-    recommendations = """
-    1. REDUCE EMERGING MARKET EXPOSURE: Current allocation of 12% in emerging market equities shows 
+    """]),
+            Section("Risk Mitigation Recommendations", page_break_before=True, paragraphs=["""
+    1. REDUCE EMERGING MARKET EXPOSURE: Current allocation of 12% in emerging market equities shows
     elevated volatility. Recommend reducing to 8-10% range and reallocating to developed markets.
     
-    2. ENHANCE LIQUIDITY BUFFER: While current liquidity is adequate, increasing the buffer to 150% 
+    2. ENHANCE LIQUIDITY BUFFER: While current liquidity is adequate, increasing the buffer to 150%
     would provide additional flexibility during market stress events.
     
-    3. IMPLEMENT CURRENCY HEDGING: With 18.5% unhedged currency exposure, implement a 50% hedge ratio 
+    3. IMPLEMENT CURRENCY HEDGING: With 18.5% unhedged currency exposure, implement a 50% hedge ratio
     on major currency positions (EUR, JPY, GBP) to reduce volatility.
     
-    4. REVIEW PRIVATE EQUITY VINTAGE EXPOSURE: 2021-2022 vintages show concerning valuations. 
+    4. REVIEW PRIVATE EQUITY VINTAGE EXPOSURE: 2021-2022 vintages show concerning valuations.
     Consider slowing deployment pace and focusing on co-investment opportunities.
     
-    5. CLIMATE RISK INTEGRATION: Accelerate the integration of climate risk metrics into the 
+    5. CLIMATE RISK INTEGRATION: Accelerate the integration of climate risk metrics into the
     investment process, particularly for real estate and infrastructure holdings.
-    """
-    story.append(Paragraph(recommendations, styles['Normal']))
-    
-    # Build PDF
-    doc.build(story)
-    print("✓ Created: CalPERS_Risk_Assessment_Q4_2023.pdf")
-
-def create_harvard_performance_report():
-    """Create Harvard Management Company Performance Report"""
-    doc = SimpleDocTemplate("knowledge_base_samples/Harvard_Performance_Report_2023.pdf", pagesize=letter)
-    story = []
-    styles = getSampleStyleSheet()
-    
-    # Title
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#8B0000'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    
-    story.append(Paragraph("Harvard Management Company", title_style))
-    story.append(Paragraph("Annual Performance Report - Fiscal Year 2023", styles['Heading2']))
-    story.append(Spacer(1, 0.5*inch))
-    
-    # Performance Summary
-    story.append(Paragraph("Performance Summary", styles['Heading2']))
-    
-    perf_data = [
-        ['Period', 'HMC Return', 'Policy Benchmark', 'Value Added', 'AUM ($B)'],
-        ['FY 2023', '2.9%', '4.1%', '-1.2%', '$53.2'],
-        ['3-Year Annualized', '9.6%', '8.8%', '+0.8%', '-'],
-        ['5-Year Annualized', '8.5%', '7.9%', '+0.6%', '-'],
-        ['10-Year Annualized', '9.3%', '8.7%', '+0.6%', '-']
-    ]
-    
-    table = Table(perf_data, colWidths=[1.8*inch, 1.2*inch, 1.5*inch, 1.2*inch, 1*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#8B0000')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.lightgrey),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    story.append(table)
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Asset Allocation Performance
-    story.append(Paragraph("Asset Class Performance Attribution", styles['Heading2']))
-    
-    attrib_data = [
-        ['Asset Class', 'Weight', 'Return', 'Benchmark', 'Contribution'],
-        ['Public Equity', '31%', '-2.1%', '-0.8%', '-0.65%'],
-        ['Private Equity', '23%', '12.4%', '15.2%', '2.85%'],
-        ['Hedge Funds', '25%', '6.8%', '7.2%', '1.70%'],
-        ['Real Estate', '8%', '3.2%', '4.5%', '0.26%'],
-        ['Natural Resources', '3%', '-8.4%', '-6.1%', '-0.25%'],
-        ['Fixed Income', '10%', '1.2%', '1.8%', '0.12%'],
-        ['Total', '100%', '2.9%', '4.1%', '2.9%']
-    ]
-    
-    table2 = Table(attrib_data)
-    table2.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#8B0000')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.grey),
-        ('TEXTCOLOR', (0, -1), (-1, -1), colors.whitesmoke),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    story.append(table2)
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Investment Highlights
-    story.append(Paragraph("Key Investment Actions - FY2023", styles['Heading2']))
-    
-    highlights = """
-    • PRIVATE EQUITY: Committed $2.8B to 15 new funds focusing on technology and healthcare sectors. 
+    """]),
+        ]
+    ),
+    "Harvard_Performance_Report_2023.pdf": ReportSpec(
+        title="Harvard Management Company",
+        subtitle="Annual Performance Report - Fiscal Year 2023",
+        brand_color='#8B0000',
+        sections=[
+            Section("Performance Summary", table=TableBlock(
+                rows=[
+                    ['Period', 'HMC Return', 'Policy Benchmark', 'Value Added', 'AUM ($B)'],
+                    ['FY 2023', '2.9%', '4.1%', '-1.2%', '$53.2'],
+                    ['3-Year Annualized', '9.6%', '8.8%', '+0.8%', '-'],
+                    ['5-Year Annualized', '8.5%', '7.9%', '+0.6%', '-'],
+                    ['10-Year Annualized', '9.3%', '8.7%', '+0.6%', '-']
+                ],
+                col_widths=[1.8, 1.2, 1.5, 1.2, 1],
+                body_color='lightgrey'
+            )),
+            Section("Asset Class Performance Attribution", table=TableBlock(
+                rows=[
+                    ['Asset Class', 'Weight', 'Return', 'Benchmark', 'Contribution'],
+                    ['Public Equity', '31%', '-2.1%', '-0.8%', '-0.65%'],
+                    ['Private Equity', '23%', '12.4%', '15.2%', '2.85%'],
+                    ['Hedge Funds', '25%', '6.8%', '7.2%', '1.70%'],
+                    ['Real Estate', '8%', '3.2%', '4.5%', '0.26%'],
+                    ['Natural Resources', '3%', '-8.4%', '-6.1%', '-0.25%'],
+                    ['Fixed Income', '10%', '1.2%', '1.8%', '0.12%'],
+                    ['Total', '100%', '2.9%', '4.1%', '2.9%']
+                ],
+                body_color=None,
+                total_row=True
+            )),
+            Section("Key Investment Actions - FY2023", paragraphs=["""
+    • PRIVATE EQUITY: Committed $2.8B to 15 new funds focusing on technology and healthcare sectors.
     Notable investments include participation in Vista Equity Partners Fund VIII and Thoma Bravo XV.
     
-    • HEDGE FUND RESTRUCTURING: Reduced number of hedge fund managers from 45 to 32, concentrating 
+    • HEDGE FUND RESTRUCTURING: Reduced number of hedge fund managers from 45 to 32, concentrating
     capital with top-performing strategies. Increased allocation to multi-strategy platforms.
     
-    • REAL ASSETS: Acquired three life science properties in Cambridge totaling $450M. Expanded 
+    • REAL ASSETS: Acquired three life science properties in Cambridge totaling $450M. Expanded
     renewable energy portfolio with $200M commitment to offshore wind projects.
     
-    • PUBLIC EQUITY TRANSITION: Shifted $1.2B from active to passive strategies in developed markets, 
+    • PUBLIC EQUITY TRANSITION: Shifted $1.2B from active to passive strategies in developed markets,
     reducing fees by approximately $8M annually while maintaining similar risk exposures.
     
-    • ESG INTEGRATION: Achieved net-zero commitment for entire endowment by 2050. Increased 
+    • ESG INTEGRATION: Achieved net-zero commitment for entire endowment by 2050. Increased
     sustainable investments to $4.5B (8.5% of portfolio).
-    """
-    story.append(Paragraph(highlights, styles['Normal']))
-    
-    # Build PDF
-    doc.build(story)
-    print("✓ Created: Harvard_Performance_Report_2023.pdf")
-
-def create_allianz_compliance_report():
-    """Create Allianz Global Investors Compliance Report"""
-    doc = SimpleDocTemplate("knowledge_base_samples/Allianz_Compliance_Review_2024.pdf", pagesize=letter)
-    story = []
-    styles = getSampleStyleSheet()
-    
-    # Title
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#003781'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    
-    story.append(Paragraph("Allianz Global Investors", title_style))
-    story.append(Paragraph("Regulatory Compliance Review - Q1 2024", styles['Heading2']))
-    story.append(Spacer(1, 0.5*inch))
-    
-    # Compliance Summary
-    story.append(Paragraph("Compliance Status Overview", styles['Heading2']))
-    
-    compliance_data = [
-        ['Regulatory Framework', 'Status', 'Last Review', 'Next Review', 'Issues'],
-        ['Solvency II', '✓ Compliant', '15-Jan-2024', '15-Apr-2024', '0'],
-        ['GDPR', '✓ Compliant', '22-Jan-2024', '22-Jul-2024', '0'],
-        ['MiFID II', '✓ Compliant', '08-Jan-2024', '08-Apr-2024', '1 Minor'],
-        ['AIFMD', '✓ Compliant', '12-Dec-2023', '12-Mar-2024', '0'],
-        ['SFDR', '⚠ Review Needed', '30-Nov-2023', '01-Mar-2024', '2 Pending'],
-        ['Basel III', '✓ Compliant', '20-Jan-2024', '20-Apr-2024', '0'],
-        ['FATCA', '✓ Compliant', '10-Jan-2024', '10-Jul-2024', '0']
-    ]
-    
-    table = Table(compliance_data, colWidths=[1.8*inch, 1*inch, 1.3*inch, 1.3*inch, 1*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#003781')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.lightblue),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    story.append(table)
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Regulatory Capital Requirements
-    story.append(Paragraph("Regulatory Capital Analysis", styles['Heading2']))
-    
-    capital_text = """
+    """]),
+        ]
+    ),
+    "Allianz_Compliance_Review_2024.pdf": ReportSpec(
+        title="Allianz Global Investors",
+        subtitle="Regulatory Compliance Review - Q1 2024",
+        brand_color='#003781',
+        sections=[
+            Section("Compliance Status Overview", table=TableBlock(
+                rows=[
+                    ['Regulatory Framework', 'Status', 'Last Review', 'Next Review', 'Issues'],
+                    ['Solvency II', '✓ Compliant', '15-Jan-2024', '15-Apr-2024', '0'],
+                    ['GDPR', '✓ Compliant', '22-Jan-2024', '22-Jul-2024', '0'],
+                    ['MiFID II', '✓ Compliant', '08-Jan-2024', '08-Apr-2024', '1 Minor'],
+                    ['AIFMD', '✓ Compliant', '12-Dec-2023', '12-Mar-2024', '0'],
+                    ['SFDR', '⚠ Review Needed', '30-Nov-2023', '01-Mar-2024', '2 Pending'],
+                    ['Basel III', '✓ Compliant', '20-Jan-2024', '20-Apr-2024', '0'],
+                    ['FATCA', '✓ Compliant', '10-Jan-2024', '10-Jul-2024', '0']
+                ],
+                col_widths=[1.8, 1, 1.3, 1.3, 1],
+                body_color='lightblue'
+            )),
+            Section("Regulatory Capital Analysis", paragraphs=["""
     Current Regulatory Capital Position:
     • Solvency Capital Requirement (SCR): €2.4 billion
     • Eligible Own Funds: €4.4 billion
@@ -269,16 +393,10 @@ def create_allianz_compliance_report():
     • Minimum Capital Requirement (MCR): €1.1 billion
     • MCR Coverage: 400%
     
-    The institution maintains a strong capital position with significant buffers above regulatory minimums. 
+    The institution maintains a strong capital position with significant buffers above regulatory minimums.
     Stress testing indicates the solvency ratio would remain above 140% even under severe adverse scenarios.
-    """
-    story.append(Paragraph(capital_text, styles['Normal']))
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Compliance Issues and Remediation
-    story.append(Paragraph("Open Compliance Items", styles['Heading2']))
-    
-    issues_text = """
+    """]),
+            Section("Open Compliance Items", paragraphs=["""
     1. MiFID II - Best Execution Reporting
        Issue: Quarterly best execution reports missing timestamp granularity
        Impact: Low
@@ -296,42 +414,24 @@ def create_allianz_compliance_report():
        Impact: Medium
        Remediation: Data collection underway with ESG data provider
        Status: Data Gathering Phase
-    """
-    story.append(Paragraph(issues_text, styles['Normal']))
-    
-    # Build PDF
-    doc.build(story)
-    print("✓ Created: Allianz_Compliance_Review_2024.pdf")
-
-def create_client_meeting_notes():
-    """Create client meeting notes"""
-    doc = SimpleDocTemplate("knowledge_base_samples/CalPERS_Board_Meeting_Minutes_Jan2024.pdf", pagesize=letter)
-    story = []
-    styles = getSampleStyleSheet()
-    
-    # Header
-    story.append(Paragraph("CalPERS Board Meeting Minutes", styles['Heading1']))
-    story.append(Paragraph("Investment Committee - January 25, 2024", styles['Heading2']))
-    story.append(Paragraph("Confidential - Internal Use Only", styles['Normal']))
-    story.append(Spacer(1, 0.5*inch))
-    
-    # Attendees
-    story.append(Paragraph("Attendees:", styles['Heading3']))
-    attendees_text = """
+    """]),
+        ]
+    ),
+    "CalPERS_Board_Meeting_Minutes_Jan2024.pdf": ReportSpec(
+        title="CalPERS Board Meeting Minutes",
+        subtitle="Investment Committee - January 25, 2024",
+        brand_color=None,
+        notice="Confidential - Internal Use Only",
+        sections=[
+            Section("Attendees:", heading_style='Heading3', paragraphs=["""
     • Alex King, CIO - CalPERS
     • Brad Pitt, Relationship Manager - Investment Manager
-    • Meredith Grey, Deputy CIO - CalPERS  
+    • Meredith Grey, Deputy CIO - CalPERS
     • Derek Shephard, Risk Manager - CalPERS
     • Christina Yang, Portfolio Manager - Investment Manager
     • Will Smith, Compliance Officer - Investment Manager
-    """
-    story.append(Paragraph(attendees_text, styles['Normal']))
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Agenda Items
-    story.append(Paragraph("Key Discussion Points:", styles['Heading3']))
-    
-    discussion = """
+    """]),
+            Section("Key Discussion Points:", heading_style='Heading3', paragraphs=["""
     1. PORTFOLIO PERFORMANCE REVIEW
     • Q4 2023 performance: +4.2% vs benchmark +3.8%
     • Strong performance in private equity (+15.2%) offset weakness in emerging markets (-3.1%)
@@ -365,79 +465,42 @@ def create_client_meeting_notes():
     • New reporting requirements for SFDR compliance
     • Update on technology platform integration
     • Cybersecurity audit results - no major findings
-    """
-    story.append(Paragraph(discussion, styles['Normal']))
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Next Steps
-    story.append(Paragraph("Next Steps and Deliverables:", styles['Heading3']))
-    next_steps = """
+    """]),
+            Section("Next Steps and Deliverables:", heading_style='Heading3', paragraphs=["""
     • February 5: Deliver emerging markets transition plan
     • February 15: Complete currency hedging implementation
     • February 28: Submit private equity vintage analysis
     • March 15: Next quarterly review meeting
     • March 31: ESG integration plan presentation
-    """
-    story.append(Paragraph(next_steps, styles['Normal']))
-    
-    # Build PDF
-    doc.build(story)
-    print("✓ Created: CalPERS_Board_Meeting_Minutes_Jan2024.pdf")
-
-def create_market_research_report():
-    """Create market research report"""
-    doc = SimpleDocTemplate("knowledge_base_samples/Private_Equity_Market_Outlook_2024.pdf", pagesize=letter)
-    story = []
-    styles = getSampleStyleSheet()
-    
-    # Title
-    story.append(Paragraph("Private Equity Market Outlook 2024", styles['Title']))
-    story.append(Paragraph("Institutional Investor Research", styles['Heading2']))
-    story.append(Spacer(1, 0.5*inch))
-    
-    # Executive Summary
-    story.append(Paragraph("Executive Summary", styles['Heading2']))
-    summary = """
-    The private equity market enters 2024 facing a challenging environment characterized by higher interest 
-    rates, valuation pressures, and reduced exit activity. However, significant dry powder ($3.9 trillion 
-    globally) and improving credit markets suggest potential for increased deal activity in H2 2024. 
-    Institutional investors should focus on: (1) co-investment opportunities to reduce fees, (2) secondary 
+    """]),
+        ]
+    ),
+    "Private_Equity_Market_Outlook_2024.pdf": ReportSpec(
+        title="Private Equity Market Outlook 2024",
+        subtitle="Institutional Investor Research",
+        brand_color=None,
+        sections=[
+            Section("Executive Summary", paragraphs=["""
+    The private equity market enters 2024 facing a challenging environment characterized by higher interest
+    rates, valuation pressures, and reduced exit activity. However, significant dry powder ($3.9 trillion
+    globally) and improving credit markets suggest potential for increased deal activity in H2 2024.
+    Institutional investors should focus on: (1) co-investment opportunities to reduce fees, (2) secondary
     market transactions for liquidity, and (3) sector specialists in healthcare and technology.
-    """
-    story.append(Paragraph(summary, styles['Normal']))
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Market Statistics
-    story.append(Paragraph("Market Statistics", styles['Heading2']))
-    
-    market_data = [
-        ['Metric', '2023', '2024E', 'Change'],
-        ['Global Fundraising', '$1,234B', '$1,450B', '+17.5%'],
-        ['Dry Powder', '$3,720B', '$3,900B', '+4.8%'],
-        ['Deal Value', '$765B', '$890B', '+16.3%'],
-        ['Average Deal Size', '$780M', '$820M', '+5.1%'],
-        ['Exit Value', '$456B', '$520B', '+14.0%'],
-        ['Average Hold Period', '5.8 years', '6.2 years', '+6.9%'],
-        ['Median Entry Multiple', '12.2x', '11.5x', '-5.7%'],
-        ['IRR (Median 3-yr)', '18.5%', '16.0%', '-2.5pp']
-    ]
-    
-    table = Table(market_data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    story.append(table)
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Sector Analysis
-    story.append(Paragraph("Sector Opportunities", styles['Heading2']))
-    sector_analysis = """
+    """]),
+            Section("Market Statistics", table=TableBlock(
+                rows=[
+                    ['Metric', '2023', '2024E', 'Change'],
+                    ['Global Fundraising', '$1,234B', '$1,450B', '+17.5%'],
+                    ['Dry Powder', '$3,720B', '$3,900B', '+4.8%'],
+                    ['Deal Value', '$765B', '$890B', '+16.3%'],
+                    ['Average Deal Size', '$780M', '$820M', '+5.1%'],
+                    ['Exit Value', '$456B', '$520B', '+14.0%'],
+                    ['Average Hold Period', '5.8 years', '6.2 years', '+6.9%'],
+                    ['Median Entry Multiple', '12.2x', '11.5x', '-5.7%'],
+                    ['IRR (Median 3-yr)', '18.5%', '16.0%', '-2.5pp']
+                ]
+            )),
+            Section("Sector Opportunities", paragraphs=["""
     TOP SECTORS FOR 2024:
     
     1. HEALTHCARE TECHNOLOGY
@@ -459,28 +522,298 @@ def create_market_research_report():
     • Traditional retail (structural headwinds)
     • Commercial real estate (office sector challenges)
     • Highly leveraged consumer discretionary
+    """]),
+        ]
+    ),
+}
+
+# Title and table colour of client summaries by client type
+CLIENT_TYPE_COLORS = {
+    'public_pension': '#1e3a8a',
+    'endowment': '#8B0000',
+    'insurance': '#003781',
+}
+
+def client_report_spec(client: dict, holdings: List[dict]) -> ReportSpec:
+    """Client summary spec from a ClientDataStore client record and its holdings records"""
+    overview_rows = [
+        ['Metric', 'Value'],
+        ['Assets Under Management', f"${client['aum']:,.1f}B"],
+        ['Funded Ratio', f"{client['funded_ratio']:.0%}"],
+        ['Liability Duration', f"{client['liability_duration']:.1f} years"],
+        ['Client Satisfaction', f"{client['satisfaction']}/10"],
+        ['Churn Risk', f"{client['churn_risk']}%"],
+        ['Fee Rate', f"{client['fee_rate']:.2f}%"],
+    ]
+    allocation_rows = [['Asset Class', 'Current', 'Target', 'Drift', 'Value ($B)']] + [
+        [
+            holding['Asset Class'],
+            f"{holding['Current']:.0f}%",
+            f"{holding['Target']:.0f}%",
+            f"{holding['Current'] - holding['Target']:+.0f}%",
+            f"${holding['Value']:,.1f}"
+        ]
+        for holding in holdings
+    ]
+    return ReportSpec(
+        title=client['client_name'],
+        subtitle=f"Client Summary - {client['type'].replace('_', ' ').title()}",
+        brand_color=CLIENT_TYPE_COLORS.get(client['type'], '#1e3a8a'),
+        notice=f"Relationship Manager: {client['relationship_manager']} | Primary Contact: {client['primary_contact']}",
+        sections=[
+            Section("Relationship Overview", table=TableBlock(rows=overview_rows, col_widths=[2.8, 2.2])),
+            Section("Asset Allocation", table=TableBlock(rows=allocation_rows, col_widths=[2.0, 1.0, 1.0, 1.0, 1.2])),
+        ]
+    )
+
+def client_report_name(client_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", client_name).strip("_") + "_Client_Summary.pdf"
+
+def client_report_jobs(client_store) -> List['ReportJob']:
+    """One client summary job per client in a CLIENT_DATA.ClientDataStore"""
+    return [
+        ReportJob(
+            client_report_name(client_name),
+            render_report,
+            (client_report_spec(client_store.client(client_name), client_store.holdings_records(client_name)),)
+        )
+        for client_name in client_store.client_names
+    ]
+
+BOOK_REPORT_FILE = 'Client_Book.pdf'
+
+def book_report_spec(client_store) -> ReportSpec:
+    """Whole-book spec: one row per client, then every holding as an appendix
+    
+    Both tables grow with the book, so they rely on the streaming layout in render_report.
     """
-    story.append(Paragraph(sector_analysis, styles['Normal']))
+    clients = client_store.clients
+    summary_rows = [['Client', 'Type', 'AUM ($B)', 'Funded Ratio', 'Churn Risk']] + [
+        [name, client_type.replace('_', ' ').title(), f"${aum:,.1f}", f"{funded:.0%}", f"{churn}%"]
+        for name, client_type, aum, funded, churn in zip(*(
+            clients.column(column).to_pylist()
+            for column in ('client_name', 'type', 'aum', 'funded_ratio', 'churn_risk')
+        ))
+    ]
+    holdings = client_store.holdings_table
+    holdings_rows = [['Client', 'Asset Class', 'Current', 'Target', 'Value ($B)']] + [
+        [name, asset_class, f"{current:.0f}%", f"{target:.0f}%", f"${value:,.1f}"]
+        for name, asset_class, current, target, value in zip(*(
+            holdings.column(column).to_pylist() for column in ('client_name', 'asset_class', 'current', 'target', 'value')
+        ))
+    ]
+    total_aum = sum(clients.column('aum').to_pylist())
+    return ReportSpec(
+        title="Client Book",
+        subtitle=f"{len(summary_rows) - 1:,} clients | ${total_aum:,.1f}B AUM",
+        notice="INTERNAL - Relationship Management",
+        sections=[
+            Section("Client Summary", table=TableBlock(rows=summary_rows, col_widths=[2.6, 1.3, 0.9, 1.0, 0.9])),
+            Section("Appendix: Holdings", heading_style='Heading1', page_break_before=True,
+                    table=TableBlock(rows=holdings_rows, col_widths=[2.6, 1.4, 0.8, 0.8, 0.9])),
+        ]
+    )
+
+# AI Analysis insights, highest priority first
+INSIGHT_PRIORITY_ORDER = {'HIGH': 0, 'MEDIUM': 1, 'LOW': 2}
+NUMBERED_LINE = re.compile(r"^\d+\.\s")
+MARKDOWN_BOLD = re.compile(r"\*\*(.+?)\*\*")
+
+def insight_paragraphs(content: str) -> List[str]:
+    """Paragraph markup for an AI response, emphasising the lines the app shows in bold"""
+    paragraphs = []
+    for line in content.split('\n'):
+        line = line.strip().lstrip('#').strip()
+        if not line:
+            continue
+        text = escape(line)
+        if NUMBERED_LINE.match(line) or (line.endswith(':') and len(line) < 50):
+            text = f"<b>{text.replace('**', '')}</b>"
+        else:
+            text = MARKDOWN_BOLD.sub(r"<b>\1</b>", text)
+        paragraphs.append(text)
+    return paragraphs
+
+def insights_report_spec(insights: List[dict], client_name: str) -> ReportSpec:
+    """Report spec for the insights of one AI Analysis run
     
-    # Build PDF
-    doc.build(story)
-    print("✓ Created: Private_Equity_Market_Outlook_2024.pdf")
+    Only the insights themselves go into the spec (no render time), so unchanged
+    insights always give the same spec and report_key().
+    """
+    ordered = sorted(insights, key=lambda insight: INSIGHT_PRIORITY_ORDER.get(insight['priority'], len(INSIGHT_PRIORITY_ORDER)))
+    generated = max((insight['timestamp'] for insight in insights), default="")
+    models = ", ".join(sorted({insight['model'] for insight in insights}))
+    roles = ", ".join(sorted({insight['role'] for insight in insights}))
+    summary_rows = [['Analysis', 'Priority', 'Model', 'Generated']] + [
+        [insight['type'], insight['priority'], insight['model'], insight['timestamp']]
+        for insight in ordered
+    ]
+    return ReportSpec(
+        title=escape(client_name),
+        subtitle=f"AI Insights - {escape(roles)}" if roles else "AI Insights",
+        notice=f"CONFIDENTIAL - Generated {generated} by {escape(models)}. Review before sharing with clients.",
+        sections=[Section("Summary", table=TableBlock(rows=summary_rows, col_widths=[2.2, 0.9, 1.5, 1.7]))] + [
+            Section(f"{escape(insight['title'])} ({insight['priority']})", paragraphs=insight_paragraphs(insight['content']))
+            for insight in ordered
+        ]
+    )
 
-# Generate all PDFs
-if __name__ == "__main__":
-    print("Generating sample knowledge base PDFs...")
-    create_calpers_risk_report()
-    create_harvard_performance_report()
-    create_allianz_compliance_report()
-    create_client_meeting_notes()
-    create_market_research_report()
-    print("\n✅ All PDFs created in 'knowledge_base_samples' folder")
+def insights_report_name(client_name: str, insights: List[dict]) -> str:
+    generated = max((insight['timestamp'] for insight in insights), default="")
+    date = generated.split(' ')[0].replace('-', '')
+    return re.sub(r"[^A-Za-z0-9]+", "_", f"{client_name} AI Insights {date}").strip("_") + ".pdf"
 
-# Custom Prompt Examples for Each Role
-print("\n" + "="*60)
-print("CUSTOM PROMPT EXAMPLES FOR EACH ROLE")
-print("="*60)
+SAMPLES_DIR = 'knowledge_base_samples'
+
+# Input hash of every PDF in an output directory, as of its last successful build
+MANIFEST_FILE = '.build_manifest.json'
+MANIFEST_SAVE_EVERY = 100  # Builds between manifest saves, so an interrupted run keeps most of its progress
+MIN_REPORTS_FOR_PROCESSES = 64  # Below this, worker start-up costs more than the builds
+
+@functools.lru_cache(maxsize=None)
+def code_source(obj) -> str:
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):
+        # No source file (e.g. defined interactively); fall back to the bytecode
+        code = obj.__code__
+        return code.co_code.hex() + repr(code.co_consts)
+
+@functools.lru_cache(maxsize=None)
+def rendering_source() -> str:
+    """Source of the shared rendering code and the layout constants it reads"""
+    return "\n".join([code_source(obj) for obj in RENDERING_CODE] + [repr((TABLE_CHUNK_ROWS, STORY_LOOKAHEAD))])
+
+def spec_value(value):
+    """JSON form of report specs and other job arguments"""
+    if dataclasses.is_dataclass(value):
+        return dataclasses.asdict(value)
+    return str(value)
+
+def report_key(spec: ReportSpec) -> str:
+    """Content hash of a spec, for caching rendered reports"""
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=spec_value).encode('utf-8')).hexdigest()
+
+@dataclass
+class ReportJob:
+    """One PDF to build: the builder, its output file name and any arguments it takes"""
+    file_name: str
+    builder: Callable[..., None]  # Called as builder(output_path, *args)
+    args: tuple = ()
+    
+    def input_hash(self) -> str:
+        """Hash of everything that determines the PDF: template, rendering and builder code, arguments, reportlab"""
+        import reportlab
+        
+        payload = json.dumps(
+            [TEMPLATE_VERSION, rendering_source(), self.builder.__qualname__, code_source(self.builder), self.args,
+             reportlab.Version],
+            sort_keys=True, default=spec_value
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+@dataclass
+class BuildReport:
+    """Outcome of a report build run"""
+    built: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+    elapsed: float = 0.0
+    
+    @property
+    def reports_per_second(self) -> float:
+        return len(self.built) / self.elapsed if self.elapsed else 0.0
+
+SAMPLE_REPORTS = [ReportJob(file_name, render_report, (spec,)) for file_name, spec in SAMPLE_SPECS.items()]
+
+def write_atomically(builder: Callable[..., None], output_path: str, args: tuple = ()):
+    """Build into a temp file beside the target and rename it into place, so no reader sees a partial PDF"""
+    directory, file_name = os.path.split(output_path)
+    tmp_path = os.path.join(directory, f".{file_name}.{os.getpid()}.tmp")
+    try:
+        builder(tmp_path, *args)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
+def build_report(job: ReportJob, output_dir: str) -> Tuple[str, Optional[str]]:
+    """Process pool worker: return (file name, error)"""
+    try:
+        write_atomically(job.builder, os.path.join(output_dir, job.file_name), job.args)
+        return job.file_name, None
+    except Exception as e:
+        return job.file_name, f"{type(e).__name__}: {e}"
+
+def load_manifest(output_dir: str) -> Dict[str, str]:
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(output_dir: str, manifest: Dict[str, str]):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def build_reports(jobs: List[ReportJob], output_dir: str = SAMPLES_DIR, max_workers: Optional[int] = None,
+                  force: bool = False, progress: Optional[Callable[[int, int], None]] = None) -> BuildReport:
+    """Build PDFs in parallel, skipping any whose inputs are unchanged since its last build
+    
+    Each PDF is written through a temp file and renamed into place. The manifest of input
+    hashes is only updated after a successful build, so a failed or interrupted build is
+    retried on the next run.
+    """
+    started = time.perf_counter()
+    report = BuildReport()
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    
+    pending = {}  # File name -> (job, input hash)
+    for job in jobs:
+        input_hash = job.input_hash()
+        up_to_date = manifest.get(job.file_name) == input_hash and os.path.exists(os.path.join(output_dir, job.file_name))
+        if up_to_date and not force:
+            report.skipped.append(job.file_name)
+        else:
+            pending[job.file_name] = (job, input_hash)
+    
+    def collect(file_name, error):
+        if error is None:
+            manifest[file_name] = pending[file_name][1]
+            report.built.append(file_name)
+        else:
+            manifest.pop(file_name, None)
+            report.failed[file_name] = error
+        if (len(report.built) + len(report.failed)) % MANIFEST_SAVE_EVERY == 0:
+            save_manifest(output_dir, manifest)
+    
+    total = len(pending)
+    if max_workers is None and total < MIN_REPORTS_FOR_PROCESSES:
+        max_workers = 1
+    if total == 1 or max_workers == 1:
+        for done, (job, _) in enumerate(pending.values(), 1):
+            collect(*build_report(job, output_dir))
+            if progress:
+                progress(done, total)
+    elif total:
+        # Spawned workers avoid forking a process that is already running threads (e.g. Streamlit)
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(build_report, job, output_dir) for job, _ in pending.values()]
+            for done, future in enumerate(as_completed(futures), 1):
+                collect(*future.result())
+                if progress:
+                    progress(done, total)
+    
+    save_manifest(output_dir, manifest)
+    report.elapsed = time.perf_counter() - started
+    return report
+
+# Custom Prompt Examples for Each Role
 custom_prompts = {
     "Chief Risk Officer": [
         "Analyze the correlation between our private equity allocation and overall portfolio volatility. How would a 20% drawdown in PE valuations impact our funded ratio?",
@@ -543,19 +876,6 @@ custom_prompts = {
     ]
 }
 
-print("\nThese prompts can be used in the 'Custom Prompt' section of the AI Analysis tab.")
-print("\nEach prompt is designed to:")
-print("• Leverage role-specific knowledge and permissions")
-print("• Reference documents in the knowledge base")
-print("• Require analysis across multiple data sources")
-print("• Generate actionable insights")
-print("\nThe AI will search the knowledge base for relevant documents and incorporate")
-print("that context into its analysis, providing more accurate and grounded responses.")
-
-print("\n" + "="*60)
-print("KNOWLEDGE BASE USAGE TIPS")
-print("="*60)
-
 tips = """
 1. DOCUMENT ORGANIZATION:
    • Use consistent naming: ClientName_DocumentType_Date.pdf
@@ -585,4 +905,57 @@ tips = """
    • Request action items and timelines
 """
 
-print(tips)
\ No newline at end of file
+def print_usage_guide():
+    """Print the custom prompt examples and knowledge base tips"""
+    print("\n" + "="*60)
+    print("CUSTOM PROMPT EXAMPLES FOR EACH ROLE")
+    print("="*60)
+    
+    print("\nThese prompts can be used in the 'Custom Prompt' section of the AI Analysis tab.")
+    print("\nEach prompt is designed to:")
+    print("• Leverage role-specific knowledge and permissions")
+    print("• Reference documents in the knowledge base")
+    print("• Require analysis across multiple data sources")
+    print("• Generate actionable insights")
+    print("\nThe AI will search the knowledge base for relevant documents and incorporate")
+    print("that context into its analysis, providing more accurate and grounded responses.")
+    
+    print("\n" + "="*60)
+    print("KNOWLEDGE BASE USAGE TIPS")
+    print("="*60)
+    print(tips)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Build the sample knowledge base PDFs, skipping any whose inputs are unchanged"
+    )
+    parser.add_argument('--output-dir', default=SAMPLES_DIR)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--force', action='store_true', help="Rebuild every PDF")
+    parser.add_argument('--client-data', nargs='?', const="", metavar='DIR',
+                        help="Also build a summary PDF for every client, and the whole-book report, "
+                             "from the client data directory")
+    args = parser.parse_args(argv)
+    
+    jobs = list(SAMPLE_REPORTS)
+    if args.client_data is not None:
+        from CLIENT_DATA import CLIENT_DATA_DIR, ClientDataStore
+        client_store = ClientDataStore(args.client_data or CLIENT_DATA_DIR)
+        jobs += client_report_jobs(client_store)
+        jobs.append(ReportJob(BOOK_REPORT_FILE, render_report, (book_report_spec(client_store),)))
+    
+    print("Generating sample knowledge base PDFs...")
+    report = build_reports(jobs, args.output_dir, max_workers=args.workers, force=args.force)
+    if len(report.built) <= 20:
+        for file_name in report.built:
+            print(f"✓ Created: {file_name}")
+    for file_name, error in report.failed.items():
+        print(f"✗ Failed: {file_name}: {error}")
+    print(f"\n✅ Built {len(report.built)} and skipped {len(report.skipped)} unchanged PDFs "
+          f"in '{args.output_dir}' ({report.elapsed:.1f}s)")
+    
+    print_usage_guide()
+    return 1 if report.failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,149 @@
+import zlib
+from statistics import NormalDist
+from typing import Dict, Sequence, Tuple, Union
+
+import numpy as np
+
+TRADING_DAYS_PER_YEAR = 252
+
+# Daily drift and volatility of the synthetic series shown in the Reports tab
+PORTFOLIO_DAILY_MEAN = 0.0003
+PORTFOLIO_DAILY_VOLATILITY = 0.015
+BENCHMARK_DAILY_MEAN = 0.0002
+BENCHMARK_DAILY_VOLATILITY = 0.012
+
+# History lengths offered in the Reports tab, in trading days
+HISTORY_PERIODS = {
+    "3 Months": 63,
+    "1 Year": TRADING_DAYS_PER_YEAR,
+    "3 Years": 3 * TRADING_DAYS_PER_YEAR,
+    "5 Years": 5 * TRADING_DAYS_PER_YEAR,
+}
+
+FloatOrArray = Union[float, Sequence[float], np.ndarray]
+
+def series_seed(*keys) -> int:
+    """Stable seed from arbitrary keys (Python's hash() is salted per process)"""
+    return zlib.crc32("|".join(str(key) for key in keys).encode('utf-8'))
+
+def simulate_returns(n_days: int, n_series: int = 1, mean: FloatOrArray = PORTFOLIO_DAILY_MEAN,
+                     volatility: FloatOrArray = PORTFOLIO_DAILY_VOLATILITY, seed: int = 0) -> np.ndarray:
+    """Draw a (n_days, n_series) matrix of normal daily returns in one call
+    
+    mean and volatility may be scalars or one value per series.
+    """
+    rng = np.random.default_rng(seed)
+    mean = np.broadcast_to(np.asarray(mean, dtype=np.float64), (n_series,))
+    volatility = np.broadcast_to(np.asarray(volatility, dtype=np.float64), (n_series,))
+    return rng.standard_normal((n_days, n_series)) * volatility + mean
+
+# Client histories are seeded synthetic series, not the clients' returns. While this is True their
+# metrics are shown only as labelled illustrations and are kept out of AI prompts.
+SIMULATED_HISTORIES = True
+SIMULATED_LABEL = "SIMULATED / ILLUSTRATIVE"
+
+# Longest synthetic history kept per client; shorter views use its trailing window
+MAX_HISTORY_DAYS = max(HISTORY_PERIODS.values())
+CLIENT_BETA = 1.2
+ACTIVE_DAILY_VOLATILITY = 0.0025  # About 4% annual tracking error
+
+def simulate_client_histories(client_names: Sequence[str], n_days: int = MAX_HISTORY_DAYS) -> Tuple[np.ndarray, np.ndarray]:
+    """Daily returns for every client (n_days, n_clients) and the benchmark (n_days,) from one draw
+    
+    Clients follow the benchmark with CLIENT_BETA plus independent active risk, so
+    tracking errors land in a realistic range. The seed depends only on the client
+    list, so every view and prompt sees the same history.
+    """
+    client_names = list(client_names)
+    shocks = simulate_returns(n_days, len(client_names) + 1, mean=0.0, volatility=1.0, seed=series_seed(*client_names))
+    benchmark = BENCHMARK_DAILY_MEAN + BENCHMARK_DAILY_VOLATILITY * shocks[:, -1]
+    active = ACTIVE_DAILY_VOLATILITY * shocks[:, :-1]
+    clients = PORTFOLIO_DAILY_MEAN + CLIENT_BETA * (benchmark - BENCHMARK_DAILY_MEAN)[:, None] + active
+    return clients, benchmark
+
+def levels_from_returns(returns: np.ndarray, base: float = 100.0) -> np.ndarray:
+    return base * np.cumprod(1.0 + returns, axis=0)
+
+# Risk analytics settings
+RISK_FREE_RATE = 0.04  # Annual
+VAR_CONFIDENCE = 0.95
+
+RISK_METRICS = (
+    'total_return', 'annual_return', 'volatility', 'sharpe_ratio', 'tracking_error', 'information_ratio',
+    'max_drawdown', 'var_historical', 'cvar_historical', 'var_parametric', 'cvar_parametric',
+)
+
+def compute_risk_metrics(returns: np.ndarray, benchmark_returns: np.ndarray, windows: Sequence[int],
+                         confidence: float = VAR_CONFIDENCE, risk_free_rate: float = RISK_FREE_RATE,
+                         periods_per_year: int = TRADING_DAYS_PER_YEAR) -> Dict[str, np.ndarray]:
+    """Risk and performance metrics for every series over every trailing window
+    
+    returns is (days, series); benchmark_returns is (days,) or (days, series). Each
+    metric comes back as a (windows, series) array. VaR and CVaR are one-period
+    losses reported as positive fractions.
+    """
+    returns = np.atleast_2d(np.asarray(returns, dtype=np.float64).T).T
+    benchmark_returns = np.asarray(benchmark_returns, dtype=np.float64)
+    if benchmark_returns.ndim == 1:
+        benchmark_returns = benchmark_returns[:, None]
+    
+    n_days, n_series = returns.shape
+    results = {name: np.empty((len(windows), n_series)) for name in RISK_METRICS}
+    tail = 1.0 - confidence
+    z = NormalDist().inv_cdf(tail)
+    tail_density = NormalDist().pdf(z) / tail
+    daily_risk_free = risk_free_rate / periods_per_year
+    
+    for row, window in enumerate(windows):
+        window = min(window, n_days)
+        r = returns[-window:]
+        active = r - benchmark_returns[-window:]
+        
+        mean = r.mean(axis=0)
+        std = r.std(axis=0, ddof=1) if window > 1 else np.zeros(n_series)
+        active_std = active.std(axis=0, ddof=1) if window > 1 else np.zeros(n_series)
+        growth = np.cumprod(1.0 + r, axis=0)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            results['total_return'][row] = growth[-1] - 1.0
+            results['annual_return'][row] = growth[-1] ** (periods_per_year / window) - 1.0
+            results['volatility'][row] = std * np.sqrt(periods_per_year)
+            results['sharpe_ratio'][row] = np.where(std > 0, (mean - daily_risk_free) / std * np.sqrt(periods_per_year), np.nan)
+            results['tracking_error'][row] = active_std * np.sqrt(periods_per_year)
+            results['information_ratio'][row] = np.where(
+                active_std > 0, active.mean(axis=0) / active_std * np.sqrt(periods_per_year), np.nan
+            )
+        
+        # Drawdown from the running peak, starting from an initial level of 1
+        peaks = np.maximum.accumulate(np.vstack([np.ones((1, n_series)), growth]), axis=0)[1:]
+        results['max_drawdown'][row] = (growth / peaks - 1.0).min(axis=0)
+        
+        # Historical: the k worst days per series via a partial sort instead of a full one
+        k = max(1, int(np.ceil(tail * window)))
+        worst = np.partition(r, k - 1, axis=0)[:k]
+        results['var_historical'][row] = -worst.max(axis=0)
+        results['cvar_historical'][row] = -worst.mean(axis=0)
+        
+        results['var_parametric'][row] = -(mean + z * std)
+        results['cvar_parametric'][row] = -(mean - std * tail_density)
+    
+    return results
+
+def format_risk_summary(metrics: Dict[str, np.ndarray], column: int, window_labels: Sequence[str],
+                        confidence: float = VAR_CONFIDENCE) -> str:
+    """Plain-text metrics for one series, for use as prompt context"""
+    lines = ["COMPUTED RISK METRICS (daily returns; VaR/CVaR are 1-day losses):"]
+    for row, label in enumerate(window_labels):
+        lines.append(
+            f"- {label}: return {metrics['total_return'][row, column]:+.1%}, "
+            f"volatility {metrics['volatility'][row, column]:.1%}, "
+            f"Sharpe {metrics['sharpe_ratio'][row, column]:.2f}, "
+            f"tracking error {metrics['tracking_error'][row, column]:.1%}, "
+            f"information ratio {metrics['information_ratio'][row, column]:.2f}, "
+            f"max drawdown {metrics['max_drawdown'][row, column]:.1%}, "
+            f"{confidence:.0%} VaR {metrics['var_historical'][row, column]:.2%} historical / "
+            f"{metrics['var_parametric'][row, column]:.2%} parametric, "
+            f"CVaR {metrics['cvar_historical'][row, column]:.2%} historical / "
+            f"{metrics['cvar_parametric'][row, column]:.2%} parametric"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,249 @@
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+@dataclass
+class AssetClassProfile:
+    """Factor sensitivities and one-year return assumptions for an asset class"""
+    equity_beta: float = 0.0      # Return per unit of public equity return
+    duration: float = 0.0         # Price sensitivity to a parallel rate move, in years
+    private_beta: float = 0.0     # Return per unit of private-market mark
+    expected_return: float = 0.05
+    idiosyncratic_vol: float = 0.02
+
+ASSET_CLASS_PROFILES = {
+    'Global Equity': AssetClassProfile(equity_beta=1.0, expected_return=0.07, idiosyncratic_vol=0.02),
+    'Fixed Income': AssetClassProfile(duration=6.5, expected_return=0.04, idiosyncratic_vol=0.01),
+    'Government Bonds': AssetClassProfile(duration=8.0, expected_return=0.035, idiosyncratic_vol=0.005),
+    'Corporate Bonds': AssetClassProfile(equity_beta=0.15, duration=6.0, expected_return=0.045, idiosyncratic_vol=0.015),
+    'Private Equity': AssetClassProfile(private_beta=1.0, expected_return=0.09, idiosyncratic_vol=0.05),
+    'Real Estate': AssetClassProfile(private_beta=0.8, duration=2.0, expected_return=0.06, idiosyncratic_vol=0.04),
+    'Hedge Funds': AssetClassProfile(equity_beta=0.4, expected_return=0.05, idiosyncratic_vol=0.04),
+}
+DEFAULT_PROFILE = AssetClassProfile(equity_beta=1.0, expected_return=0.06, idiosyncratic_vol=0.03)
+
+@dataclass
+class StressScenario:
+    """Simultaneous deterministic shocks to the risk factors"""
+    name: str
+    equity: float = 0.0       # Public equity return, e.g. -0.30
+    rates_bps: float = 0.0    # Parallel rate move in basis points
+    private: float = 0.0      # Private-market mark, e.g. -0.15
+
+STRESS_SCENARIOS = [
+    StressScenario("Combined Shock (Equity -30%, Rates +200bp, Private -15%)", equity=-0.30, rates_bps=200, private=-0.15),
+    StressScenario("Global Equity Crash", equity=-0.30, rates_bps=-50, private=-0.10),
+    StressScenario("Interest Rate Spike", rates_bps=300),
+    StressScenario("Private Markets Markdown", private=-0.20),
+    StressScenario("Stagflation", equity=-0.15, rates_bps=150, private=-0.10),
+]
+
+# One-year factor distribution for Monte Carlo: equity return, rate change (decimal), private-market return.
+# Factor means are carried by each asset class's expected return, except for the rate drift.
+RATE_CHANGE_MEAN = 0.0
+FACTOR_VOLS = np.array([0.16, 0.01, 0.12])
+FACTOR_CORRELATION = np.array([
+    [1.0, -0.2, 0.7],
+    [-0.2, 1.0, -0.1],
+    [0.7, -0.1, 1.0],
+])
+
+# Share of a market rate move that reaches each client type's liability discount rate within a year.
+# Insurers and corporate plans value liabilities at market yields; US public pensions discount at their
+# assumed return (GASB 67) and endowments at their spending rate, which trustees revise slowly.
+LIABILITY_RATE_PASS_THROUGH = {
+    'insurance': 1.0,
+    'corporate_pension': 1.0,
+    'public_pension': 0.1,
+    'endowment': 0.1,
+}
+DEFAULT_LIABILITY_RATE_PASS_THROUGH = 1.0
+
+MONTE_CARLO_PATHS = 100_000
+MONTE_CARLO_CHUNK = 20_000  # Paths simulated at once; bounds peak memory per client
+UNDERFUNDED_THRESHOLD = 0.80
+MIN_CLIENTS_FOR_PROCESSES = 32  # Below this, process start-up costs more than the simulation
+
+@dataclass
+class ClientBalanceSheet:
+    """Assets, liabilities and allocation of one client"""
+    name: str
+    assets: float                    # Market value of assets, $B
+    funded_ratio: float
+    liability_duration: float
+    allocations: Dict[str, float]    # Asset class -> portfolio weight (sums to 1)
+    liability_rate_pass_through: float = DEFAULT_LIABILITY_RATE_PASS_THROUGH
+    
+    @property
+    def market_rate_duration(self) -> float:
+        """Liability sensitivity to a move in market rates, in years"""
+        return self.liability_duration * self.liability_rate_pass_through
+
+@dataclass
+class StressResult:
+    """Deterministic scenario outcomes and the Monte Carlo funded-ratio distribution for a client"""
+    client_name: str
+    funded_ratio: float
+    scenarios: List[dict] = field(default_factory=list)
+    monte_carlo: Dict[str, float] = field(default_factory=dict)
+
+def balance_sheet_from_client(client_name: str, client_data: dict, portfolio: List[dict]) -> ClientBalanceSheet:
+    """Build a balance sheet from load_enhanced_client_data() records
+    
+    Missing or invalid data raises ValueError, so callers can skip the client.
+    """
+    def number(value, field_name: str) -> float:
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{client_name}: {field_name} is missing or not a number ({value!r})") from None
+        if not np.isfinite(value):
+            raise ValueError(f"{client_name}: {field_name} is not finite")
+        return value
+    
+    funded_ratio = number(client_data.get('funded_ratio'), "funded ratio")
+    liability_duration = number(client_data.get('liability_duration'), "liability duration")
+    if funded_ratio <= 0:
+        raise ValueError(f"{client_name}: funded ratio must be positive, got {funded_ratio}")
+    if liability_duration < 0:
+        raise ValueError(f"{client_name}: liability duration must be non-negative, got {liability_duration}")
+    
+    values = np.array([number(holding['Value'], f"{holding['Asset Class']} value") for holding in portfolio])
+    if (values < 0).any() or values.sum() <= 0:
+        raise ValueError(f"{client_name}: holdings must be non-negative with a positive total")
+    return ClientBalanceSheet(
+        name=client_name,
+        assets=number(client_data.get('aum'), "AUM"),
+        funded_ratio=funded_ratio,
+        liability_duration=liability_duration,
+        allocations={holding['Asset Class']: float(value) for holding, value in zip(portfolio, values / values.sum())},
+        liability_rate_pass_through=LIABILITY_RATE_PASS_THROUGH.get(client_data.get('type'),
+                                                                    DEFAULT_LIABILITY_RATE_PASS_THROUGH)
+    )
+
+def exposure_matrix(sheet: ClientBalanceSheet):
+    """Per-asset-class weights, factor loadings (assets x 3), expected returns and idiosyncratic vols"""
+    profiles = [ASSET_CLASS_PROFILES.get(asset_class, DEFAULT_PROFILE) for asset_class in sheet.allocations]
+    weights = np.array(list(sheet.allocations.values()))
+    # Rate factor is a change in yield, so a positive move costs duration
+    loadings = np.array([[p.equity_beta, -p.duration, p.private_beta] for p in profiles])
+    expected = np.array([p.expected_return for p in profiles])
+    idiosyncratic = np.array([p.idiosyncratic_vol for p in profiles])
+    return weights, loadings, expected, idiosyncratic
+
+def funded_ratio_after(funded_ratio, market_rate_duration, asset_returns: np.ndarray,
+                       rate_changes: np.ndarray) -> np.ndarray:
+    """Funded ratio after asset returns and a parallel market rate move (arguments broadcast)
+    
+    Liabilities scale by exp(-duration * rate change): convex and always positive, where the
+    first-order 1 - duration * change goes to zero for long durations. Assets cannot fall below zero.
+    """
+    assets = np.maximum(1.0 + asset_returns, 0.0)
+    liabilities = np.exp(-np.multiply(market_rate_duration, rate_changes))
+    return funded_ratio * assets / liabilities
+
+def run_scenarios(sheets: List[ClientBalanceSheet], scenarios: List[StressScenario] = STRESS_SCENARIOS) -> List[List[dict]]:
+    """Apply every deterministic scenario to every client in one matrix product"""
+    if not sheets:
+        return []
+    portfolio_loadings = np.array([loadings.T @ weights for weights, loadings, _, _ in map(exposure_matrix, sheets)])
+    shocks = np.array([[s.equity, s.rates_bps / 10_000, s.private] for s in scenarios])
+    asset_returns = portfolio_loadings @ shocks.T  # (clients, scenarios)
+    funded = funded_ratio_after(
+        np.array([sheet.funded_ratio for sheet in sheets])[:, None],
+        np.array([sheet.market_rate_duration for sheet in sheets])[:, None],
+        asset_returns, shocks[:, 1]
+    )
+    return [
+        [
+            {
+                'scenario': scenario.name,
+                'asset_return': float(asset_return),
+                'asset_change': float(asset_return * sheet.assets),
+                'funded_ratio': float(ratio),
+            }
+            for scenario, asset_return, ratio in zip(scenarios, client_returns, client_funded)
+        ]
+        for sheet, client_returns, client_funded in zip(sheets, asset_returns, funded)
+    ]
+
+def run_monte_carlo(sheet: ClientBalanceSheet, n_paths: int = MONTE_CARLO_PATHS, chunk_size: int = MONTE_CARLO_CHUNK,
+                    seed: Optional[int] = None) -> Dict[str, float]:
+    """One-year funded-ratio distribution from correlated factor draws, simulated chunk by chunk
+    
+    Only the funded ratio of each path is kept, so memory is n_paths floats plus one chunk
+    of draws regardless of the number of asset classes.
+    """
+    weights, loadings, expected, idiosyncratic = exposure_matrix(sheet)
+    factor_cholesky = np.linalg.cholesky(FACTOR_CORRELATION * np.outer(FACTOR_VOLS, FACTOR_VOLS))
+    rng = np.random.default_rng(zlib.crc32(sheet.name.encode('utf-8')) if seed is None else seed)
+    
+    # Factors enter as zero-mean shocks around each asset class's expected return
+    portfolio_expected = expected @ weights
+    portfolio_loadings = loadings.T @ weights
+    funded = np.empty(n_paths)
+    
+    for start in range(0, n_paths, chunk_size):
+        size = min(chunk_size, n_paths - start)
+        factor_shocks = rng.standard_normal((size, 3)) @ factor_cholesky.T
+        idiosyncratic_returns = (rng.standard_normal((size, len(weights))) * idiosyncratic) @ weights
+        asset_returns = portfolio_expected + factor_shocks @ portfolio_loadings + idiosyncratic_returns
+        rate_changes = RATE_CHANGE_MEAN + factor_shocks[:, 1]
+        funded[start:start + size] = funded_ratio_after(sheet.funded_ratio, sheet.market_rate_duration,
+                                                        asset_returns, rate_changes)
+    
+    p1, p5, p50, p95 = np.percentile(funded, [1, 5, 50, 95])
+    return {
+        'paths': n_paths,
+        'mean': float(funded.mean()),
+        'p1': float(p1),
+        'p5': float(p5),
+        'median': float(p50),
+        'p95': float(p95),
+        'worst': float(funded.min()),
+        'expected_shortfall_5': float(funded[funded <= p5].mean()),
+        'prob_underfunded': float((funded < UNDERFUNDED_THRESHOLD).mean()),
+        'prob_decline': float((funded < sheet.funded_ratio).mean()),
+    }
+
+def run_stress_tests(sheets: List[ClientBalanceSheet], n_paths: int = MONTE_CARLO_PATHS,
+                     chunk_size: int = MONTE_CARLO_CHUNK, processes: Optional[int] = None) -> Dict[str, StressResult]:
+    """Stress test many clients, spreading the Monte Carlo over worker processes when there are enough"""
+    scenarios = run_scenarios(sheets)
+    
+    if processes is None:
+        processes = 1 if len(sheets) < MIN_CLIENTS_FOR_PROCESSES else None
+    if processes == 1 or len(sheets) <= 1:
+        monte_carlo = [run_monte_carlo(sheet, n_paths, chunk_size) for sheet in sheets]
+    else:
+        # Spawned workers avoid forking a process that is already running threads (e.g. Streamlit)
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as executor:
+            monte_carlo = list(executor.map(run_monte_carlo, sheets, [n_paths] * len(sheets), [chunk_size] * len(sheets)))
+    
+    return {
+        sheet.name: StressResult(sheet.name, sheet.funded_ratio, client_scenarios, client_monte_carlo)
+        for sheet, client_scenarios, client_monte_carlo in zip(sheets, scenarios, monte_carlo)
+    }
+
+def format_stress_summary(result: StressResult) -> str:
+    """Plain-text stress test results for one client, for use as prompt context"""
+    lines = [f"COMPUTED STRESS TESTS (current funded ratio {result.funded_ratio:.1%}):"]
+    for outcome in result.scenarios:
+        lines.append(
+            f"- {outcome['scenario']}: assets {outcome['asset_return']:+.1%} "
+            f"(${outcome['asset_change']:+.1f}B), funded ratio {outcome['funded_ratio']:.1%}"
+        )
+    mc = result.monte_carlo
+    lines.append(
+        f"- Monte Carlo, 1 year, {mc['paths']:,} paths: median funded ratio {mc['median']:.1%}, "
+        f"5th percentile {mc['p5']:.1%}, 1st percentile {mc['p1']:.1%}, worst {mc['worst']:.1%}, "
+        f"P(below {UNDERFUNDED_THRESHOLD:.0%}) {mc['prob_underfunded']:.1%}, "
+        f"P(decline) {mc['prob_decline']:.1%}"
+    )
+    worst = min(result.scenarios, key=lambda outcome: outcome['funded_ratio'])
+    lines.append(f"- Worst deterministic case: {worst['scenario']} at {worst['funded_ratio']:.1%}")
+    return "\n".join(lines)
@@ -0,0 +1,171 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from KNOWLEDGE_BASE import (WORD_PATTERN, AccessIndex, Bitset, DocumentStore, InvertedIndex, RecencyIndex,
+                            SimpleRAGSystem, VectorIndex, chunk_text)
+
+def write_v1_store(root):
+    """The on-disk layout of a store written before the manifest recorded its format"""
+    os.makedirs(root)
+    with open(os.path.join(root, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({'dim': 384, 'embedder': 'hashing-384'}, f)
+    for name in ('content.seg', 'meta.seg', 'terms.seg'):
+        with open(os.path.join(root, name), 'wb') as f:
+            f.write(b'x' * 64)
+    np.zeros(384, dtype='<f4').tofile(os.path.join(root, 'vectors.f32'))
+    # A non-empty v1 document index
+    with open(os.path.join(root, 'docs.idx'), 'wb') as f:
+        f.write(b'\0' * 48)
+
+def test_v1_store_is_rejected_without_being_modified(tmp_path):
+    root = str(tmp_path / 'store')
+    write_v1_store(root)
+    before = {name: open(os.path.join(root, name), 'rb').read() for name in os.listdir(root)}
+    
+    with pytest.raises(RuntimeError, match="older store format"):
+        DocumentStore(root)
+    
+    after = {name: open(os.path.join(root, name), 'rb').read() for name in os.listdir(root)}
+    assert after == before
+
+def test_current_store_reopens(tmp_path):
+    root = str(tmp_path / 'store')
+    rag = SimpleRAGSystem(DocumentStore(root))
+    rag.add_document("Funded ratio guidance for public pensions. " * 20, "memo.txt", "memo", "All Clients",
+                     ["Chief Risk Officer"], "tester")
+    rag.store.close()
+    
+    store = DocumentStore(root)
+    assert store.manifest['format'] == DocumentStore.FORMAT_VERSION
+    assert len(store) == 1
+    store.close()
+
+def test_empty_directory_is_a_new_store(tmp_path):
+    store = DocumentStore(str(tmp_path / 'store'))
+    assert len(store) == 0
+    store.close()
+
+def test_two_writers_share_one_store(tmp_path):
+    root = str(tmp_path / 'store')
+    first = SimpleRAGSystem(DocumentStore(root))
+    second = SimpleRAGSystem(DocumentStore(root))
+    for i in range(3):
+        for name, rag in (('first', first), ('second', second)):
+            rag.add_document(f"{name} memo {i} on liquidity buffers. " * 20, f"{name}_{i}.txt", "memo",
+                             "All Clients", ["Chief Risk Officer"], name)
+    
+    # The last append came from the second writer; the first catches up on its next lookup
+    assert len(first.search_documents("", "Chief Risk Officer")) == len(second.documents) == 6
+    assert first.vectors.size == second.vectors.size == first.store.chunk_count
+    for rag in (first, second):
+        rag.store.close()
+    
+    store = DocumentStore(root)
+    assert sorted(meta['file_name'] for meta in store.iter_metadata()) == sorted(
+        f"{name}_{i}.txt" for name in ('first', 'second') for i in range(3))
+    assert all(store.read_passage(i)[1].strip() for i in range(store.chunk_count))
+    store.close()
+
+def test_context_includes_passages_another_writer_just_added(tmp_path):
+    root = str(tmp_path / 'store')
+    reader = SimpleRAGSystem(DocumentStore(root))
+    reader.add_document("Funded ratio guidance for public pensions. " * 20, "memo.txt", "memo", "All Clients",
+                        ["Chief Risk Officer"], "reader")
+    writer = SimpleRAGSystem(DocumentStore(root))
+    writer.add_document("Liquidity waterfall for capital calls. " * 40, "liquidity.txt", "memo", "All Clients",
+                        ["Chief Risk Officer"], "writer")
+    
+    # The reader only learns about the new passages inside the search
+    context = reader.get_context_for_prompt("liquidity waterfall capital calls", "All Clients", "Chief Risk Officer")
+    assert "liquidity.txt" in context
+    for rag in (reader, writer):
+        rag.store.close()
+
+def test_vector_search_skips_zero_and_dissimilar_rows():
+    index = VectorIndex()
+    index.add(np.array([[1.0, 0.0, 0.0], [0.0, 0.0, 0.0], [0.6, 0.8, 0.0], [-1.0, 0.0, 0.0]]))
+    
+    assert [row for row, _ in index.search(np.array([1.0, 0.0, 0.0]), 10)] == [0, 2]
+    assert index.search(np.zeros(3), 10) == []
+    assert index.search(np.array([1.0, 0.0, 0.0]), 10, mask=np.array([False, True, False, True])) == []
+
+def test_bitset_grows_and_tests_membership():
+    bits = Bitset()
+    for pos in (0, 9, 700):
+        bits.add(pos)
+    
+    assert bits.positions().tolist() == [0, 9, 700]
+    assert bits.contains(np.array([0, 1, 9, 700, 5000])).tolist() == [True, False, True, True, False]
+    assert np.flatnonzero(bits.to_mask(10)).tolist() == [0, 9]
+
+def test_access_index_filters_by_role_and_client():
+    access = AccessIndex()
+    access.add(0, ["Chief Risk Officer", "Portfolio Manager"], "All Clients")
+    access.add(1, ["Chief Risk Officer"], "Harvard")
+    access.add(2, ["Portfolio Manager"], "Harvard")
+    access.add(3, ["Chief Risk Officer"], "Yale")
+    
+    assert access.allowed("Chief Risk Officer").positions().tolist() == [0, 1, 3]
+    assert access.allowed("Chief Risk Officer", "Harvard").positions().tolist() == [1]
+    assert access.allowed("Portfolio Manager", "Yale").positions().tolist() == []
+    assert access.allowed("Intern").positions().tolist() == []
+    assert access.allowed("Intern", "Harvard").positions().tolist() == []
+    
+    # A cached role and client intersection picks up documents added later
+    access.add(100, ["Chief Risk Officer"], "Harvard")
+    assert access.allowed("Chief Risk Officer", "Harvard").positions().tolist() == [1, 100]
+
+def test_bm25_ranks_frequent_terms_higher_and_honours_allowed():
+    index = InvertedIndex()
+    index.add(0, "liquidity liquidity buffer")
+    index.add(1, "liquidity buffer buffer")
+    index.add(2, "equity equity equity")
+    
+    assert [doc_id for doc_id, _ in index.search("liquidity")] == [0, 1]
+    assert [doc_id for doc_id, _ in index.search("buffer")] == [1, 0]
+    assert [doc_id for doc_id, _ in index.search("liquidity", top_k=1)] == [0]
+    # The rarer term outweighs a common one at equal frequency
+    assert index.search("equity liquidity")[0][0] == 2
+    assert index.search("private credit") == []
+    
+    allowed = Bitset()
+    allowed.add(1)
+    assert [doc_id for doc_id, _ in index.search("liquidity", allowed=allowed)] == [1]
+
+def test_recency_index_returns_newest_first_per_role():
+    recency = RecencyIndex()
+    recency.add(0, ["Chief Risk Officer"], "2024-01-01T09:00:00")
+    recency.add(1, ["Chief Risk Officer", "Portfolio Manager"], "2024-01-02T09:00:00")
+    recency.add(2, ["Chief Risk Officer"], "2024-01-03T09:00:00")
+    # An upload stamped before the last one still lands in date order
+    recency.add(3, ["Chief Risk Officer"], "2024-01-02T12:00:00")
+    
+    assert recency.recent("Chief Risk Officer", 10) == [2, 3, 1, 0]
+    assert recency.recent("Chief Risk Officer", 2) == [2, 3]
+    assert recency.recent("Portfolio Manager", 10) == [1]
+    assert recency.recent("Intern", 10) == []
+    assert recency.recent("Chief Risk Officer", 0) == []
+
+@pytest.mark.parametrize("sentence_words", [None, 7])
+def test_chunks_stay_within_size_and_overlap(sentence_words):
+    words = [f"w{i}" + ('.' if sentence_words and i % sentence_words == sentence_words - 1 else '')
+             for i in range(400)]
+    text = " ".join(words)
+    chunks = chunk_text(text, chunk_words=50, overlap_words=10)
+    spans = [[match.group() for match in WORD_PATTERN.finditer(text, chunk.start, chunk.end)] for chunk in chunks]
+    
+    assert spans[0][0] == words[0] and spans[-1][-1] == words[-1]
+    assert all(len(span) <= 50 for span in spans)
+    for previous, current in zip(spans, spans[1:]):
+        overlap = words.index(previous[-1]) - words.index(current[0]) + 1
+        assert 1 <= overlap <= 10
+        if sentence_words is None:
+            assert overlap == 10 and len(previous) == 50
+        else:
+            assert previous[-1].endswith('.')
+
+def test_empty_text_still_gets_one_passage():
+    assert [(chunk.start, chunk.end) for chunk in chunk_text("")] == [(0, 0)]
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from CLIENT_DATA import SEED_CLIENTS, SEED_HOLDINGS
+from STRESS_TESTING import (
+    STRESS_SCENARIOS, ClientBalanceSheet, StressScenario, balance_sheet_from_client, run_monte_carlo, run_scenarios
+)
+
+def seed_sheets():
+    sheets = []
+    for client in SEED_CLIENTS:
+        portfolio = [{'Asset Class': asset_class, 'Value': value}
+                     for name, asset_class, _, _, value in SEED_HOLDINGS if name == client['client_name']]
+        sheets.append(balance_sheet_from_client(client['client_name'], client, portfolio))
+    return sheets
+
+def scenario_outcome(outcomes, name):
+    return next(outcome for outcome in outcomes if outcome['scenario'].startswith(name))
+
+def test_rate_spike_does_not_balloon_long_duration_plans():
+    for sheet, outcomes in zip(seed_sheets(), run_scenarios(seed_sheets())):
+        if sheet.liability_duration >= 14:
+            gain = scenario_outcome(outcomes, "Interest Rate Spike")['funded_ratio'] - sheet.funded_ratio
+            assert gain < 0.10, sheet.name
+
+def test_combined_shock_lowers_every_funded_ratio():
+    for sheet, outcomes in zip(seed_sheets(), run_scenarios(seed_sheets())):
+        assert scenario_outcome(outcomes, "Combined Shock")['funded_ratio'] < sheet.funded_ratio, sheet.name
+
+def test_extreme_moves_stay_finite_and_positive():
+    # A fully market-valued 25-year liability, where the first-order model's liabilities would reach zero
+    sheet = ClientBalanceSheet('Long plan', 10.0, 0.9, 25.0, {'Global Equity': 1.0})
+    shocks = [StressScenario("Rates +1000bp", rates_bps=1000), StressScenario("Rates -500bp", rates_bps=-500),
+              StressScenario("Equity -150%", equity=-1.5)]
+    ratios = [outcome['funded_ratio'] for outcome in run_scenarios([sheet], shocks)[0]]
+    assert all(np.isfinite(ratios))
+    assert ratios[0] == pytest.approx(0.9 * np.exp(2.5))
+    assert ratios[1] > 0 and ratios[2] == 0
+
+def test_scenarios_match_client_by_client():
+    sheets = seed_sheets()
+    together = run_scenarios(sheets)
+    for outcomes, sheet in zip(together, sheets):
+        for outcome, alone in zip(outcomes, run_scenarios([sheet])[0]):
+            assert outcome['scenario'] == alone['scenario']
+            assert outcome['funded_ratio'] == pytest.approx(alone['funded_ratio'])
+    assert [len(outcomes) for outcomes in together] == [len(STRESS_SCENARIOS)] * len(sheets)
+
+def test_monte_carlo_funded_ratios_are_positive():
+    for sheet in seed_sheets():
+        assert run_monte_carlo(sheet, n_paths=2_000)['worst'] > 0
+
+def test_invalid_balance_sheet_is_rejected():
+    client = dict(SEED_CLIENTS[0], liability_duration=-1.0)
+    with pytest.raises(ValueError, match="liability duration"):
+        balance_sheet_from_client(client['client_name'], client, [{'Asset Class': 'Global Equity', 'Value': 1.0}])
+
+@pytest.mark.parametrize("changes, portfolio_value, message", [
+    ({'funded_ratio': None}, 1.0, "funded ratio is missing"),
+    ({'liability_duration': None}, 1.0, "liability duration is missing"),
+    ({'funded_ratio': 0.0}, 1.0, "funded ratio must be positive"),
+    ({}, 0.0, "positive total"),
+    ({}, None, "Global Equity value is missing"),
+])
+def test_missing_or_degenerate_data_is_a_value_error(changes, portfolio_value, message):
+    client = dict(SEED_CLIENTS[0], **changes)
+    with pytest.raises(ValueError, match=message):
+        balance_sheet_from_client(client['client_name'], client, [{'Asset Class': 'Global Equity', 'Value': portfolio_value}])